@@ -0,0 +1,162 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+from .urls import urlpatterns
+
+User = get_user_model()
+
+POSTS_COUNT = 15
+
+
+class ApiTest(TestCase):
+    """Тестируем JSON API для чтения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(POSTS_COUNT):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiTest.reader)
+
+    def get_requests(self):
+        post_kwargs = {'post_id': ApiTest.post.pk}
+        author_kwargs = {'username': ApiTest.author.username}
+        return (
+            ('api:posts', self.client, reverse('api:posts')),
+            ('api:post', self.client, reverse('api:post', kwargs=post_kwargs)),
+            ('api:comments', self.client,
+             reverse('api:comments', kwargs=post_kwargs)),
+            ('api:groups', self.client, reverse('api:groups')),
+            ('api:group_posts', self.client,
+             reverse('api:group_posts', kwargs={'slug': ApiTest.group.slug})),
+            ('api:profile', self.client,
+             reverse('api:profile', kwargs=author_kwargs)),
+            ('api:profile_posts', self.client,
+             reverse('api:profile_posts', kwargs=author_kwargs)),
+            ('api:feed', self.reader_client, reverse('api:feed')),
+        )
+
+    def test_responses_fit_query_budgets(self):
+        """Каждый адрес API отвечает и укладывается в бюджет запросов."""
+        requests = self.get_requests()
+        self.assertEqual(
+            {name for name, *_ in requests},
+            {f'api:{pattern.name}' for pattern in urlpatterns},
+        )
+        for name, client, url in requests:
+            with self.subTest(name=name):
+                response = client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn('ETag', response)
+                self.assertLessEqual(
+                    response.metrics.queries, settings.QUERY_BUDGETS[name]
+                )
+
+    def test_list_is_paginated_by_cursor_with_selected_fields(self):
+        """Список листается курсором и содержит только ?fields=."""
+        url = reverse('api:posts')
+        first = self.client.get(url, {'fields': 'id,author'}).json()
+        second = self.client.get(
+            url, {'fields': 'id,author', 'cursor': first['next']}).json()
+
+        self.assertEqual(
+            first['results'][0], {'id': ApiTest.post.pk, 'author': 'author'}
+        )
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True)),
+        )
+        self.assertIsNone(second['next'])
+
+    def test_unknown_field_is_rejected(self):
+        """Неизвестное поле в ?fields= - ошибка 400 с описанием."""
+        response = self.client.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('secret', response.json()['detail'])
+
+    def test_if_none_match_is_answered_without_queries(self):
+        """Повторный запрос с тем же ETag получает 304 без запросов
+        к БД, а после нового поста - новый ответ.
+        """
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Last-Modified'],
+            ApiTest.post.pub_date.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        )
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+
+        Post.objects.create(author=ApiTest.author, text='Новый пост')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, HTTPStatus.OK)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_new_comment_changes_post_etags(self):
+        """Новый комментарий меняет comments_count, поэтому списки
+        постов и пост отдаются заново.
+        """
+        urls = (
+            reverse('api:posts'),
+            reverse('api:post', kwargs={'post_id': ApiTest.post.pk}),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(
+            post=ApiTest.post, author=ApiTest.reader, text='Ещё один'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_feed_requires_login(self):
+        """Лента доступна только после входа и своя у каждого."""
+        url = reverse('api:feed')
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        author_client = Client()
+        author_client.force_login(ApiTest.author)
+        self.assertEqual(author_client.get(url).json()['results'], [])
+        self.assertEqual(
+            len(self.reader_client.get(url).json()['results']),
+            settings.NUMBER_OF_ELEMENTS_PER_PAGE,
+        )
+
+    def test_missing_objects_return_json_404(self):
+        """Несуществующие объекты - 404 в JSON."""
+        for url in (
+            reverse('api:post', kwargs={'post_id': 0}),
+            reverse('api:profile', kwargs={'username': 'nobody'}),
+            reverse('api:group_posts', kwargs={'slug': 'nothing'}),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
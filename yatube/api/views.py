@@ -0,0 +1,243 @@
+"""JSON API для чтения постов, групп, профилей, комментариев и ленты.
+
+Списки отдаются как {"results": [...], "next": ..., "previous": ...}:
+страницы выбираются KeysetPaginator по курсору ?cursor=, состав полей
+задаётся параметром ?fields=id,text,... Строки читаются через values():
+выбираются только нужные столбцы, объекты моделей не создаются.
+
+У ответов есть ETag и Last-Modified (core.conditional): повторный
+запрос с If-None-Match получает 304, не читая строк из БД.
+"""
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.conditional import conditional_page, newest
+from core.paginators import KeysetPaginator
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models.query import QuerySet
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from posts import counters, feed as posts_feed
+from posts.models import Comment, Group, Post, User
+
+# поле ответа -> поле values()
+POST_FIELDS = {
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'pk',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'pub_date': 'pub_date',
+}
+GROUP_FIELDS = {
+    'id': 'pk',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+PROFILE_FIELDS = (
+    'username',
+    'first_name',
+    'last_name',
+    'posts_count',
+    'followers_count',
+    'following_count',
+)
+
+
+class InvalidFields(Exception):
+    """В ?fields= запрошены неизвестные поля."""
+
+
+def selected_fields(request, available: Iterable[str]) -> List[str]:
+    """Поля из ?fields=, а без параметра - все доступные."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    names = list(dict.fromkeys(
+        name.strip() for name in value.split(',') if name.strip()
+    ))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise InvalidFields(', '.join(unknown))
+    return names
+
+
+def _convert(name: str, value):
+    if name == 'image':
+        return default_storage.url(value) if value else None
+    return value
+
+
+def serialize(row: dict, names: List[str], fields: Dict[str, str]) -> dict:
+    return {name: _convert(name, row[fields[name]]) for name in names}
+
+
+def paginate(request, queryset: QuerySet, fields: Dict[str, str],
+             keys=('pub_date', 'pk')) -> dict:
+    """Страница списка по курсору с выбранными полями."""
+    names = selected_fields(request, fields)
+    rows = queryset.values(*{fields[name] for name in names}, *keys)
+    page = KeysetPaginator(
+        rows, settings.NUMBER_OF_ELEMENTS_PER_PAGE, keys
+    ).get_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(row, names, fields) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def json_response(data: dict, status: int = 200) -> JsonResponse:
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def _user(request) -> str:
+    return str(request.user.pk)
+
+
+def api_view(*scopes: str, modified: Optional[Callable] = None,
+             per_user: bool = False):
+    """Представление API: только GET и HEAD, ETag и Last-Modified
+    (core.conditional), ошибки в JSON. scopes - области кэша,
+    от которых зависит ответ; modified(request, **kwargs) - дата
+    самой новой записи ответа; per_user - ответ свой у каждого
+    пользователя и требует входа.
+    """
+    def decorator(view):
+        conditional_view = conditional_page(
+            *scopes, modified=modified, vary=_user if per_user else None
+        )(view)
+
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if per_user and not request.user.is_authenticated:
+                return json_response({'detail': 'Нужна авторизация.'}, 401)
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except Http404:
+                return json_response({'detail': 'Не найдено.'}, 404)
+            except InvalidFields as error:
+                return json_response(
+                    {'detail': f'Неизвестные поля: {error}'}, 400
+                )
+        return wrapper
+    return decorator
+
+
+def _newest_post(request):
+    return newest(Post.objects.all(), 'updated_at')
+
+
+def _newest_in_post(request, post_id):
+    return newest(Post.objects.filter(pk=post_id), 'updated_at')
+
+
+def _newest_comment(request, post_id):
+    return newest(Comment.objects.filter(post_id=post_id))
+
+
+def _newest_in_group(request, slug):
+    return newest(Post.objects.filter(group__slug=slug), 'updated_at')
+
+
+def _newest_by_author(request, username):
+    return newest(Post.objects.filter(author__username=username), 'updated_at')
+
+
+def _newest_in_feed(request):
+    return newest(posts_feed.get_feed(request.user), 'feed_date')
+
+
+@api_view('post', 'comment', 'group', 'user', modified=_newest_post)
+def posts(request):
+    """Все посты, новые первыми."""
+    return json_response(paginate(request, Post.objects.all(), POST_FIELDS))
+
+
+@api_view('post', 'comment', 'group', 'user', modified=_newest_in_post)
+def post(request, post_id):
+    """Один пост."""
+    names = selected_fields(request, POST_FIELDS)
+    row = Post.objects.filter(pk=post_id).values(
+        *{POST_FIELDS[name] for name in names}).first()
+    if row is None:
+        raise Http404
+    return json_response(serialize(row, names, POST_FIELDS))
+
+
+@api_view('comment', 'user', modified=_newest_comment)
+def comments(request, post_id):
+    """Комментарии к посту, новые первыми."""
+    return json_response(paginate(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS
+    ))
+
+
+@api_view('group')
+def groups(request):
+    """Группы, последние созданные первыми."""
+    return json_response(
+        paginate(request, Group.objects.all(), GROUP_FIELDS, keys=('pk',))
+    )
+
+
+@api_view('post', 'comment', 'group', 'user', modified=_newest_in_group)
+def group_posts(request, slug):
+    """Посты группы, новые первыми."""
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return json_response(
+        paginate(request, Post.objects.filter(group=group), POST_FIELDS)
+    )
+
+
+@api_view('post', 'user', 'follow', modified=_newest_by_author)
+def profile(request, username):
+    """Профиль пользователя со счётчиками."""
+    names = selected_fields(request, PROFILE_FIELDS)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.get_stats(author)
+    values = {
+        'username': author.username,
+        'first_name': author.first_name,
+        'last_name': author.last_name,
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
+    }
+    return json_response({name: values[name] for name in names})
+
+
+@api_view('post', 'comment', 'group', 'user', modified=_newest_by_author)
+def profile_posts(request, username):
+    """Посты автора, новые первыми."""
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return json_response(
+        paginate(request, Post.objects.filter(author=author), POST_FIELDS)
+    )
+
+
+@api_view('post', 'comment', 'group', 'user', 'follow',
+          modified=_newest_in_feed, per_user=True)
+def feed(request):
+    """Лента подписок пользователя."""
+    return json_response(paginate(
+        request, posts_feed.get_feed(request.user), POST_FIELDS,
+        keys=posts_feed.FEED_KEYS,
+    ))
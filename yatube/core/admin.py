@@ -0,0 +1,198 @@
+"""Списки административной панели для таблиц в миллионы строк.
+
+Стандартный список объектов на каждой загрузке выполняет COUNT(*)
+всей таблицы (иногда дважды) и листает страницы через OFFSET,
+который перебирает все пропущенные строки. LargeTableAdmin:
+
+* оценивает количество по статистике СУБД (core.db.estimate_count),
+  без неё - кэширует точный подсчёт на ADMIN_COUNT_TIMEOUT,
+  а отфильтрованный список считает не дальше ADMIN_COUNT_LIMIT;
+* листает список курсором (core.paginators.KeysetPaginator) по
+  ключу сортировки по умолчанию. Страница выбирается по индексу
+  только по столбцам ключа, а строки целиком дочитываются по pk;
+* загружает только поля из list_only, а вычисляемые столбцы
+  (list_annotations) добавляет только строкам страницы;
+* читает варианты выбора полей list_editable один раз на список;
+* кэширует годы и месяцы date_hierarchy на ADMIN_COUNT_TIMEOUT.
+
+Массовые действия над таким списком запрашивают подтверждение и
+параметры страницей confirm_action, а с «выбрать все» получают
+выборку всего списка, а не pk строк.
+
+При сортировке по другому столбцу список листается по номерам
+страниц, как обычно, но тоже без полного подсчёта.
+"""
+import hashlib
+from typing import Dict, Optional, Tuple, Type
+
+from django.conf import settings
+from django import forms
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.templatetags import admin_list
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Expression
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from .db import estimate_count
+from .paginators import KeysetPaginator
+
+CURSOR_VAR = 'cursor'
+COUNT_KEY = 'admin-count:{table}'
+DATES_KEY = 'admin-dates:{model}:{params}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, не считающий всю таблицу. approximate - количество
+    оценено или взято из кэша; capped - строк не меньше, чем count.
+    """
+
+    approximate = False
+    capped = False
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not queryset.query.where:
+            self.approximate = True
+            estimate = estimate_count(queryset.model)
+            if estimate is not None:
+                return estimate
+            key = COUNT_KEY.format(table=queryset.model._meta.db_table)
+            return cache.get_or_set(
+                key, queryset.count, settings.ADMIN_COUNT_TIMEOUT
+            )
+        # фильтр или поиск: считаем не дальше предела
+        count = queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+        self.capped = count == settings.ADMIN_COUNT_LIMIT
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """Список объектов, листаемый курсором ?cursor=."""
+
+    keyset_page = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # курсор относится к текущему списку: ссылки фильтров,
+        # поиска и сортировки ведут на первую страницу
+        if CURSOR_VAR not in (new_params or {}):
+            remove = [*(remove or ()), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or self.show_all:
+            super().get_results(request)
+        else:
+            self._get_keyset_results(request)
+        # только у строк страницы: с аннотациями подсчёт и даты
+        # date_hierarchy выполнялись бы через GROUP BY
+        if self.model_admin.list_annotations:
+            self.result_list = self.result_list.annotate(
+                **self.model_admin.list_annotations)
+
+    def _get_keyset_results(self, request):
+        keys = self.model_admin.keyset_keys
+        page = KeysetPaginator(
+            self.queryset.values(*keys), self.list_per_page, keys
+        ).get_page(request.GET.get(CURSOR_VAR))
+        paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        # QuerySet, а не список: по нему строится формсет list_editable
+        self.result_list = self.queryset.filter(
+            pk__in=[row['pk'] for row in page]
+        )
+        self.can_show_all = False
+        self.multi_page = page.has_other_pages()
+        self.paginator = paginator
+        self.keyset_page = page
+        self.next_url = self.get_query_string(
+            {CURSOR_VAR: page.next_cursor})
+        self.previous_url = self.get_query_string(
+            {CURSOR_VAR: page.previous_cursor})
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        return queryset
+
+
+def cached_date_hierarchy(cl: ChangeList) -> dict:
+    """Контекст date_hierarchy из кэша. Список лет или месяцев
+    строится SELECT DISTINCT по всем строкам выборки, поэтому
+    считается раз в ADMIN_COUNT_TIMEOUT для каждого набора фильтров.
+    """
+    params = hashlib.md5(cl.get_query_string().encode()).hexdigest()
+    key = DATES_KEY.format(model=cl.opts.label_lower, params=params)
+    return cache.get_or_set(
+        key, lambda: admin_list.date_hierarchy(cl) or {},
+        settings.ADMIN_COUNT_TIMEOUT,
+    )
+
+
+def confirm_action(
+    modeladmin: admin.ModelAdmin, request, action: str, title: str,
+    description: str, form_class: Type[forms.Form] = forms.Form,
+    initial: Optional[dict] = None,
+) -> Tuple[Optional[forms.Form], Optional[TemplateResponse]]:
+    """Страница подтверждения действия action с формой его
+    параметров. Возвращает (форма, None), когда действие
+    подтверждено, иначе (None, страница подтверждения).
+    """
+    if 'apply' in request.POST:
+        form = form_class(request.POST)
+        if form.is_valid():
+            return form, None
+    else:
+        form = form_class(initial=initial)
+    return None, TemplateResponse(request, 'admin/confirm_action.html', {
+        **modeladmin.admin_site.each_context(request),
+        'opts': modeladmin.model._meta,
+        'title': title,
+        'description': description,
+        'form': form,
+        'action': action,
+        # с «выбрать все» действие получит весь список с фильтрами
+        # из адреса страницы, поэтому форма отправляется на него же
+        'select_across': request.POST.get('select_across') == '1',
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+    })
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка большой таблицы. keyset_keys - ключ сортировки по
+    умолчанию по убыванию, последний элемент уникален; list_only -
+    поля, загружаемые для столбцов списка; list_annotations -
+    вычисляемые столбцы, добавляемые только строкам страницы.
+    """
+
+    keyset_keys: Tuple[str, ...] = ('pk',)
+    list_only: Tuple[str, ...] = ()
+    list_annotations: Dict[str, Expression] = {}
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if field is not None and db_field.name in self.list_editable:
+            # варианты читаются один раз на список, а не в каждой строке
+            field.choices = list(iter(field.choices))
+        return field
@@ -0,0 +1,18 @@
+"""Общее для команд замеров: bench_yatube, bench_pagination
+и bench_sqlite.
+"""
+import math
+from typing import Iterable
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию с тестовыми данными."""
+
+
+def percentile(values: Iterable[float], percent: float) -> float:
+    """Перцентиль методом ближайшего ранга; для пустых данных 0."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
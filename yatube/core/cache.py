@@ -0,0 +1,183 @@
+"""Кэш страниц для анонимных посетителей с версионной инвалидацией.
+
+Каждая закэшированная страница зависит от набора областей ('post',
+'comment', ...). Версия области хранится в кэше и входит в ключ
+страницы; при изменении данных версия увеличивается, и все страницы,
+зависящие от области, перестают находиться в кэше - без перебора
+ключей и без ожидания истечения TTL.
+"""
+import hashlib
+import math
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+VERSION_KEY = 'version:{scope}'
+CHANGED_KEY = 'version-changed:{scope}'
+PAGE_KEY = 'page:{view}:{versions}:{params}'
+STATS_KEY = 'page-stats:{view}:{outcome}'
+VERSIONED_KEY = 'versioned:{name}:{objects}'
+HIT = 'hit'
+MISS = 'miss'
+
+# имена представлений, обёрнутых cache_anonymous_page
+cached_views = set()
+
+
+def _new_version() -> int:
+    # после вытеснения ключа версии из кэша счёт начинается заново,
+    # поэтому стартовое значение не должно совпасть с прежними
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes: Iterable[str]) -> Dict[str, int]:
+    """Текущие версии областей; недостающие создаются."""
+    keys = {VERSION_KEY.format(scope=scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, scope in keys.items():
+        if key not in found:
+            cache.add(key, _new_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def bump_version(*scopes: str) -> None:
+    """Делает недействительными страницы, зависящие от областей."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope=scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+        _touch(scope)
+
+
+def _touch(scope: str) -> None:
+    # время изменения в целых секундах, как в Last-Modified, округлённое
+    # вверх; правку в ту же секунду, что и прошлый ответ, выдаёт ETag -
+    # в нём версии областей
+    cache.set(
+        CHANGED_KEY.format(scope=scope), math.ceil(time.time()), timeout=None
+    )
+
+
+def changed_at(scopes: Iterable[str]) -> Optional[datetime]:
+    """Время последнего изменения областей или None, если с очистки
+    кэша они не менялись.
+    """
+    found = cache.get_many(
+        [CHANGED_KEY.format(scope=scope) for scope in scopes])
+    if not found:
+        return None
+    return datetime.fromtimestamp(max(found.values()), timezone.utc)
+
+
+def object_versions(*objects) -> str:
+    """Версии объектов VersionedModel одной строкой; None допустим."""
+    return ':'.join(
+        '-' if obj is None
+        else f'{obj._meta.label_lower}.{obj.pk}.{obj.version}'
+        for obj in objects
+    )
+
+
+def versioned_key(name: str, *objects) -> str:
+    """Ключ кэша для значения, построенного по объектам.
+    После правки любого из них ключ меняется, и устаревшее значение
+    больше не находится: сбрасывать его не нужно, а TTL нужен
+    только чтобы освободить место.
+    """
+    return VERSIONED_KEY.format(name=name, objects=object_versions(*objects))
+
+
+def record_lookup(view_name: str, outcome: str) -> None:
+    key = STATS_KEY.format(view=view_name, outcome=outcome)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats(view_names: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    """Число попаданий и промахов кэша страниц по представлениям."""
+    keys = {
+        STATS_KEY.format(view=view, outcome=outcome): (view, outcome)
+        for view in view_names
+        for outcome in (HIT, MISS)
+    }
+    found = cache.get_many(keys)
+    stats = {view: {HIT: 0, MISS: 0} for view in view_names}
+    for key, (view, outcome) in keys.items():
+        stats[view][outcome] = found.get(key, 0)
+    return stats
+
+
+def reset_stats(view_names: Iterable[str]) -> None:
+    cache.delete_many([
+        STATS_KEY.format(view=view, outcome=outcome)
+        for view in view_names
+        for outcome in (HIT, MISS)
+    ])
+
+
+def page_key(view_name: str, request, scopes: Iterable[str]) -> str:
+    versions = get_versions(scopes)
+    params = '&'.join(
+        f'{name}={request.GET.get(name, "")}'
+        for name in settings.PAGE_CACHE_QUERY_PARAMS
+    )
+    return PAGE_KEY.format(
+        view=view_name,
+        versions='.'.join(str(versions[scope]) for scope in sorted(versions)),
+        params=hashlib.md5(
+            f'{request.path}?{params}'.encode()
+        ).hexdigest(),
+    )
+
+
+def cache_anonymous_page(*scopes: str, timeout=None):
+    """Кэширует ответ представления для анонимных посетителей.
+    scopes - области данных, от которых зависит страница.
+    """
+    def decorator(view):
+        view_name = f'{view.__module__}.{view.__name__}'
+        cached_views.add(view_name)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+
+            key = page_key(view_name, request, scopes)
+            response = cache.get(key)
+            if response is not None:
+                record_lookup(view_name, HIT)
+                response['X-Page-Cache'] = HIT
+                return response
+
+            record_lookup(view_name, MISS)
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if (response.status_code == 200
+                    and not response.streaming
+                    and not response.cookies
+                    and not request.META.get('CSRF_COOKIE_USED')):
+                cache.set(
+                    key,
+                    response,
+                    settings.PAGE_CACHE_TIMEOUT if timeout is None
+                    else timeout,
+                )
+            response['X-Page-Cache'] = MISS
+            return response
+        return wrapper
+    return decorator
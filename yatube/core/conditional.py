@@ -0,0 +1,93 @@
+"""Условные GET-запросы: ETag и Last-Modified без рендера страницы.
+
+Last-Modified - дата самого нового изменения записей, показанных
+на странице (updated_at у версионируемых моделей),
+или время последнего изменения областей кэша (core.cache.changed_at),
+если оно позже: удаление самой новой записи дату записей сдвигает
+назад, а правка и перенос постов могут её не менять.
+ETag - хэш этой даты, версий областей кэша, адреса запроса и того,
+что в ответе зависит от посетителя. Версии меняются при любом
+изменении данных.
+Дата хранится в кэше под ключом с версиями, поэтому повторный запрос
+с If-None-Match получает 304, не обращаясь к таблицам и не вычисляя
+querysets представления.
+"""
+import hashlib
+from datetime import datetime
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.db.models.query import QuerySet
+from django.views.decorators.http import condition
+
+from .cache import changed_at, get_versions
+
+MODIFIED_KEY = 'modified:{key}'
+# значение в кэше, когда записей нет и даты тоже нет
+NO_DATE = ''
+# атрибут запроса с вычисленными ETag и Last-Modified
+VALIDATORS_ATTR = '_conditional_validators'
+
+
+def newest(queryset: QuerySet, *fields: str) -> Optional[datetime]:
+    """Самая поздняя из дат fields (по умолчанию pub_date) у записей
+    queryset одним агрегатным запросом.
+    """
+    dates = queryset.aggregate(**{
+        f'newest_{number}': Max(field)
+        for number, field in enumerate(fields or ('pub_date',))
+    })
+    return max(filter(None, dates.values()), default=None)
+
+
+def conditional_page(*scopes: str, modified: Optional[Callable] = None,
+                     vary: Optional[Callable] = None):
+    """Отвечает 304 на If-None-Match и If-Modified-Since.
+    scopes - области кэша, от которых зависит ответ;
+    modified(request, *args, **kwargs) - дата самой новой записи;
+    vary(request) - строка с тем, что в ответе зависит от посетителя.
+    """
+    def decorator(view):
+        view_name = f'{view.__module__}.{view.__name__}'
+
+        def validators(request, *args, **kwargs):
+            # condition спрашивает ETag и дату по отдельности
+            if hasattr(request, VALIDATORS_ATTR):
+                return getattr(request, VALIDATORS_ATTR)
+            versions = get_versions(scopes)
+            key = hashlib.md5('|'.join((
+                view_name,
+                request.get_full_path(),
+                vary(request) if vary is not None else '',
+                '.'.join(str(versions[scope]) for scope in sorted(versions)),
+            )).encode()).hexdigest()
+            last_modified = None
+            if modified is not None:
+                cache_key = MODIFIED_KEY.format(key=key)
+                last_modified = cache.get(cache_key)
+                if last_modified is None:
+                    last_modified = max(
+                        filter(None, (
+                            modified(request, *args, **kwargs),
+                            changed_at(scopes),
+                        )),
+                        default=None,
+                    )
+                    cache.set(
+                        cache_key,
+                        last_modified or NO_DATE,
+                        settings.PAGE_CACHE_TIMEOUT,
+                    )
+                last_modified = last_modified or None
+            etag = hashlib.md5(f'{key}:{last_modified}'.encode()).hexdigest()
+            setattr(request, VALIDATORS_ATTR, (etag, last_modified))
+            return etag, last_modified
+
+        return condition(
+            etag_func=lambda *args, **kwargs: validators(*args, **kwargs)[0],
+            last_modified_func=(
+                lambda *args, **kwargs: validators(*args, **kwargs)[1]),
+        )(view)
+    return decorator
@@ -0,0 +1,64 @@
+"""Настройка соединений с SQLite.
+
+Каждое новое соединение получает PRAGMA из settings.SQLITE_PRAGMAS:
+WAL, при котором читатели не блокируют писателя, synchronous=NORMAL
+(в режиме WAL синхронизация диска только при контрольной точке),
+ожидание блокировки вместо мгновенной ошибки "database is locked",
+mmap и кэш страниц побольше.
+
+estimate_count оценивает число строк таблицы по статистике СУБД,
+не выполняя COUNT(*).
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# меняют файл базы и недоступны соединению только для чтения
+WRITE_PRAGMAS = ('journal_mode',)
+
+
+def is_read_only(connection) -> bool:
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    read_only = is_read_only(connection)
+    # напрямую, мимо обёрток: настройка соединения не запрос страницы
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        if read_only and name in WRITE_PRAGMAS:
+            continue
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def estimate_count(model) -> Optional[int]:
+    """Число строк таблицы по статистике планировщика: sqlite_stat1
+    (заполняется ANALYZE) или pg_class.reltuples. None - статистики нет.
+    Оценка может отставать от таблицы до следующего ANALYZE.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        # первое число stat - строк в индексе, у полного индекса
+        # их столько же, сколько в таблице
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        # таблицы sqlite_stat1 нет, пока не запускали ANALYZE
+        return None
+    counts = [int(str(stat).split()[0]) for stat, in rows if stat]
+    if not counts or max(counts) < 0:
+        return None
+    return max(counts)
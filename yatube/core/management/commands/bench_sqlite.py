@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from core.bench import percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# (название, PRAGMA, соединение на весь процесс)
+CONFIGS = (
+    ('по умолчанию', {}, False),
+    ('PRAGMA', None, False),
+    ('PRAGMA + reuse', None, True),
+)
+# таймаут блокировки sqlite3 и Django, если PRAGMA не заданы
+DEFAULT_TIMEOUT = 5
+INITIAL_ROWS = 10000
+AUTHORS = 1000
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=DEFAULT_TIMEOUT)
+    # то же, что делает Django для каждого соединения
+    connection.execute('PRAGMA foreign_keys = ON')
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def create_database(path, pragmas):
+    connection = connect(path, pragmas)
+    connection.executescript(
+        'CREATE TABLE entry (id INTEGER PRIMARY KEY, author INTEGER, '
+        'text TEXT, pub_date REAL);'
+        'CREATE INDEX entry_author_date ON entry (author, pub_date);'
+    )
+    rng = random.Random(0)
+    connection.executemany(
+        'INSERT INTO entry (author, text, pub_date) VALUES (?, ?, ?)',
+        ((rng.randrange(AUTHORS), 'x' * 200, time.time())
+         for _ in range(INITIAL_ROWS)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def work(task):
+    """Один процесс: чтения ленты автора и вставки с фиксацией
+    до дедлайна, как запросы страниц и комментарии.
+    """
+    path, pragmas, reuse, deadline, write_share, seed = task
+    rng = random.Random(seed)
+    stats = {'reads': 0, 'writes': 0, 'locked': 0, 'write_ms': []}
+    connection = connect(path, pragmas) if reuse else None
+    while time.time() < deadline:
+        current = connection or connect(path, pragmas)
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_share:
+                with current:
+                    current.execute(
+                        'INSERT INTO entry (author, text, pub_date) '
+                        'VALUES (?, ?, ?)',
+                        (rng.randrange(AUTHORS), 'x' * 200, time.time()),
+                    )
+                stats['writes'] += 1
+                stats['write_ms'].append(
+                    (time.perf_counter() - started) * 1000)
+            else:
+                current.execute(
+                    'SELECT id, text FROM entry WHERE author = ? '
+                    'ORDER BY pub_date DESC LIMIT 10',
+                    (rng.randrange(AUTHORS),),
+                ).fetchall()
+                stats['reads'] += 1
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            stats['locked'] += 1
+        finally:
+            if connection is None:
+                current.close()
+    if connection is not None:
+        connection.close()
+    return stats
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при параллельных '
+            'чтениях и записях: без настройки, с SQLITE_PRAGMAS и '
+            'с PRAGMA вместе с постоянными соединениями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=8,
+            help='Сколько процессов обращаются к базе одновременно.',
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность замера каждой конфигурации.',
+        )
+        parser.add_argument(
+            '--write-share', type=float, default=0.2,
+            help='Доля записей среди операций.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"конфигурация":<16} {"чтений/с":>10} {"записей/с":>10} '
+            f'{"p95 записи, мс":>15} {"locked":>7}'
+        )
+        for name, pragmas, reuse in CONFIGS:
+            if pragmas is None:
+                pragmas = settings.SQLITE_PRAGMAS
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                create_database(path, pragmas)
+                result = self._run(path, pragmas, reuse, options)
+            self.stdout.write(
+                f'{name:<16} {result["reads"] / options["seconds"]:>10.0f} '
+                f'{result["writes"] / options["seconds"]:>10.0f} '
+                f'{percentile(result["write_ms"], 95):>15.2f} '
+                f'{result["locked"]:>7}'
+            )
+
+    def _run(self, path, pragmas, reuse, options):
+        deadline = time.time() + options['seconds']
+        tasks = [
+            (path, pragmas, reuse, deadline, options['write_share'], seed)
+            for seed in range(options['processes'])
+        ]
+        total = {'reads': 0, 'writes': 0, 'locked': 0, 'write_ms': []}
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes']) as pool:
+            for stats in pool.map(work, tasks):
+                for key, value in stats.items():
+                    total[key] += value
+        return total
@@ -0,0 +1,31 @@
+from core import cache
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кэша страниц '
+            'по представлениям, чтобы подбирать TTL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        # импорт URLConf регистрирует все закэшированные представления
+        get_resolver().url_patterns
+        views = sorted(cache.cached_views)
+        stats = cache.get_stats(views)
+        for view in views:
+            hits = stats[view][cache.HIT]
+            misses = stats[view][cache.MISS]
+            total = hits + misses
+            ratio = hits / total if total else 0
+            self.stdout.write(
+                f'{view:<40} попаданий: {hits:<8} '
+                f'промахов: {misses:<8} доля: {ratio:.0%}'
+            )
+        if options['reset']:
+            cache.reset_stats(views)
@@ -0,0 +1,165 @@
+"""Метрики запросов по представлениям.
+
+Для каждого запроса считаются SQL-запросы и время в БД, время рендера
+шаблонов, общее время и результат обращения к кэшу страниц. Метрики
+накапливаются по имени URL ('posts:index', ...) в памяти процесса
+и периодически записываются в JSON-файл settings.METRICS_FILE.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.template.backends.django import Template
+
+from .cache import HIT, MISS
+
+_local = threading.local()
+_lock = threading.Lock()
+_aggregated: Dict[str, Dict[str, float]] = {}
+_last_flush = time.monotonic()
+_template_timer_installed = False
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.cache = None
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper: считает запросы к БД."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing, длительности в мс."""
+        timings = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ]
+        if self.cache is not None:
+            timings.append(f'cache;desc="{self.cache}"')
+        return ', '.join(timings)
+
+
+def current() -> Optional[RequestMetrics]:
+    """Метрики запроса, обрабатываемого в текущем потоке."""
+    return getattr(_local, 'metrics', None)
+
+
+def activate(metrics: Optional[RequestMetrics]) -> None:
+    _local.metrics = metrics
+
+
+def install_template_timer() -> None:
+    """Включает учёт времени рендера шаблонов.
+    Оборачивается Template.render бэкенда Django: его вызывают render()
+    и render_to_string(), а {% include %} внутри шаблона - нет.
+    """
+    global _template_timer_installed
+    if _template_timer_installed:
+        return
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return render(self, context, request)
+        # вложенный render_to_string уже учтён во внешнем рендере
+        metrics._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.template_time += time.perf_counter() - start
+
+    Template.render = timed_render
+    _template_timer_installed = True
+
+
+def record(view_name: str, metrics: RequestMetrics) -> None:
+    """Добавляет метрики запроса к накопленным по представлению."""
+    with _lock:
+        totals = _aggregated.setdefault(view_name, {
+            'requests': 0,
+            'queries': 0,
+            'max_queries': 0,
+            'db_time': 0.0,
+            'template_time': 0.0,
+            'total_time': 0.0,
+            HIT: 0,
+            MISS: 0,
+        })
+        totals['requests'] += 1
+        totals['queries'] += metrics.queries
+        totals['max_queries'] = max(totals['max_queries'], metrics.queries)
+        totals['db_time'] += metrics.db_time
+        totals['template_time'] += metrics.template_time
+        totals['total_time'] += metrics.total_time
+        if metrics.cache in (HIT, MISS):
+            totals[metrics.cache] += 1
+    if settings.METRICS_FILE and (
+            time.monotonic() - _last_flush
+            >= settings.METRICS_FLUSH_INTERVAL):
+        flush()
+
+
+def get_report() -> Dict[str, Dict[str, float]]:
+    """Средние значения по представлениям, время в мс."""
+    report = {}
+    with _lock:
+        for view_name, totals in sorted(_aggregated.items()):
+            requests = totals['requests']
+            lookups = totals[HIT] + totals[MISS]
+            report[view_name] = {
+                'requests': requests,
+                'avg_queries': round(totals['queries'] / requests, 2),
+                'max_queries': totals['max_queries'],
+                'avg_db_ms': round(totals['db_time'] * 1000 / requests, 2),
+                'avg_template_ms': round(
+                    totals['template_time'] * 1000 / requests, 2),
+                'avg_total_ms': round(
+                    totals['total_time'] * 1000 / requests, 2),
+                'cache_hit_ratio': (
+                    round(totals[HIT] / lookups, 3) if lookups else None
+                ),
+            }
+    return report
+
+
+def reset() -> None:
+    with _lock:
+        _aggregated.clear()
+
+
+def flush() -> None:
+    """Записывает накопленные метрики в settings.METRICS_FILE.
+    {pid} в имени файла заменяется номером процесса, чтобы воркеры
+    не перезаписывали файлы друг друга.
+    """
+    global _last_flush
+    _last_flush = time.monotonic()
+    path = settings.METRICS_FILE.format(pid=os.getpid())
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # файл заменяется целиком, читатель не увидит его наполовину записанным
+    with tempfile.NamedTemporaryFile(
+            'w', dir=directory, delete=False, encoding='utf-8') as file:
+        json.dump(get_report(), file, ensure_ascii=False, indent=2)
+    os.replace(file.name, path)
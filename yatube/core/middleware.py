@@ -0,0 +1,53 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """Считает SQL-запросы, время в БД и рендера шаблонов для каждого
+    запроса, отдаёт их в заголовке Server-Timing и накапливает
+    по имени URL. Превышение settings.QUERY_BUDGETS пишется в лог.
+    Работает и при DEBUG = False, в отличие от debug_toolbar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install_template_timer()
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        metrics.activate(request_metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(request_metrics)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.activate(None)
+        request_metrics.total_time = time.perf_counter() - start
+        request_metrics.cache = response.get('X-Page-Cache')
+
+        response['Server-Timing'] = request_metrics.server_timing()
+        # тесты сверяют количество запросов с бюджетом представления
+        response.metrics = request_metrics
+
+        match = request.resolver_match
+        if match is not None:
+            metrics.record(match.view_name, request_metrics)
+            budget = settings.QUERY_BUDGETS.get(match.view_name)
+            if budget is not None and request_metrics.queries > budget:
+                logger.warning(
+                    '%s: %d SQL-запросов при бюджете %d',
+                    match.view_name, request_metrics.queries, budget,
+                )
+        return response
@@ -1,4 +1,9 @@
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, Tuple
+
 from django.db import models
+from django.utils import timezone
 
 
 class PubDateModel(models.Model):
@@ -11,3 +16,118 @@ class PubDateModel(models.Model):
     class Meta:
         abstract = True
         ordering = ['-pub_date']
+
+
+class VersionedQuerySet(models.QuerySet):
+    """update() увеличивает version и сдвигает updated_at у всех
+    затронутых строк, если меняется хоть одно отслеживаемое поле.
+    """
+
+    def update(self, **kwargs):
+        if not set(kwargs) <= set(self.model.untracked_fields):
+            kwargs.setdefault('version', models.F('version') + 1)
+            kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+
+class VersionedModel(models.Model):
+    """Абстрактная модель. Добавляет дату последнего изменения
+    и версию, которая растёт при каждом сохранении и update().
+    Версия входит в ключи кэша (core.cache.versioned_key), поэтому
+    закэшированное по старой версии просто перестаёт находиться.
+    Изменения только полей untracked_fields (денормализованных
+    счётчиков) версию не меняют, а save() существующей записи
+    эти поля не перезаписывает.
+    """
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    version = models.PositiveIntegerField(
+        'Версия', default=1, editable=False
+    )
+
+    untracked_fields: Tuple[str, ...] = ()
+
+    objects = VersionedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if (update_fields is None and self.untracked_fields
+                and not self._state.adding):
+            # счётчики меняются только атомарными UPDATE: полное
+            # сохранение не записывает прочитанное раньше значение
+            # поверх параллельных прибавлений
+            skipped = {*self.untracked_fields, *self.get_deferred_fields()}
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        tracked = not self._state.adding and (
+            update_fields is None
+            or not set(update_fields) <= set(self.untracked_fields)
+        )
+        version = self.version
+        if tracked:
+            # прибавление в самом UPDATE: параллельные правки
+            # не получат одну и ту же версию
+            self.version = models.F('version') + 1
+            if update_fields is not None:
+                update_fields = {*update_fields, 'version', 'updated_at'}
+        try:
+            super().save(*args, update_fields=update_fields, **kwargs)
+        finally:
+            # если запись не удалась, версия остаётся прежней
+            if hasattr(self.version, 'resolve_expression'):
+                self.version = version
+
+    def _save_table(self, raw=False, cls=None, force_insert=False,
+                    force_update=False, using=None, update_fields=None):
+        updated = super()._save_table(
+            raw, cls, force_insert, force_update, using, update_fields
+        )
+        # новая версия читается до post_save: получатели сигнала
+        # видят число, а не выражение
+        if hasattr(self.version, 'resolve_expression'):
+            self.refresh_from_db(using=using, fields=['version'])
+        return updated
+
+
+@contextmanager
+def preserve_pub_date(*model_classes):
+    """Временно отключает auto_now_add у поля pub_date,
+    чтобы bulk_create сохранил переданные даты.
+    Предназначен для команд управления, не для запросов.
+    """
+    fields = [model._meta.get_field('pub_date') for model in model_classes]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def bulk_insert(model, objects: Iterable[models.Model], chunk_size: int,
+                ignore_conflicts: bool = False) -> int:
+    """Вставляет объекты из итератора пачками по chunk_size,
+    не собирая их в один список. Размер отдельного INSERT Django
+    подбирает сам: у SQLite он ограничен 500 строками.
+    Возвращает количество переданных объектов.
+    """
+    objects = iter(objects)
+    inserted = 0
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return inserted
+        model.objects.bulk_create(chunk, ignore_conflicts=ignore_conflicts)
+        inserted += len(chunk)
+
+
+def raw_delete(queryset: models.QuerySet) -> int:
+    """Удаляет строки выборки одним DELETE, не загружая объекты.
+    Сигналы не вызываются и каскад не выполняется: зависимые строки
+    нужно удалить раньше. Возвращает количество удалённых строк.
+    """
+    return queryset._raw_delete(queryset.db)
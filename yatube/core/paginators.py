@@ -0,0 +1,176 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+FORWARD = 'n'
+BACKWARD = 'p'
+# целые в SQL - 64-битные со знаком: большее число БД не примет
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+class KeysetPage(Sequence):
+    """Страница seek-пагинации.
+
+    В отличие от django.core.paginator.Page не знает своего номера
+    и общего количества страниц, зато умеет отдавать курсоры
+    на соседние страницы.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list: list, paginator: 'KeysetPaginator',
+                 has_next: bool, has_previous: bool) -> None:
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self) -> str:
+        return f'<Keyset page of {len(self)} objects>'
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(FORWARD, self.object_list[-1])
+
+    @property
+    def previous_cursor(self) -> Optional[str]:
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(BACKWARD, self.object_list[0])
+
+
+class KeysetPaginator:
+    """Пагинатор по ключу (seek-пагинация).
+
+    Выбирает страницу условием «ключ меньше, чем у последнего
+    элемента предыдущей страницы» вместо OFFSET и не выполняет
+    COUNT(*), поэтому стоимость запроса не зависит от глубины страницы.
+    Ключ - набор полей или аннотаций, по которым записи упорядочены
+    по убыванию; последний элемент ключа должен быть уникальным.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 keys: Tuple[str, ...] = ('pub_date', 'pk')) -> None:
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = keys
+        self.fields = [_key_field(object_list, key) for key in keys]
+
+    def get_page(self, cursor: Optional[str]) -> KeysetPage:
+        """Возвращает страницу по курсору.
+        Пустой или испорченный курсор ведёт на первую страницу.
+        """
+        try:
+            direction, values = self.decode_cursor(cursor)
+        except InvalidCursor:
+            direction, values = FORWARD, None
+
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(direction, values))
+        if direction == FORWARD:
+            ordering = [f'-{key}' for key in self.keys]
+        else:
+            ordering = list(self.keys)
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == FORWARD:
+            return KeysetPage(rows, self, has_more, values is not None)
+        rows.reverse()
+        return KeysetPage(rows, self, True, has_more)
+
+    def _seek(self, direction: str, values: List[Any]) -> Q:
+        """Условие «ключ лексикографически после курсора».
+
+        Первое поле дополнительно ограничено нестрогим неравенством,
+        чтобы БД могла начать чтение индекса сразу с нужного места.
+        """
+        strict = 'lt' if direction == FORWARD else 'gt'
+        loose = 'lte' if direction == FORWARD else 'gte'
+        condition = Q()
+        equal = {}
+        for key, value in zip(self.keys, values):
+            condition |= Q(**equal, **{f'{key}__{strict}': value})
+            equal[key] = value
+        return Q(**{f'{self.keys[0]}__{loose}': values[0]}) & condition
+
+    def encode_cursor(self, direction: str, obj) -> str:
+        values = [_serialize(_key_value(obj, key)) for key in self.keys]
+        raw = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: Optional[str]) -> Tuple[str, List[Any]]:
+        if not cursor:
+            raise InvalidCursor
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            if direction not in (FORWARD, BACKWARD):
+                raise InvalidCursor
+            if len(values) != len(self.fields):
+                raise InvalidCursor
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            if any(isinstance(value, int) and abs(value) > MAX_INTEGER
+                   for value in values):
+                raise InvalidCursor
+            return direction, values
+        except (ValueError, TypeError, OverflowError, binascii.Error,
+                ValidationError) as error:
+            raise InvalidCursor from error
+
+
+def _key_field(queryset: QuerySet, key: str):
+    annotation = queryset.query.annotations.get(key)
+    if annotation is not None:
+        return annotation.output_field
+    if key == 'pk':
+        return queryset.model._meta.pk
+    return queryset.model._meta.get_field(key)
+
+
+def _key_value(obj, key: str):
+    # строки values() - словари
+    if isinstance(obj, dict):
+        return obj[key]
+    return getattr(obj, key)
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
@@ -0,0 +1,14 @@
+"""Ход команд управления, которые загружают и выгружают данные."""
+
+
+class RateReportMixin:
+    """Примесь к BaseCommand: пишет в stdout число обработанных
+    строк этапа, время и скорость.
+    """
+
+    def report_rate(self, stage: str, rows: int, seconds: float) -> None:
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(
+            f'{stage:<10} {rows:>10} строк за {seconds:>7.1f} с '
+            f'({rate:.0f} строк/с)'
+        )
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+
+class ReadReplicaRouter:
+    """Отправляет чтение моделей из settings.REPLICA_READ_MODELS
+    в соединение только для чтения 'replica', если оно настроено.
+    Запись всегда идёт в default. Внутри транзакции чтение тоже
+    остаётся в default, иначе незафиксированные данные не видны.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in connections.databases:
+            return None
+        if model._meta.label not in settings.REPLICA_READ_MODELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # объект, прочитанный из реплики, сохраняется в default
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика - та же база, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -0,0 +1,11 @@
+from core.cache import get_versions
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def cache_versions(*scopes):
+    """Версии областей данных одной строкой - для ключа {% cache %}."""
+    versions = get_versions(scopes)
+    return '.'.join(str(versions[scope]) for scope in scopes)
@@ -0,0 +1,10 @@
+from core.admin import cached_date_hierarchy
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def large_table_date_hierarchy(cl):
+    """date_hierarchy с кэшем лет и месяцев (core.admin)."""
+    return cached_date_hierarchy(cl)
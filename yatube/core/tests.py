@@ -1,6 +1,20 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from posts.models import Group, Post
+
+from . import metrics
+from .db import estimate_count
+from .routers import REPLICA_DB_ALIAS, ReadReplicaRouter
 
 User = get_user_model()
 
@@ -12,3 +26,80 @@ class CoreViewsTest(TestCase):
         """Страница ошибки 404 (NOT_FOUND) использует правильный шаблон."""
         response = self.client.get('/non-exist-page/')
         self.assertTemplateUsed(response, settings.NOT_FOUND_TEMPLATE)
+
+
+class MetricsTest(TestCase):
+    """Тест метрик запросов по представлениям."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_metrics_are_aggregated_by_url_name(self):
+        """Метрики копятся по имени URL и записываются в файл."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics-{pid}.json')
+            with override_settings(METRICS_FILE=path):
+                first = self.client.get('/')
+                second = self.client.get('/')
+                metrics.flush()
+            with open(path.format(pid=os.getpid()), encoding='utf-8') as file:
+                report = json.load(file)
+
+        self.assertIn('db;dur=', first['Server-Timing'])
+        self.assertIn('cache;desc="hit"', second['Server-Timing'])
+        self.assertEqual(report['posts:index']['requests'], 2)
+        self.assertEqual(
+            report['posts:index']['max_queries'], first.metrics.queries
+        )
+        # второй запрос анонимного посетителя отдан из кэша страниц
+        self.assertEqual(report['posts:index']['cache_hit_ratio'], 0.5)
+
+
+class DatabaseTuningTest(TestCase):
+    """Тест настройки соединений с SQLite и маршрутизации чтения."""
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+        pragmas = {
+            name: connection.connection.execute(
+                f'PRAGMA {name}').fetchone()[0]
+            for name in ('synchronous', 'busy_timeout', 'cache_size')
+        }
+        self.assertEqual(pragmas, {
+            # 1 - NORMAL
+            'synchronous': 1,
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+            'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+        })
+
+    def test_router_sends_reads_outside_transactions_to_replica(self):
+        """Чтение постов уходит в реплику, если она настроена
+        и нет открытой транзакции; запись всегда в default.
+        """
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with mock.patch.dict(connections.databases, {REPLICA_DB_ALIAS: {}}):
+            # TestCase выполняется внутри транзакции
+            self.assertEqual(router.db_for_read(Post), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(router.db_for_read(Post), REPLICA_DB_ALIAS)
+                self.assertIsNone(router.db_for_read(Group))
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertFalse(router.allow_migrate(REPLICA_DB_ALIAS, 'posts'))
+
+    def test_count_is_estimated_from_statistics(self):
+        """Размер таблицы берётся из статистики ANALYZE."""
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=author, text=str(number)) for number in range(3)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Post), 3)
+
+    def test_bench_sqlite_reports_every_config(self):
+        """bench_sqlite выводит строку на каждую конфигурацию."""
+        out = StringIO()
+        call_command('bench_sqlite', processes=2, seconds=0.2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
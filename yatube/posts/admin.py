@@ -1,12 +1,17 @@
-from django.contrib import admin
+from core.admin import LargeTableAdmin, confirm_action
+from django.conf import settings
+from django.contrib import admin, messages
+from django.db.models.functions import Substr
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from . import moderation, search
+from .forms import MoveToGroupForm, PurgeCommentsForm
 from .models import Comment, Follow, Group, Post
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     """Настройка административной панели для управления постами."""
 
     list_display = (
@@ -21,25 +26,87 @@ class PostAdmin(admin.ModelAdmin):
         'pk',
         'text',
     )
+    # группу список читает в каждой строке, хоть и показывает
+    # полем list_editable
     list_select_related = ('author', 'group',)
+    # version и updated_at нужны при сохранении из списка
+    list_only = (
+        'text', 'pub_date', 'image', 'author__username', 'group__title',
+        'version', 'updated_at',
+    )
+    keyset_keys = ('pub_date', 'pk')
     search_fields = ('text',)
+    # оба по индексу pub_date: фильтр - диапазон дат,
+    # date_hierarchy - годы и месяцы из кэша
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     list_editable = ('group',)
     empty_value_display = '-пусто-'
+    # выполняются пачками UPDATE/DELETE, без сигналов на каждую строку
+    actions = ('move_to_group', 'delete_with_comments', 'delete_by_author')
 
     def view_on_site(self, obj):
         url = reverse('posts:post_details', kwargs={'post_id': obj.pk})
         return url
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск идёт по полнотекстовому индексу, а не LIKE '%...%'."""
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
     def get_html_image(self, object):
         if object.image:
             return mark_safe(f'<img src="{object.image.url}" height=30>')
 
     get_html_image.short_description = 'Картинка'
 
+    def move_to_group(self, request, queryset):
+        form, response = confirm_action(
+            self, request, 'move_to_group', 'Перенести в группу',
+            'Посты будут перенесены в выбранную группу.', MoveToGroupForm,
+        )
+        if form is None:
+            return response
+        moved = moderation.move_to_group(queryset, form.cleaned_data['group'])
+        self.message_user(
+            request, f'Перенесено постов: {moved}.', messages.SUCCESS)
+
+    move_to_group.short_description = 'Перенести в группу'
+    move_to_group.allowed_permissions = ('change',)
+
+    def delete_with_comments(self, request, queryset):
+        form, response = confirm_action(
+            self, request, 'delete_with_comments', 'Удалить с комментариями',
+            'Посты будут удалены вместе с комментариями.',
+        )
+        if form is None:
+            return response
+        deleted = moderation.delete_posts(queryset)
+        self.message_user(
+            request, f'Удалено постов: {deleted}.', messages.SUCCESS)
+
+    delete_with_comments.short_description = 'Удалить с комментариями'
+    delete_with_comments.allowed_permissions = ('delete',)
+
+    def delete_by_author(self, request, queryset):
+        form, response = confirm_action(
+            self, request, 'delete_by_author', 'Удалить все посты авторов',
+            'Будут удалены все посты авторов выбранных постов '
+            'вместе с комментариями.',
+        )
+        if form is None:
+            return response
+        deleted = moderation.delete_author_posts(queryset)
+        self.message_user(
+            request, f'Удалено постов: {deleted}.', messages.SUCCESS)
+
+    delete_by_author.short_description = 'Удалить все посты авторов'
+    delete_by_author.allowed_permissions = ('delete',)
+
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     """Настройка административной панели для управления подписками."""
 
     list_display = (
@@ -47,31 +114,86 @@ class FollowAdmin(admin.ModelAdmin):
         'user',
         'author',
     )
+    # строка списка - id подписки и два имени пользователей из JOIN
+    list_select_related = ('user', 'author',)
+    list_only = ('user__username', 'author__username')
     search_fields = (
         'user__username__startswith',
         'author__username__startswith',
     )
+    # поиск по пользователям вместо <select> со всеми пользователями
+    autocomplete_fields = ('user', 'author',)
+
+    def get_queryset(self, request):
+        # __str__ подписки - два имени: страницы изменения и удаления,
+        # история и сообщения получают их тем же JOIN, что и список
+        return super().get_queryset(request).select_related('user', 'author')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     """Настройка административной панели для управления комментариями."""
 
     list_display = (
         'pk',
-        'text',
-        'post',
+        'short_text',
+        'post_text',
         'author',
     )
     list_display_links = (
         'pk',
-        'text',
+        'short_text',
     )
-    list_select_related = ('post', 'author',)
+    list_select_related = ('author',)
+    list_only = ('pub_date', 'post', 'author__username')
+    # начало текста поста вместо str(post): строка поста целиком
+    # не читается
+    list_annotations = {
+        'short_text': Substr('text', 1, settings.ADMIN_TEXT_LENGTH),
+        'post_text': Substr('post__text', 1, settings.POST_STR_LENGTH),
+    }
+    keyset_keys = ('pub_date', 'pk')
     search_fields = (
         'post__text',
         'text',
     )
+    date_hierarchy = 'pub_date'
+    actions = ('purge_matching',)
+
+    def short_text(self, obj):
+        return obj.short_text
+
+    short_text.short_description = 'Текст'
+    short_text.admin_order_field = 'text'
+
+    def post_text(self, obj):
+        return obj.post_text
+
+    post_text.short_description = 'Пост'
+    post_text.admin_order_field = 'post__text'
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск идёт по полнотекстовому индексу, а не LIKE '%...%'."""
+        if not search_term:
+            return queryset, False
+        return search.filter_comments(queryset, search_term), False
+
+    def purge_matching(self, request, queryset):
+        form, response = confirm_action(
+            self, request, 'purge_matching', 'Удалить комментарии с текстом',
+            'Из выбранных будут удалены комментарии, '
+            'в тексте которых есть все слова.',
+            PurgeCommentsForm, initial={'text': request.GET.get('q')},
+        )
+        if form is None:
+            return response
+        deleted = moderation.purge_comments(
+            queryset, form.cleaned_data['text'])
+        self.message_user(
+            request, f'Удалено комментариев: {deleted}.', messages.SUCCESS)
+
+    purge_matching.short_description = 'Удалить комментарии с текстом'
+    purge_matching.allowed_permissions = ('delete',)
 
 
 @admin.register(Group)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Форум писателей'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,75 @@
+"""Кэш отрендеренных карточек постов (includes/post.html).
+
+Один и тот же пост показывается на главной, в группе, в профиле,
+в ленте подписок и в поиске, и везде рендерится заново: linebreaks,
+get_full_name, фильтр даты, миниатюра и reverse ссылок. Карточка
+рендерится один раз и кэшируется под ключом с версией поста и группы
+(core.cache.versioned_key), именем автора и признаком готовой
+миниатюры - ключ меняется вместе с любым из них, поэтому сбрасывать
+карточки не нужно.
+Карточки страницы достаются из кэша одним get_many, недостающие
+рендерятся и кладутся одним set_many.
+"""
+import hashlib
+from typing import Iterable
+
+from core.cache import versioned_key
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import SafeString, mark_safe
+
+from . import thumbnails
+from .models import Post
+
+CARD_TEMPLATE = 'includes/post.html'
+# атрибут поста с готовой карточкой
+RENDERED_ATTR = '_rendered_card'
+
+
+def card_key(post: Post) -> str:
+    thumbnail = thumbnails.thumbnail_for(post) is not None
+    author = hashlib.md5(
+        f'{post.author.get_full_name()}:{thumbnail}'.encode()
+    ).hexdigest()
+    return f'{versioned_key("post-card", post, post.group)}:{author}'
+
+
+def _render(post: Post) -> SafeString:
+    return mark_safe(render_to_string(CARD_TEMPLATE, {'post': post}))
+
+
+def prefetch(posts: Iterable[Post]) -> None:
+    """Находит карточки всех постов страницы одним get_many
+    и рендерит недостающие.
+    """
+    # ключ учитывает миниатюру - её ищем тоже сразу для всех
+    posts = [post for post in posts if not hasattr(post, RENDERED_ATTR)]
+    thumbnails.prefetch(
+        post for post in posts
+        if not hasattr(post, thumbnails.PREFETCHED_ATTR)
+    )
+    keys = {card_key(post): post for post in posts}
+    found = cache.get_many(list(keys))
+    rendered = {}
+    for key, post in keys.items():
+        if key in found:
+            setattr(post, RENDERED_ATTR, mark_safe(found[key]))
+            if post.image and thumbnails.thumbnail_for(post) is None:
+                # карточка без миниатюры - пусть миниатюра появится
+                thumbnails.submit(post.image)
+        else:
+            rendered[key] = _render(post)
+            setattr(post, RENDERED_ATTR, rendered[key])
+    if rendered:
+        cache.set_many(
+            {key: str(html) for key, html in rendered.items()},
+            settings.FRAGMENT_CACHE_TIMEOUT,
+        )
+
+
+def render(post: Post) -> SafeString:
+    """Карточка поста: из prefetch или из кэша."""
+    if not hasattr(post, RENDERED_ATTR):
+        prefetch([post])
+    return getattr(post, RENDERED_ATTR)
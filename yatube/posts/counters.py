@@ -0,0 +1,120 @@
+"""Денормализованные счётчики.
+
+Количество постов, подписчиков и подписок пользователя хранится
+в UserStats, количество комментариев - в Post.comments_count.
+Счётчики меняются атомарными UPDATE ... SET x = x + 1 из сигналов,
+а команда reconcile_counters исправляет накопившееся расхождение.
+"""
+from typing import Iterable
+
+from core.models import bulk_insert
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.query import QuerySet
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _count_subquery(queryset: QuerySet, field: str) -> Coalesce:
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+        field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def actual_user_counts() -> dict:
+    """Выражения для подсчёта счётчиков пользователя по таблицам.
+    Подходят и для User, и для UserStats: первичный ключ у них общий.
+    """
+    return {
+        'posts_count': _count_subquery(Post.objects.all(), 'author'),
+        'followers_count': _count_subquery(Follow.objects.all(), 'author'),
+        'following_count': _count_subquery(Follow.objects.all(), 'user'),
+    }
+
+
+def reset_user_stats(user_id: int) -> UserStats:
+    """Пересчитывает счётчики пользователя по таблицам."""
+    counts = User.objects.filter(pk=user_id).values(
+        **actual_user_counts()).get()
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=counts
+    )
+    return stats
+
+
+def _shifted(name: str, delta: int) -> Greatest:
+    # разошедшийся счётчик не уходит ниже нуля: поле беззнаковое,
+    # и UPDATE с отрицательным значением упал бы вместе с транзакцией
+    return Greatest(F(name) + delta, 0)
+
+
+def change_user_stats(user_id: int, **deltas: int) -> None:
+    """Атомарно сдвигает счётчики пользователя на deltas.
+    Отсутствующая запись не создаётся: её пересчитает get_stats.
+    """
+    UserStats.objects.filter(user_id=user_id).update(
+        **{name: _shifted(name, delta) for name, delta in deltas.items()}
+    )
+
+
+def change_comments_count(post_id: int, delta: int) -> None:
+    """Атомарно сдвигает счётчик комментариев поста."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta)
+    )
+
+
+def get_stats(user: User) -> UserStats:
+    """Счётчики пользователя; создаются, если их ещё нет."""
+    try:
+        return user.stats
+    except ObjectDoesNotExist:
+        return reset_user_stats(user.pk)
+
+
+def reconcile_users() -> int:
+    """Исправляет счётчики пользователей, разошедшиеся с таблицами.
+    Возвращает количество исправленных записей.
+    """
+    bulk_insert(
+        UserStats,
+        (UserStats(user_id=user_id) for user_id in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        1000,
+        ignore_conflicts=True,
+    )
+    counts = actual_user_counts()
+    drifted = UserStats.objects.annotate(
+        **{f'actual_{name}': value for name, value in counts.items()}
+    ).exclude(
+        **{name: F(f'actual_{name}') for name in counts}
+    ).values_list('pk', flat=True)
+    return UserStats.objects.filter(pk__in=list(drifted)).update(**counts)
+
+
+def reconcile_posts() -> int:
+    """Исправляет счётчики комментариев, разошедшиеся с таблицей."""
+    actual = _count_subquery(Comment.objects.all(), 'post')
+    drifted = Post.objects.annotate(actual=actual).exclude(
+        comments_count=F('actual')
+    ).values_list('pk', flat=True)
+    return Post.objects.filter(pk__in=list(drifted)).update(
+        comments_count=actual
+    )
+
+
+def recount_users(user_ids: Iterable[int]) -> int:
+    """Пересчитывает счётчики пользователей user_ids одним UPDATE
+    с подзапросами, без сверки всей таблицы.
+    """
+    return UserStats.objects.filter(user_id__in=list(user_ids)).update(
+        **actual_user_counts()
+    )
+
+
+def recount_posts(post_ids: Iterable[int]) -> int:
+    """Пересчитывает счётчики комментариев постов post_ids."""
+    return Post.objects.filter(pk__in=list(post_ids)).update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post')
+    )
@@ -0,0 +1,164 @@
+"""Выгрузка групп, постов, комментариев и подписок в JSONL и CSV.
+
+Каждая таблица пишется в свой файл (posts.jsonl, comments.csv.gz...).
+Строки читаются через values_list и iterator(chunk_size): в памяти
+держится одна пачка строк, объекты моделей не создаются, поэтому
+расход памяти не зависит от размера таблицы. Строки идут по
+возрастанию pk.
+С since выгружаются только посты и группы, изменённые с этого момента
+(по updated_at: новые и отредактированные), и комментарии,
+опубликованные с него - комментарии не редактируются. У подписок
+даты нет, они выгружаются целиком.
+Чтение файлов построчное, для загрузки (posts.importing).
+"""
+import csv
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import IO, Iterable, Iterator, NamedTuple, Optional, Tuple, Type
+
+from django.db import models
+
+from .models import Comment, Follow, Group, Post
+
+CHUNK_SIZE = 2000
+JSONL = 'jsonl'
+CSV = 'csv'
+FORMATS = (JSONL, CSV)
+GZIP_SUFFIX = '.gz'
+
+
+class Table(NamedTuple):
+    """Выгружаемая таблица: модель, поля и поле даты для since."""
+    model: Type[models.Model]
+    fields: Tuple[str, ...]
+    date_field: Optional[str] = None
+
+
+# в порядке зависимостей: группы до постов, посты до комментариев.
+# Денормализованные счётчики не выгружаются - их пересчитывает
+# reconcile_counters.
+TABLES = {
+    'groups': Table(
+        Group,
+        ('id', 'title', 'slug', 'description', 'updated_at', 'version'),
+        'updated_at',
+    ),
+    'posts': Table(
+        Post,
+        ('id', 'author_id', 'group_id', 'text', 'image', 'pub_date',
+         'updated_at', 'version'),
+        'updated_at',
+    ),
+    'comments': Table(
+        Comment,
+        ('id', 'post_id', 'author_id', 'text', 'pub_date'),
+        'pub_date',
+    ),
+    'follows': Table(Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+def file_name(name: str, format: str, compress: bool) -> str:
+    return f'{name}.{format}{GZIP_SUFFIX if compress else ""}'
+
+
+def open_dump(path: str, mode: str = 'r',
+              compress: Optional[bool] = None) -> IO[str]:
+    """Открывает файл выгрузки как текст. Сжатие gzip определяется
+    по расширению .gz, если не задано явно.
+    """
+    if compress is None:
+        compress = path.endswith(GZIP_SUFFIX)
+    if compress:
+        return gzip.open(path, f'{mode}t', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def rows(name: str, since: Optional[datetime] = None,
+         chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """Строки таблицы в порядке pk, читаемые пачками."""
+    table = TABLES[name]
+    queryset = table.model.objects.order_by('pk')
+    if since is not None and table.date_field:
+        queryset = queryset.filter(**{f'{table.date_field}__gte': since})
+    return queryset.values_list(*table.fields).iterator(
+        chunk_size=chunk_size
+    )
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def write_jsonl(file: IO[str], fields: Tuple[str, ...],
+                rows: Iterable[tuple]) -> int:
+    written = 0
+    for row in rows:
+        file.write(json.dumps(
+            dict(zip(fields, map(_encode, row))), ensure_ascii=False
+        ))
+        file.write('\n')
+        written += 1
+    return written
+
+
+def write_csv(file: IO[str], fields: Tuple[str, ...],
+              rows: Iterable[tuple]) -> int:
+    """CSV с заголовком; None записывается пустой строкой."""
+    writer = csv.writer(file)
+    writer.writerow(fields)
+    written = 0
+    for row in rows:
+        writer.writerow(map(_encode, row))
+        written += 1
+    return written
+
+
+WRITERS = {JSONL: write_jsonl, CSV: write_csv}
+
+
+def read_jsonl(file: IO[str]) -> Iterator[dict]:
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file: IO[str]) -> Iterator[dict]:
+    """Строки CSV по заголовку; пустые значения становятся None."""
+    for row in csv.DictReader(file):
+        yield {name: value or None for name, value in row.items()}
+
+
+READERS = {JSONL: read_jsonl, CSV: read_csv}
+
+
+def detect_format(path: str) -> str:
+    """Формат файла по расширению, в том числе под .gz."""
+    name = path[:-len(GZIP_SUFFIX)] if path.endswith(GZIP_SUFFIX) else path
+    return CSV if name.endswith(f'.{CSV}') else JSONL
+
+
+def export_table(name: str, directory: str, format: str = JSONL,
+                 compress: bool = False, since: Optional[datetime] = None,
+                 chunk_size: int = CHUNK_SIZE) -> int:
+    """Выгружает таблицу в файл каталога directory и возвращает
+    число строк. Файл пишется под временным именем и заменяет
+    прежний только целиком.
+    """
+    path = os.path.join(directory, file_name(name, format, compress))
+    partial = f'{path}.partial'
+    try:
+        with open_dump(partial, 'w', compress) as file:
+            written = WRITERS[format](
+                file, TABLES[name].fields, rows(name, since, chunk_size)
+            )
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    return written
@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import Optional, Tuple, Union
 
+from core.paginators import KeysetPage, KeysetPaginator
 from django.conf import settings
 from django.core.paginator import Page, Paginator
 from django.db.models.query import QuerySet
@@ -8,11 +9,24 @@ from django.http import HttpRequest
 
 def create_page_obj(
     elements_list: QuerySet,
-    request: HttpRequest
-) -> Page:
+    request: HttpRequest,
+    keyset: Optional[bool] = None,
+    keys: Tuple[str, ...] = ('pub_date', 'pk'),
+) -> Union[Page, KeysetPage]:
     """Функция, создаёт объект страницы и возвращает его,
     получая на вход элементы из БД и запрос.
+    При keyset=True (по умолчанию - settings.KEYSET_PAGINATION)
+    страница выбирается по курсору ?cursor= без COUNT(*) и OFFSET,
+    ключ сортировки задаётся в keys.
     """
+    if keyset is None:
+        keyset = settings.KEYSET_PAGINATION
+    if keyset:
+        keyset_paginator = KeysetPaginator(
+            elements_list, settings.NUMBER_OF_ELEMENTS_PER_PAGE, keys
+        )
+        return keyset_paginator.get_page(request.GET.get('cursor'))
+
     paginator: Paginator = Paginator(
         elements_list, settings.NUMBER_OF_ELEMENTS_PER_PAGE
     )
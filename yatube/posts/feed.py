@@ -0,0 +1,168 @@
+"""Лента подписок.
+
+Посты обычных авторов раскладываются по лентам подписчиков в момент
+публикации (fan-out on write), и страница /follow/ читает их одним
+диапазоном индекса FeedEntry(user, pub_date). Посты авторов, у которых
+подписчиков больше settings.FEED_FANOUT_LIMIT, в ленты не копируются
+и подмешиваются при чтении (fan-out on read).
+Способ выбирается по текущему числу подписчиков. Пока автор выше
+предела, записи ему не создаются, а старые остаются и не мешают
+подмешиванию. Когда после отписки подписчиков не больше предела,
+а последнего поста автора нет в лентах подписчиков, restore_fanout
+раскладывает все посты автора по лентам подписчиков: иначе посты,
+вышедшие «поверх» предела, пропали бы из лент.
+"""
+from typing import Iterable, List
+
+from core.models import bulk_insert
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+
+from .models import FeedEntry, Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+# ключ сортировки ленты для seek-пагинации
+FEED_KEYS = ('feed_date', 'feed_post')
+
+
+def is_fanout_on_read(author_id: int) -> bool:
+    """Посты автора не раскладываются по лентам подписчиков."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exists()
+
+
+def fanout_on_read_authors(user: User) -> List[int]:
+    """Авторы из подписок пользователя, чьи посты
+    подмешиваются в ленту при чтении.
+    """
+    return list(UserStats.objects.filter(
+        user__following__user=user,
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+
+
+def _bulk_insert(entries: Iterable[FeedEntry]) -> None:
+    bulk_insert(FeedEntry, entries, BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post: Post) -> None:
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_fanout_on_read(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Добавляет в ленту пользователя посты автора,
+    на которого он только что подписался.
+    """
+    if is_fanout_on_read(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def fan_out_author(author_id: int) -> int:
+    """Раскладывает все посты автора по лентам всех его подписчиков.
+    Уже существующие записи пропускаются. Возвращает количество
+    переданных записей.
+    """
+    entries = Follow.objects.filter(
+        author_id=author_id, author__posts__isnull=False,
+    ).values_list('user_id', 'author__posts__pk', 'author__posts__pub_date')
+    return bulk_insert(
+        FeedEntry,
+        (FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id, post_id, pub_date in entries.iterator()),
+        BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def restore_fanout(author_id: int) -> None:
+    """После отписки: если у автора не больше FEED_FANOUT_LIMIT
+    подписчиков, а его последнего поста нет в чьей-то из их лент,
+    посты снова раскладываются. Сверяется состояние лент, а не момент
+    пересечения предела: пропущенный сигнал или разошедшийся счётчик
+    не оставят автора подмешиваемым навсегда.
+    Счётчик подписчиков к этому моменту уже уменьшен.
+    """
+    newest = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk').values('pk')[:1]
+    unserved = Follow.objects.filter(
+        author_id=author_id, author__posts__isnull=False,
+    ).exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).exclude(
+        user__feed_entries__post__in=newest,
+    )
+    if unserved.exists():
+        fan_out_author(author_id)
+
+
+def prune(user_id: int, author_id: int) -> None:
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user: User) -> None:
+    """Пересобирает ленту пользователя с нуля."""
+    FeedEntry.objects.filter(user=user).delete()
+    for author_id in user.follower.values_list('author_id', flat=True):
+        backfill(user.pk, author_id)
+
+
+def rebuild_all() -> int:
+    """Пересобирает все ленты одним проходом по подпискам.
+    Нужна после массовой загрузки через bulk_create, которая
+    не вызывает сигналы. Счётчики подписчиков должны быть сверены.
+    Возвращает количество записей в лентах.
+    """
+    FeedEntry.objects.all().delete()
+    entries = Follow.objects.filter(
+        author__posts__isnull=False,
+    ).exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', 'author__posts__pk', 'author__posts__pub_date')
+    return bulk_insert(
+        FeedEntry,
+        (FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id, post_id, pub_date in entries.iterator()),
+        BATCH_SIZE,
+    )
+
+
+def get_feed(user: User) -> QuerySet:
+    """Посты ленты подписок пользователя, новые сверху.
+    Упорядочены по аннотациям FEED_KEYS, чтобы сортировка
+    шла по индексу FeedEntry, а не по таблице постов.
+    """
+    posts = Post.objects.select_related('group', 'author')
+    heavy_authors = fanout_on_read_authors(user)
+    if not heavy_authors:
+        posts = posts.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post_id'),
+        )
+    else:
+        inbox = FeedEntry.objects.filter(user=user).values('post')
+        posts = posts.filter(
+            Q(pk__in=inbox) | Q(author_id__in=heavy_authors)
+        ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
+    return posts.order_by(*[f'-{key}' for key in FEED_KEYS])
@@ -1,6 +1,7 @@
+from django import forms
 from django.forms import ModelForm
 
-from .models import Post, Comment
+from .models import Comment, Group, Post
 
 
 class PostForm(ModelForm):
@@ -17,3 +18,23 @@ class CommentForm(ModelForm):
     class Meta():
         model = Comment
         fields = ('text',)
+
+
+class MoveToGroupForm(forms.Form):
+    """Форма действия админки «перенести в группу»."""
+
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        empty_label='-без группы-',
+    )
+
+
+class PurgeCommentsForm(forms.Form):
+    """Форма действия админки «удалить комментарии с текстом»."""
+
+    text = forms.CharField(
+        label='Слова',
+        help_text='Удаляются комментарии, в которых есть все слова.',
+    )
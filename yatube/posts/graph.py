@@ -0,0 +1,180 @@
+"""Граф подписок в кэше.
+
+Для каждого пользователя в кэше лежат id авторов, на которых он
+подписан, и id его подписчиков - отсортированными массивами
+array('I') по 4 байта на id. Проверка подписки - двоичный поиск
+по массиву без запроса к БД; массивы нескольких пользователей
+достаются одним get_many, а недостающие читаются одним запросом.
+При подписке и отписке массивы обоих пользователей сбрасываются
+и при следующем обращении читаются заново по индексу.
+
+«Кого почитать» - друзья друзей: авторы, на которых подписаны
+авторы из подписок пользователя, по числу таких подписок. Оценки
+считаются по первым FOLLOW_SUGGESTION_SOURCES подпискам и хранятся
+в кэше; подписка и отписка сбрасывают оценки самого пользователя
+и его подписчиков, чьи оценки считаются и по его подпискам.
+Подписки, загруженные bulk_create в обход сигналов, сбрасываются
+forget_users().
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+GRAPH_KEY = 'follow-graph:{kind}:{user_id}'
+SUGGESTIONS_KEY = 'follow-suggestions:{user_id}'
+# сколько ключей сбрасывается одним delete_many
+FORGET_CHUNK = 1000
+# столбцы Follow: чей список и чьи id в нём
+COLUMNS = {
+    FOLLOWING: ('user_id', 'author_id'),
+    FOLLOWERS: ('author_id', 'user_id'),
+}
+
+
+def _key(kind: str, user_id: int) -> str:
+    return GRAPH_KEY.format(kind=kind, user_id=user_id)
+
+
+def _unpack(value: bytes) -> array:
+    ids = array('I')
+    ids.frombytes(value)
+    return ids
+
+
+def load(kind: str, user_ids: Iterable[int]) -> Dict[int, array]:
+    """Массивы id пользователей user_ids: из кэша одним get_many,
+    недостающие - одним запросом к Follow.
+    """
+    keys = {_key(kind, user_id): user_id for user_id in user_ids}
+    found = cache.get_many(keys)
+    graph = {keys[key]: _unpack(value) for key, value in found.items()}
+    missing = [user_id for user_id in keys.values() if user_id not in graph]
+    if missing:
+        owner, other = COLUMNS[kind]
+        loaded = {user_id: array('I') for user_id in missing}
+        # без ORDER BY: подписчикам не нужен индекс (author, user)
+        # для сортировки в БД, массивы сортируются здесь
+        rows = Follow.objects.filter(
+            **{f'{owner}__in': missing}).order_by().values_list(owner, other)
+        for user_id, other_id in rows.iterator():
+            loaded[user_id].append(other_id)
+        for user_id, ids in loaded.items():
+            loaded[user_id] = array('I', sorted(ids))
+        cache.set_many(
+            {_key(kind, user_id): ids.tobytes()
+             for user_id, ids in loaded.items()},
+            settings.FOLLOW_GRAPH_TIMEOUT,
+        )
+        graph.update(loaded)
+    return graph
+
+
+def following_ids(user_id: int) -> array:
+    """id авторов, на которых подписан пользователь, по возрастанию."""
+    return load(FOLLOWING, [user_id])[user_id]
+
+
+def follower_ids(user_id: int) -> array:
+    """id подписчиков пользователя по возрастанию."""
+    return load(FOLLOWERS, [user_id])[user_id]
+
+
+def _contains(ids: array, value: int) -> bool:
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id: int, author_id: int) -> bool:
+    return _contains(following_ids(user_id), author_id)
+
+
+def _scores(user_id: int) -> Dict[int, int]:
+    key = SUGGESTIONS_KEY.format(user_id=user_id)
+    scores = cache.get(key)
+    if scores is None:
+        sources = following_ids(user_id)[:settings.FOLLOW_SUGGESTION_SOURCES]
+        scores = {}
+        for ids in load(FOLLOWING, sources).values():
+            for candidate in ids:
+                scores[candidate] = scores.get(candidate, 0) + 1
+        cache.set(key, scores, settings.FOLLOW_GRAPH_TIMEOUT)
+    return scores
+
+
+def suggestions(user_id: int, limit: Optional[int] = None) -> List[int]:
+    """id авторов, на которых подписаны авторы из подписок
+    пользователя, сам он - нет; сначала самые частые.
+    """
+    followed = following_ids(user_id)
+    candidates = (
+        (score, -candidate)
+        for candidate, score in _scores(user_id).items()
+        if candidate != user_id and not _contains(followed, candidate)
+    )
+    return [
+        -candidate for _, candidate in heapq.nlargest(
+            limit or settings.FOLLOW_SUGGESTIONS_COUNT, candidates)
+    ]
+
+
+def _delete_many(keys: List[str]) -> None:
+    for start in range(0, len(keys), FORGET_CHUNK):
+        cache.delete_many(keys[start:start + FORGET_CHUNK])
+
+
+def _forget(user_id: int, author_id: int) -> None:
+    # оценки не сдвигаются, а сбрасываются: чтение-изменение-запись
+    # в кэше до фиксации транзакции теряло бы параллельные правки.
+    # Подписки пользователя входят в оценки его подписчиков
+    keys = [
+        _key(FOLLOWING, user_id),
+        _key(FOLLOWERS, author_id),
+        SUGGESTIONS_KEY.format(user_id=user_id),
+    ] + [
+        SUGGESTIONS_KEY.format(user_id=follower_id)
+        for follower_id in follower_ids(user_id)
+    ]
+    _delete_many(keys)
+    # значение, прочитанное другим запросом до фиксации транзакции,
+    # сбрасывается ещё раз после неё
+    transaction.on_commit(lambda: _delete_many(keys))
+
+
+def forget_users(user_ids: Iterable[int]) -> None:
+    """Сбрасывает массивы и оценки пользователей user_ids:
+    после загрузки подписок bulk_create, который не вызывает сигналы.
+    """
+    user_ids = iter(user_ids)
+    while True:
+        chunk = list(islice(user_ids, FORGET_CHUNK))
+        if not chunk:
+            return
+        cache.delete_many([
+            key
+            for user_id in chunk
+            for key in (
+                _key(FOLLOWING, user_id),
+                _key(FOLLOWERS, user_id),
+                SUGGESTIONS_KEY.format(user_id=user_id),
+            )
+        ])
+
+
+def follow(user_id: int, author_id: int) -> None:
+    """Учитывает новую подписку. Вызывается сигналом."""
+    _forget(user_id, author_id)
+
+
+def unfollow(user_id: int, author_id: int) -> None:
+    """Учитывает отписку. Вызывается сигналом."""
+    _forget(user_id, author_id)
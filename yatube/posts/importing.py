@@ -0,0 +1,248 @@
+"""Загрузка постов и комментариев из JSONL и CSV, например из старого
+блога, в обход PostForm и сигналов.
+
+Файлы читаются построчно (posts.dumps). Авторы ищутся по username
+или author_id, группы - по slug или group_id в словарях, которые
+строятся один раз на загрузку. Объекты вставляются bulk_create,
+по batch_size строк в транзакции. В той же транзакции обновляется
+контрольная точка (ImportCheckpoint) - число обработанных строк
+файла, - поэтому прерванная загрузка продолжается ровно с первой
+незафиксированной строки и не задваивает строки без id. Точки
+удаляются только в конце finish(): если загрузка упала на следующем
+файле, уже загруженные файлы при повторном запуске пропускаются.
+Строки с id сохраняются с этим первичным ключом, уже загруженные
+пропускаются: повторная загрузка файла не создаёт дублей, а
+комментарии находят свои посты по post_id.
+Картинки ищутся в каталоге POST_IMAGE_UPLOAD_TO хранилища по прежнему
+относительному пути; с images_dir недостающие файлы копируются
+из этого каталога, без него строки с отсутствующей картинкой
+пропускаются.
+bulk_create не вызывает сигналы, поэтому счётчики, ленты, поисковый
+индекс и кэш страниц обновляет finish().
+"""
+import os
+import posixpath
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+from core.cache import bump_version
+from core.models import preserve_pub_date
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, dumps, feed, search
+from .models import Comment, Group, ImportCheckpoint, Post, User
+
+BATCH_SIZE = 1000
+MODELS = {
+    'posts': Post,
+    'comments': Comment,
+}
+
+
+class InvalidRow(ValueError):
+    """Строку нельзя загрузить: не хватает полей или не найден
+    автор, группа или пост.
+    """
+
+
+def read_checkpoint(name: str) -> int:
+    """Сколько строк файла уже загружено."""
+    return ImportCheckpoint.objects.filter(name=name).values_list(
+        'rows', flat=True).first() or 0
+
+
+def write_checkpoint(name: str, rows: int) -> None:
+    """Запоминает загруженные строки; вызывается в транзакции пачки."""
+    ImportCheckpoint.objects.update_or_create(
+        name=name, defaults={'rows': rows}
+    )
+
+
+def _row_id(row: dict) -> Optional[int]:
+    # в CSV все значения - строки, а id в базе - числа
+    pk = row.get('id')
+    return None if pk is None else int(pk)
+
+
+class Importer:
+    """Загружает посты и комментарии из файлов.
+    images_dir - каталог с картинками старого сайта.
+    report(этап, строк, секунд) вызывается после каждого этапа.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE,
+                 images_dir: Optional[str] = None,
+                 report: Optional[Callable[[str, int, float], None]] = None):
+        self.batch_size = batch_size
+        self.images_dir = images_dir
+        self.report = report
+        self.now = timezone.now()
+        self.skipped = 0
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.author_ids = set(self.authors.values())
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.group_ids = set(self.groups.values())
+        self.builders = {'posts': self.post, 'comments': self.comment}
+        # контрольные точки загруженных файлов; удаляет finish()
+        self.checkpoints = []
+
+    def _lookup(self, row: dict, name: str, by_name: Dict[str, int],
+                ids: set) -> Optional[int]:
+        """pk автора или группы по {name}_id или по имени."""
+        pk = row.get(f'{name}_id')
+        if pk is not None:
+            if int(pk) in ids:
+                return int(pk)
+        elif row.get(name) is None:
+            return None
+        elif row[name] in by_name:
+            return by_name[row[name]]
+        raise InvalidRow(f'{name} не найден: {pk or row[name]}')
+
+    def _date(self, value: Optional[str]) -> datetime:
+        if not value:
+            return self.now
+        moment = parse_datetime(value)
+        if moment is None:
+            raise InvalidRow(f'неверная дата: {value}')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def image(self, path: Optional[str]) -> str:
+        """Имя картинки в хранилище: прежний относительный путь
+        внутри POST_IMAGE_UPLOAD_TO - одноимённые файлы из разных
+        каталогов не подменяют друг друга.
+        """
+        if not path:
+            return ''
+        relative = posixpath.normpath(path.replace('\\', '/').lstrip('/'))
+        if relative.startswith('..'):
+            raise InvalidRow(f'неверный путь картинки: {path}')
+        name = settings.POST_IMAGE_UPLOAD_TO + relative
+        if default_storage.exists(name):
+            return name
+        if not self.images_dir:
+            raise InvalidRow(f'нет картинки: {name}')
+        source = os.path.join(self.images_dir, *relative.split('/'))
+        if not os.path.exists(source):
+            raise InvalidRow(f'нет картинки: {source}')
+        with open(source, 'rb') as file:
+            return default_storage.save(name, File(file))
+
+    def post(self, row: dict) -> Post:
+        author_id = self._lookup(row, 'author', self.authors, self.author_ids)
+        if author_id is None:
+            raise InvalidRow('не указан автор')
+        return Post(
+            pk=_row_id(row),
+            author_id=author_id,
+            group_id=self._lookup(row, 'group', self.groups, self.group_ids),
+            text=row['text'],
+            image=self.image(row.get('image')),
+            pub_date=self._date(row.get('pub_date')),
+        )
+
+    def comment(self, row: dict) -> Comment:
+        author_id = self._lookup(row, 'author', self.authors, self.author_ids)
+        if author_id is None:
+            raise InvalidRow('не указан автор')
+        return Comment(
+            pk=_row_id(row),
+            post_id=int(row['post_id']),
+            author_id=author_id,
+            text=row['text'],
+            pub_date=self._date(row.get('pub_date')),
+        )
+
+    def build(self, kind: str, rows: List[dict]) -> List[models.Model]:
+        """Объекты пачки; негодные строки пропускаются."""
+        objects = []
+        for row in rows:
+            try:
+                objects.append(self.builders[kind](row))
+            except (InvalidRow, KeyError, TypeError, ValueError):
+                self.skipped += 1
+        if kind == 'comments':
+            # посты пачки проверяются одним запросом
+            posts = set(Post.objects.filter(
+                pk__in={comment.post_id for comment in objects}
+            ).values_list('pk', flat=True))
+            self.skipped += sum(
+                comment.post_id not in posts for comment in objects)
+            objects = [
+                comment for comment in objects if comment.post_id in posts
+            ]
+        return objects
+
+    def insert(self, kind: str, rows: List[dict]) -> int:
+        """Вставляет строки пачки и возвращает число вставленных:
+        строки с уже существующими id пропускаются.
+        """
+        model = MODELS[kind]
+        objects = self.build(kind, rows)
+        with transaction.atomic():
+            existing = set(model.objects.filter(
+                pk__in=[obj.pk for obj in objects if obj.pk is not None]
+            ).values_list('pk', flat=True))
+            objects = [obj for obj in objects if obj.pk not in existing]
+            # ignore_conflicts - на случай параллельной загрузки
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+        return len(objects)
+
+    def load(self, kind: str, path: str, checkpoint: Optional[str] = None,
+             restart: bool = False) -> int:
+        """Загружает файл с последней контрольной точки
+        и возвращает число загруженных строк. checkpoint - имя
+        контрольной точки, по умолчанию - полный путь к файлу.
+        """
+        checkpoint = checkpoint or os.path.abspath(path)
+        done = 0 if restart else read_checkpoint(checkpoint)
+        started = time.perf_counter()
+        loaded = 0
+        with dumps.open_dump(path) as file, preserve_pub_date(MODELS[kind]):
+            rows = dumps.READERS[dumps.detect_format(path)](file)
+            # уже загруженные строки только читаются
+            rows = islice(rows, done, None)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    loaded += self.insert(kind, batch)
+                    write_checkpoint(checkpoint, done + len(batch))
+                done += len(batch)
+        self.checkpoints.append(checkpoint)
+        self._report(kind, loaded, started)
+        return loaded
+
+    def finish(self) -> None:
+        """Пересчитывает то, что обновили бы сигналы, и удаляет
+        контрольные точки загруженных файлов.
+        """
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = counters.reconcile_users()
+            counters.reconcile_posts()
+        self._report('counters', users, started)
+        started = time.perf_counter()
+        with transaction.atomic():
+            entries = feed.rebuild_all()
+        self._report('feed', entries, started)
+        started = time.perf_counter()
+        with transaction.atomic():
+            documents = search.rebuild()
+        self._report('search', documents, started)
+        bump_version('post', 'comment')
+        ImportCheckpoint.objects.filter(name__in=self.checkpoints).delete()
+
+    def _report(self, stage: str, rows: int, started: float) -> None:
+        if self.report is not None:
+            self.report(stage, rows, time.perf_counter() - started)
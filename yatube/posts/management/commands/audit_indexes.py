@@ -0,0 +1,89 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import feed
+from posts.models import Comment, Post, User
+
+# строки плана, которые означают полный просмотр таблицы
+# или сортировку во временной структуре
+SQLITE_PROBLEMS = (
+    (re.compile(r'\bSCAN (TABLE )?\w+(?!.*USING (COVERING )?INDEX)'),
+     'полный просмотр таблицы'),
+    (re.compile(r'USE TEMP B-TREE'), 'сортировка во временном B-дереве'),
+)
+POSTGRESQL_PROBLEMS = (
+    (re.compile(r'Seq Scan'), 'полный просмотр таблицы'),
+    (re.compile(r'\bSort\b'), 'сортировка после фильтрации'),
+)
+
+
+def view_querysets():
+    """Запросы страниц в том виде, в каком их строят posts.views.
+    Идентификаторы объектов не важны: план зависит только от схемы.
+    """
+    per_page = settings.NUMBER_OF_ELEMENTS_PER_PAGE
+    default_keys = ('pub_date', 'pk')
+    querysets = {
+        'posts:index': (
+            Post.objects.select_related('group', 'author'), default_keys),
+        'posts:group_list': (
+            Post.objects.filter(group_id=0).select_related('author'),
+            default_keys),
+        'posts:profile': (
+            Post.objects.filter(author_id=0).select_related('group'),
+            default_keys),
+        'posts:post_details': (
+            Comment.objects.filter(post_id=0).select_related('author'),
+            default_keys),
+        'posts:follow_index': (feed.get_feed(User(pk=0)), feed.FEED_KEYS),
+    }
+    for name, (queryset, keys) in querysets.items():
+        yield name, queryset[:per_page]
+        ordering = [f'-{key}' for key in keys]
+        yield f'{name} (keyset)', queryset.order_by(*ordering)[:per_page]
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов страниц posts и сообщает '
+            'о полных просмотрах таблиц и сортировках без индекса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--warn-only', action='store_true',
+            help='Не завершаться с ошибкой при найденных проблемах.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            problem_patterns = SQLITE_PROBLEMS
+        elif connection.vendor == 'postgresql':
+            problem_patterns = POSTGRESQL_PROBLEMS
+        else:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.'
+            )
+
+        problems = 0
+        for name, queryset in view_querysets():
+            plan = queryset.explain()
+            found = [
+                (line.strip(), description)
+                for line in plan.splitlines()
+                for pattern, description in problem_patterns
+                if pattern.search(line)
+            ]
+            if not found:
+                self.stdout.write(self.style.SUCCESS(f'OK   {name}'))
+                continue
+            problems += len(found)
+            self.stdout.write(self.style.WARNING(f'WARN {name}'))
+            for line, description in found:
+                self.stdout.write(f'     {description}: {line}')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if problems and not options['warn_only']:
+            raise CommandError(f'Найдено проблем в планах: {problems}')
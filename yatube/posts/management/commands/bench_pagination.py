@@ -0,0 +1,104 @@
+import time
+from datetime import timedelta
+from statistics import median
+
+from core.bench import Rollback
+from core.models import preserve_pub_date
+from core.paginators import FORWARD, KeysetPaginator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils import timezone
+
+from posts.models import Post, User
+
+BENCH_USERNAME = 'bench_pagination'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стоимость страниц ленты при OFFSET-пагинации '
+            'и seek-пагинации по (pub_date, id).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help=('Сколько временных постов создать перед замером. '
+                  'Данные удаляются откатом транзакции.'),
+        )
+        parser.add_argument(
+            '--pages', type=int, nargs='+', default=[1, 100, 1000, 5000],
+            help='Номера страниц для замера.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторять каждый замер (берётся медиана).',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self._seed(options['seed'])
+                self._measure(options['pages'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, count):
+        author = User.objects.create_user(username=BENCH_USERNAME)
+        now = timezone.now()
+        batch_size = 5000
+        with preserve_pub_date(Post):
+            for start in range(0, count, batch_size):
+                Post.objects.bulk_create(
+                    Post(
+                        text=f'Пост для замера №{number}',
+                        author=author,
+                        pub_date=now - timedelta(seconds=number),
+                    )
+                    for number in range(start, min(start + batch_size, count))
+                )
+        self.stdout.write(f'Создано временных постов: {count}')
+
+    def _measure(self, pages, repeat):
+        per_page = settings.NUMBER_OF_ELEMENTS_PER_PAGE
+        queryset = Post.objects.select_related('group', 'author')
+        total = queryset.count()
+        self.stdout.write(f'Постов в ленте: {total}')
+        self.stdout.write(f'{"страница":>10} {"offset, мс":>12} '
+                          f'{"keyset, мс":>12}')
+
+        for number in pages:
+            if (number - 1) * per_page >= total:
+                self.stdout.write(f'{number:>10} {"нет данных":>12}')
+                continue
+
+            offset_time = self._timeit(
+                lambda: list(Paginator(queryset, per_page).page(number)),
+                repeat,
+            )
+
+            keyset = KeysetPaginator(queryset, per_page)
+            cursor = None
+            if number > 1:
+                # курсор ведёт на последний пост предыдущей страницы,
+                # его поиск в замер не входит
+                last = queryset.order_by('-pub_date', '-pk')[
+                    (number - 1) * per_page - 1
+                ]
+                cursor = keyset.encode_cursor(FORWARD, last)
+            keyset_time = self._timeit(
+                lambda: list(keyset.get_page(cursor)), repeat
+            )
+            self.stdout.write(f'{number:>10} {offset_time:>12.2f} '
+                              f'{keyset_time:>12.2f}')
+
+    @staticmethod
+    def _timeit(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        return median(timings)
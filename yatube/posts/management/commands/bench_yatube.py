@@ -0,0 +1,203 @@
+import json
+import subprocess
+import time
+from contextlib import ExitStack
+
+from core.bench import Rollback, percentile
+from core.metrics import RequestMetrics
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import Seeder
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50/p95) и число SQL-запросов каждого '
+            'представления posts на данных заданного объёма. Временные '
+            'данные и изменения, сделанные запросами, откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help='Замерять на данных, которые уже есть в базе.',
+        )
+        parser.add_argument(
+            '--random-seed', type=int, default=0,
+            help='Начальное значение генератора данных.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз запрашивать каждое представление.',
+        )
+        parser.add_argument(
+            '--output', help='JSON-файл для результатов замера.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON-файл прошлого замера для сравнения.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if not options['no_seed']:
+                    started = time.perf_counter()
+                    created = Seeder(options['random_seed']).seed(
+                        users=options['users'],
+                        groups=options['groups'],
+                        posts=options['posts'],
+                        comments=options['comments'],
+                        follows=options['follows'],
+                    )
+                    self.stdout.write(
+                        f'Созданы временные данные {created} за '
+                        f'{time.perf_counter() - started:.1f} с'
+                    )
+                results = self._measure(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self._print(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def _measure(self, repeat):
+        author = User.objects.order_by('-stats__posts_count').first()
+        reader = User.objects.order_by('-stats__following_count').first()
+        popular = User.objects.order_by('-stats__followers_count').first()
+        group = Group.objects.annotate(
+            posts_total=Count('posts')).order_by('-posts_total').first()
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        if None in (author, reader, group, post):
+            raise CommandError(
+                'Для замера нужны пользователи, группа и посты.'
+            )
+        target = User.objects.exclude(pk=reader.pk).exclude(
+            following__user=reader).first() or author
+
+        reader_client = Client()
+        reader_client.force_login(reader)
+        post_author_client = Client()
+        post_author_client.force_login(post.author)
+        post_kwargs = {'post_id': post.pk}
+        target_kwargs = {'username': target.username}
+        requests = (
+            ('posts:index', reader_client, 'get', reverse('posts:index')),
+            ('posts:group_list', reader_client, 'get',
+             reverse('posts:group_list', kwargs={'slug': group.slug})),
+            ('posts:profile', reader_client, 'get',
+             reverse('posts:profile', kwargs={'username': author.username})),
+            ('posts:post_details', reader_client, 'get',
+             reverse('posts:post_details', kwargs=post_kwargs)),
+            ('posts:post_create', reader_client, 'get',
+             reverse('posts:post_create')),
+            ('posts:post_edit', post_author_client, 'get',
+             reverse('posts:post_edit', kwargs=post_kwargs)),
+            ('posts:add_comment', reader_client, 'post',
+             reverse('posts:add_comment', kwargs=post_kwargs),
+             {'text': 'Комментарий для замера'}),
+            ('posts:follow_index', reader_client, 'get',
+             reverse('posts:follow_index')),
+            ('posts:followers', reader_client, 'get',
+             reverse('posts:followers',
+                     kwargs={'username': popular.username})),
+            ('posts:following', reader_client, 'get',
+             reverse('posts:following', kwargs={'username': reader.username})),
+            # частое слово вместе с редким
+            ('posts:search', reader_client, 'get',
+             reverse('posts:search'), {'q': 'пост 1'}),
+            # подписка и отписка чередуются, чтобы каждая что-то меняла
+            ('posts:profile_follow', reader_client, 'get',
+             reverse('posts:profile_follow', kwargs=target_kwargs)),
+            ('posts:profile_unfollow', reader_client, 'get',
+             reverse('posts:profile_unfollow', kwargs=target_kwargs)),
+        )
+
+        samples = {name: ([], []) for name, *_ in requests}
+        for _ in range(repeat):
+            for name, client, method, url, *data in requests:
+                timings, queries = samples[name]
+                request_metrics = RequestMetrics()
+                with ExitStack() as stack:
+                    for alias in connections:
+                        stack.enter_context(
+                            connections[alias].execute_wrapper(request_metrics)
+                        )
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, *data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(request_metrics.queries)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: ответ {response.status_code}'
+                    )
+
+        return {
+            'commit': current_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connections['default'].vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'repeat': repeat,
+            'views': {
+                name: {
+                    'p50_ms': round(percentile(timings, 50), 2),
+                    'p95_ms': round(percentile(timings, 95), 2),
+                    'max_ms': round(max(timings), 2),
+                    'queries': max(queries),
+                }
+                for name, (timings, queries) in samples.items()
+            },
+        }
+
+    def _print(self, results, compare_path):
+        previous = {}
+        if compare_path:
+            with open(compare_path, encoding='utf-8') as file:
+                previous = json.load(file)['views']
+        self.stdout.write(f'Строк в таблицах: {results["rows"]}')
+        self.stdout.write(
+            f'{"представление":<24} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"запросов":>9}'
+        )
+        for name, view in results['views'].items():
+            line = (f'{name:<24} {view["p50_ms"]:>9.2f} '
+                    f'{view["p95_ms"]:>9.2f} {view["queries"]:>9}')
+            if name in previous:
+                before = previous[name]
+                line += (
+                    f'   было {before["p50_ms"]:.2f} / '
+                    f'{before["p95_ms"]:.2f} мс, '
+                    f'{before["queries"]} запросов'
+                )
+            self.stdout.write(line)
@@ -0,0 +1,72 @@
+import os
+import time
+from datetime import datetime
+
+from core.reports import RateReportMixin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts import dumps
+
+
+def parse_since(value: str):
+    """Дата или дата со временем; без часового пояса - в текущем."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Не удалось разобрать дату: {value}')
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(RateReportMixin, BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в файлы '
+            'JSONL или CSV, не загружая таблицы в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', help='Каталог, в который пишутся файлы.',
+        )
+        parser.add_argument(
+            '--format', choices=dumps.FORMATS, default=dumps.JSONL,
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать файлы gzip.',
+        )
+        parser.add_argument(
+            '--since',
+            help=('Выгрузить только посты и группы, изменённые с этой '
+                  'даты, и комментарии, опубликованные с неё '
+                  '(2024-01-31 или 2024-01-31T12:00:00+03:00).'),
+        )
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(dumps.TABLES),
+            default=list(dumps.TABLES),
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=dumps.CHUNK_SIZE,
+            help='Сколько строк читается из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть больше нуля.')
+        os.makedirs(options['directory'], exist_ok=True)
+        since = options['since'] and parse_since(options['since'])
+        # одна транзакция - все таблицы из одного снимка базы
+        with transaction.atomic():
+            for name in options['tables']:
+                started = time.perf_counter()
+                rows = dumps.export_table(
+                    name, options['directory'],
+                    format=options['format'],
+                    compress=options['gzip'],
+                    since=since,
+                    chunk_size=options['chunk_size'],
+                )
+                self.report_rate(name, rows, time.perf_counter() - started)
@@ -0,0 +1,50 @@
+from core.reports import RateReportMixin
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importing import BATCH_SIZE, Importer
+
+
+class Command(RateReportMixin, BaseCommand):
+    help = ('Загружает посты и комментарии из файлов JSONL или CSV '
+            '(в том числе .gz) пачками через bulk_create. Прерванная '
+            'загрузка продолжается с последней контрольной точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', help='Файл с постами.')
+        parser.add_argument('--comments', help='Файл с комментариями.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк вставляется одной транзакцией.',
+        )
+        parser.add_argument(
+            '--images',
+            help=('Каталог с картинками старого сайта: недостающие '
+                  'файлы копируются в хранилище.'),
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Загрузить файлы с начала, не глядя на контрольные точки.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        files = [
+            (kind, options[kind]) for kind in ('posts', 'comments')
+            if options[kind]
+        ]
+        if not files:
+            raise CommandError('Укажите --posts и/или --comments.')
+        importer = Importer(
+            batch_size=options['batch_size'],
+            images_dir=options['images'],
+            report=self.report_rate,
+        )
+        loaded = {
+            kind: importer.load(kind, path, restart=options['restart'])
+            for kind, path in files
+        }
+        importer.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {loaded}, пропущено строк: {importer.skipped}'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feed
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок (таблицу FeedEntry).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Чьи ленты пересобрать. По умолчанию - все.',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        rebuilt = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                feed.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересобрано лент: {rebuilt}')
+        )
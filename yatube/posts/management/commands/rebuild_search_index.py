@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс постов и комментариев. '
+            'Нужна после загрузки данных в обход сигналов.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.create_index()
+            documents = search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано документов: {documents}')
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с таблицами '
+            'и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = counters.reconcile_users()
+            posts = counters.reconcile_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков пользователей: {users}, '
+            f'счётчиков комментариев: {posts}'
+        ))
@@ -0,0 +1,48 @@
+from core.reports import RateReportMixin
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seeding import BATCH_SIZE, Seeder
+
+
+class Command(RateReportMixin, BaseCommand):
+    help = ('Заполняет базу пользователями, группами, постами, '
+            'комментариями и подписками для нагрузочных тестов и стендов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=200000)
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько объектов создаётся и вставляется за раз.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help=('Сколько процессов создают пачки параллельно. '
+                  'SQLite допускает одного пишущего, поэтому с ним '
+                  'параллельной будет только генерация объектов.'),
+        )
+        parser.add_argument(
+            '--random-seed', type=int, default=0,
+            help='Начальное значение генератора данных.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        seeder = Seeder(
+            random_seed=options['random_seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            report=self.report_rate,
+        )
+        created = seeder.seed(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Создано: {created}'))
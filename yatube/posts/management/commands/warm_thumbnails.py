@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import thumbnails
+from posts.models import Post
+
+# сколько картинок ставится в очередь пула за раз: Future на каждую
+# картинку большой таблицы не держатся в памяти все сразу
+BATCH_SIZE = 100
+
+
+def _warm(name: str) -> bool:
+    """Создаёт недостающую миниатюру; True, если она создана сейчас."""
+    try:
+        if thumbnails.get_cached(name) is not None:
+            return False
+        thumbnails.generate(name)
+        return True
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько потоков обрабатывают картинки.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько картинок ставится в очередь за раз.',
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').order_by(
+            '-pub_date').values_list('image', flat=True).iterator()
+        created = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(islice(images, options['batch_size']))
+                if not batch:
+                    break
+                futures = [pool.submit(_warm, name) for name in batch]
+                for future in futures:
+                    try:
+                        created += future.result()
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано миниатюр: {created}, ошибок: {failed}'
+        ))
@@ -1,4 +1,4 @@
-from core.models import PubDateModel
+from core.models import PubDateModel, VersionedModel
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -6,7 +6,7 @@ from django.db import models
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(VersionedModel):
     """Модель группы, к которой могут принадлежать публикации."""
 
     title = models.CharField(
@@ -26,9 +26,12 @@ class Group(models.Model):
         return self.title
 
 
-class Post(PubDateModel):
+class Post(PubDateModel, VersionedModel):
     """Модель публикации на сайте."""
 
+    # счётчик комментариев не меняет карточку поста
+    untracked_fields = ('comments_count',)
+
     text = models.TextField(
         'Текст записи',
         help_text='Это поле для текста Вашей записи полностью принадлежит Вам',
@@ -55,14 +58,45 @@ class Post(PubDateModel):
         help_text=('Вы можете прикрепить картинку к вашему посту. '
                    'Рекомендуемый размер картинки: 960x339'),
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta(PubDateModel.Meta):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            # ключ seek-пагинации ленты: (pub_date, id)
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx',
+            ),
+            # профиль автора и страница группы: фильтр + сортировка
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+            # Last-Modified ленты: самое позднее изменение постов
+            models.Index(fields=['updated_at'], name='post_updated_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:settings.POST_STR_LENGTH]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # автор на момент загрузки: при его смене сигналы переносят
+        # пост в счётчиках от прежнего автора к новому
+        post.saved_author_id = post.__dict__.get('author_id')
+        return post
+
 
 class Comment(PubDateModel):
     """Модель комментария под постом."""
@@ -87,6 +121,18 @@ class Comment(PubDateModel):
     class Meta(PubDateModel.Meta):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            # комментарии на странице поста
+            models.Index(
+                fields=['post', '-pub_date', '-id'],
+                name='comment_post_pub_date_idx',
+            ),
+            # список комментариев в админке: курсор и date_hierarchy
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='comment_pub_date_id_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:settings.COMMENT_STR_LENGTH]
@@ -121,9 +167,170 @@ class Follow(models.Model):
                 name='not_the_author'
             ),
         ]
+        indexes = [
+            # подписчики и подписки пользователя листаются по pk
+            # одним диапазоном индекса
+            models.Index(fields=['author', 'id'], name='follow_author_id_idx'),
+            models.Index(fields=['user', 'id'], name='follow_user_id_idx'),
+        ]
 
     def __str__(self) -> str:
         follower_username = self.user.username
         following_username = self.author.username
         text = (f'{follower_username} подписан на {following_username}')
         return text
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: пост автора,
+    на которого подписан пользователь.
+    Заполняется при публикации поста (fan-out on write).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя: посты, подписчики и подписки.
+    Поддерживаются сигналами, чтобы страницы не выполняли COUNT(*).
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self) -> str:
+        return str(self.user_id)
+
+
+class Match(models.Lookup):
+    """Поиск по полнотекстовому индексу SQLite FTS5: text__match."""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchText(models.TextField):
+    """Столбец FTS5, поддерживающий lookup match."""
+
+
+SearchText.register_lookup(Match)
+
+
+class SearchDocument(models.Model):
+    """Документ полнотекстового индекса SQLite FTS5: текст поста
+    или комментария. Таблица виртуальная, её создаёт posts.search
+    после migrate; Django её не создаёт и не меняет.
+    """
+
+    id = models.AutoField(primary_key=True, db_column='rowid')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='search_documents',
+    )
+    comment_id = models.IntegerField(null=True)
+    text = SearchText()
+    # скрытый столбец FTS5: релевантность bm25, чем меньше, тем лучше
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_search'
+
+
+class SearchTerm(models.Model):
+    """Инвертированный индекс для СУБД без FTS5: сколько раз
+    слово встречается в тексте поста или комментария.
+    """
+
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Комментарий',
+    )
+    count = models.PositiveIntegerField('Вхождений')
+
+    class Meta:
+        verbose_name = 'Слово индекса'
+        verbose_name_plural = 'Слова индекса'
+        indexes = [
+            models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.term}: {self.post_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Контрольная точка загрузки файла (posts.importing): сколько
+    строк уже загружено. Пишется в транзакции пачки, поэтому после
+    сбоя совпадает с тем, что действительно вставлено.
+    """
+
+    name = models.CharField('Файл', max_length=4096, unique=True)
+    rows = models.PositiveIntegerField('Загружено строк', default=0)
+
+    class Meta:
+        verbose_name = 'Контрольная точка загрузки'
+        verbose_name_plural = 'Контрольные точки загрузки'
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.rows}'
@@ -0,0 +1,136 @@
+"""Массовые действия модерации: перенос постов в группу, удаление
+постов вместе с комментариями и удаление комментариев.
+
+Выборка сначала сводится к списку pk, затем строки меняются и
+удаляются set-based: UPDATE или DELETE ... WHERE id IN (пачка)
+по CHUNK_SIZE строк, каждая пачка в своей транзакции. Объекты
+моделей не создаются и сигналы не вызываются, поэтому то, что
+сигналы делали бы для каждой строки, выполняется раз на пачку:
+счётчики затронутых авторов и постов пересчитываются одним UPDATE
+в той же транзакции, что и удаление, документы поиска и миниатюры
+удаляются пачкой. Записи лент удаляются вместе с постами. Версии
+кэша страниц сдвигаются один раз в конце - и тогда, когда действие
+прервано ошибкой: пачки до неё уже зафиксированы. После каждой
+пачки в журнал пишется ход действия.
+"""
+import logging
+from itertools import islice
+from typing import Iterator, List, Optional
+
+from core.cache import bump_version
+from core.models import raw_delete
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from . import counters, search, thumbnails
+from .models import Comment, FeedEntry, Group, Post
+
+logger = logging.getLogger(__name__)
+
+# pk пачки попадают в запрос до двух раз (search.remove_posts),
+# а SQLite ограничивает запрос 999 параметрами
+CHUNK_SIZE = 400
+
+
+def _chunks(ids: List[int], chunk_size: int) -> Iterator[List[int]]:
+    ids = iter(ids)
+    while True:
+        chunk = list(islice(ids, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _pks(queryset: QuerySet) -> List[int]:
+    return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def _report(action: str, done: int, total: int) -> None:
+    logger.info('%s: %d из %d', action, done, total)
+
+
+def move_to_group(queryset: QuerySet, group: Optional[Group],
+                  chunk_size: int = CHUNK_SIZE) -> int:
+    """Переносит посты в группу (None - убирает из групп).
+    Возвращает количество перенесённых постов.
+    """
+    ids = _pks(queryset)
+    moved = 0
+    try:
+        for chunk in _chunks(ids, chunk_size):
+            with transaction.atomic():
+                # update() сдвигает версии постов: их карточки устаревают
+                moved += Post.objects.filter(pk__in=chunk).update(
+                    group=group)
+            _report('move_to_group', moved, len(ids))
+    finally:
+        bump_version('post', 'group')
+    return moved
+
+
+def delete_posts(queryset: QuerySet, chunk_size: int = CHUNK_SIZE) -> int:
+    """Удаляет посты вместе с комментариями, записями лент,
+    документами поиска и миниатюрами картинок.
+    Возвращает количество удалённых постов.
+    """
+    ids = _pks(queryset)
+    deleted = 0
+    try:
+        for chunk in _chunks(ids, chunk_size):
+            posts = Post.objects.filter(pk__in=chunk)
+            with transaction.atomic():
+                rows = list(posts.values_list('author_id', 'image'))
+                search.remove_posts(chunk)
+                raw_delete(FeedEntry.objects.filter(post_id__in=chunk))
+                raw_delete(Comment.objects.filter(post_id__in=chunk))
+                deleted += raw_delete(posts)
+                counters.recount_users({author_id for author_id, _ in rows})
+            images = {image for _, image in rows if image}
+            # картинка может остаться у другого поста
+            images -= set(Post.objects.filter(
+                image__in=images).values_list('image', flat=True))
+            thumbnails.forget(images)
+            _report('delete_posts', deleted, len(ids))
+    finally:
+        bump_version('post', 'comment')
+    return deleted
+
+
+def delete_author_posts(queryset: QuerySet,
+                        chunk_size: int = CHUNK_SIZE) -> int:
+    """Удаляет все посты авторов постов queryset."""
+    authors = queryset.order_by().values_list(
+        'author_id', flat=True).distinct()
+    return delete_posts(
+        Post.objects.filter(author_id__in=list(authors)), chunk_size
+    )
+
+
+def delete_comments(queryset: QuerySet,
+                    chunk_size: int = CHUNK_SIZE) -> int:
+    """Удаляет комментарии и возвращает их количество."""
+    ids = _pks(queryset)
+    deleted = 0
+    try:
+        for chunk in _chunks(ids, chunk_size):
+            comments = Comment.objects.filter(pk__in=chunk)
+            with transaction.atomic():
+                posts = set(comments.values_list('post_id', flat=True))
+                search.remove_comments(chunk)
+                deleted += raw_delete(comments)
+                counters.recount_posts(posts)
+            _report('delete_comments', deleted, len(ids))
+    finally:
+        bump_version('comment')
+    return deleted
+
+
+def purge_comments(queryset: QuerySet, text: str,
+                   chunk_size: int = CHUNK_SIZE) -> int:
+    """Удаляет комментарии queryset, в тексте которых есть
+    все слова text (по поисковому индексу).
+    """
+    return delete_comments(
+        queryset.filter(pk__in=search.matching_comment_ids(text)),
+        chunk_size,
+    )
@@ -0,0 +1,330 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+На SQLite с FTS5 тексты хранятся в виртуальной таблице posts_search
+(модель SearchDocument), и поиск выполняет MATCH с ранжированием bm25.
+На других СУБД используется инвертированный индекс SearchTerm,
+который строится на Python: слово -> посты и комментарии с числом
+вхождений, а релевантность считается как сумма tf-idf.
+
+В обоих случаях search_posts возвращает QuerySet постов с аннотацией
+search_score (чем больше, тем релевантнее), который можно листать
+KeysetPaginator по ключу SEARCH_KEYS. Индекс обновляется сигналами
+при сохранении и удалении постов и комментариев.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import List, Sequence
+
+from core.models import bulk_insert, raw_delete
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import (Case, Count, F, FloatField, Max, Q, Sum, Value,
+                              When)
+from django.db.models.query import QuerySet
+
+from .models import Comment, Post, SearchDocument, SearchTerm
+
+BATCH_SIZE = 1000
+# ключ сортировки результатов для seek-пагинации
+SEARCH_KEYS = ('search_score', 'pk')
+# больше слов в запросе не учитывается
+MAX_QUERY_TERMS = 10
+TERM_RE = re.compile(r'\w+')
+TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+FTS_TABLE = SearchDocument._meta.db_table
+CREATE_FTS_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    'post_id UNINDEXED, comment_id UNINDEXED, text, '
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+
+def normalize(text: str) -> str:
+    """ё приравнивается к е: токенизатор FTS5 их не отождествляет."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста в нижнем регистре."""
+    return [
+        term[:TERM_LENGTH]
+        for term in TERM_RE.findall(normalize(text).lower())
+    ]
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+@lru_cache(maxsize=None)
+def uses_fts(using: str = DEFAULT_DB_ALIAS) -> bool:
+    """Поиск идёт через SQLite FTS5, а не через SearchTerm."""
+    if connections[using].vendor != 'sqlite':
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_index(using: str = DEFAULT_DB_ALIAS) -> None:
+    """Создаёт таблицу FTS5, если поиск идёт через неё."""
+    if uses_fts(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(CREATE_FTS_TABLE)
+
+
+def _document_rowid(post_id: int, comment_id: int = None) -> int:
+    # у поста и его комментариев не должно быть общих rowid
+    if comment_id is None:
+        return post_id * 2
+    return comment_id * 2 + 1
+
+
+def _index_document(post_id: int, comment_id, text: str) -> None:
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} '
+                '(rowid, post_id, comment_id, text) VALUES (%s, %s, %s, %s)',
+                [_document_rowid(post_id, comment_id), post_id, comment_id,
+                 normalize(text)],
+            )
+        return
+    SearchTerm.objects.filter(post_id=post_id, comment_id=comment_id).delete()
+    bulk_insert(SearchTerm, _terms(post_id, comment_id, text), BATCH_SIZE)
+
+
+def _remove_document(post_id: int, comment_id=None) -> None:
+    # строки SearchTerm удаляются каскадом вместе с постом или комментарием
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [_document_rowid(post_id, comment_id)],
+            )
+
+
+def _terms(post_id: int, comment_id, text: str):
+    for term, count in Counter(tokenize(text)).items():
+        yield SearchTerm(
+            term=term, post_id=post_id, comment_id=comment_id, count=count
+        )
+
+
+def index_post(post: Post) -> None:
+    _index_document(post.pk, None, post.text)
+
+
+def index_comment(comment: Comment) -> None:
+    _index_document(comment.post_id, comment.pk, comment.text)
+
+
+def remove_post(post: Post) -> None:
+    _remove_document(post.pk)
+
+
+def remove_comment(comment: Comment) -> None:
+    _remove_document(comment.post_id, comment.pk)
+
+
+def _remove_rowids(condition: str, params: list) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE {condition}', params
+        )
+
+
+def remove_posts(post_ids: Sequence[int]) -> None:
+    """Убирает из индекса посты вместе с их комментариями.
+    Для массового удаления: вызывается до удаления строк.
+    """
+    if not post_ids:
+        return
+    if uses_fts():
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        # документы ищутся по rowid: столбец post_id таблицы FTS5
+        # не индексирован
+        _remove_rowids(
+            f'rowid IN ({placeholders}) OR rowid IN ('
+            f'SELECT id * 2 + 1 FROM {Comment._meta.db_table} '
+            f'WHERE post_id IN ({placeholders}))',
+            [_document_rowid(pk) for pk in post_ids] + list(post_ids),
+        )
+        return
+    raw_delete(SearchTerm.objects.filter(post_id__in=post_ids))
+
+
+def remove_comments(comment_ids: Sequence[int]) -> None:
+    """Убирает из индекса комментарии.
+    Для массового удаления: вызывается до удаления строк.
+    """
+    if not comment_ids:
+        return
+    if uses_fts():
+        placeholders = ', '.join(['%s'] * len(comment_ids))
+        _remove_rowids(
+            f'rowid IN ({placeholders})',
+            [_document_rowid(None, pk) for pk in comment_ids],
+        )
+        return
+    raw_delete(SearchTerm.objects.filter(comment_id__in=comment_ids))
+
+
+def rebuild() -> int:
+    """Пересобирает индекс по таблицам постов и комментариев.
+    Возвращает количество проиндексированных документов.
+    """
+    if uses_fts():
+        text = "REPLACE(REPLACE(text, 'ё', 'е'), 'Ё', 'Е')"
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post_id, comment_id, text) '
+                f'SELECT id * 2, id, NULL, {text} '
+                f'FROM {Post._meta.db_table}'
+            )
+            documents = cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, post_id, comment_id, text) '
+                f'SELECT id * 2 + 1, post_id, id, {text} '
+                f'FROM {Comment._meta.db_table}'
+            )
+            return documents + cursor.rowcount
+
+    SearchTerm.objects.all().delete()
+    posts = Post.objects.values_list('pk', 'text').iterator()
+    comments = Comment.objects.values_list('post_id', 'pk', 'text').iterator()
+    bulk_insert(
+        SearchTerm,
+        (term for pk, text in posts for term in _terms(pk, None, text)),
+        BATCH_SIZE,
+    )
+    bulk_insert(
+        SearchTerm,
+        (term for post_id, pk, text in comments
+         for term in _terms(post_id, pk, text)),
+        BATCH_SIZE,
+    )
+    return Post.objects.count() + Comment.objects.count()
+
+
+def _fts_query(terms: List[str]) -> str:
+    # каждое слово в кавычках: синтаксис FTS5 из запроса не применяется
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def search_posts(query: str) -> QuerySet:
+    """Посты, в тексте которых или в комментариях к которым есть
+    все слова запроса, с аннотацией search_score.
+    Выбираются только id: группировка широких строк поста с автором
+    и группой стоила бы дороже самого поиска. Страницу результатов
+    дополняет load_posts.
+    """
+    terms = query_terms(query)
+    posts = Post.objects.only('pk')
+    if not terms:
+        # аннотация нужна пагинатору и у пустого результата
+        return posts.none().annotate(
+            search_score=Value(0.0, output_field=FloatField())
+        )
+
+    if uses_fts():
+        return posts.filter(
+            search_documents__text__match=_fts_query(terms)
+        ).annotate(
+            search_score=Max(
+                F('search_documents__rank') * Value(-1.0),
+                output_field=FloatField(),
+            )
+        )
+
+    # idf: редкие слова весят больше частых
+    total = Post.objects.count() or 1
+    frequencies = dict(SearchTerm.objects.filter(
+        term__in=terms
+    ).values('term').annotate(
+        posts=Count('post', distinct=True)
+    ).values_list('term', 'posts'))
+    weights = [
+        When(search_terms__term=term, then=F('search_terms__count') * Value(
+            math.log(1 + total / frequencies.get(term, 1))))
+        for term in terms
+    ]
+    return posts.filter(search_terms__term__in=terms).annotate(
+        search_matched=Count('search_terms__term', distinct=True),
+        search_score=Sum(Case(*weights, output_field=FloatField())),
+    ).filter(search_matched=len(terms))
+
+
+def load_posts(page) -> None:
+    """Заменяет посты страницы результатов полностью загруженными,
+    с автором и группой, одним запросом.
+    """
+    posts = Post.objects.select_related('group', 'author').in_bulk(
+        [found.pk for found in page]
+    )
+    loaded = []
+    for found in page:
+        # пост мог быть удалён между запросами
+        if found.pk in posts:
+            post = posts[found.pk]
+            post.search_score = found.search_score
+            loaded.append(post)
+    page.object_list = loaded
+
+
+def matching_post_ids(query: str, comments: bool = True) -> QuerySet:
+    """Подзапрос с id постов, найденных по тексту поста
+    (и комментариев, если comments=True). Для фильтра pk__in.
+    """
+    terms = query_terms(query)
+    if uses_fts():
+        if not terms:
+            return SearchDocument.objects.none().values('post_id')
+        documents = SearchDocument.objects.filter(
+            text__match=_fts_query(terms)
+        )
+        if not comments:
+            documents = documents.filter(comment_id__isnull=True)
+        return documents.values('post_id')
+
+    index = SearchTerm.objects.filter(term__in=terms)
+    if not comments:
+        index = index.filter(comment__isnull=True)
+    return index.values('post').annotate(
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(terms)).values('post')
+
+
+def matching_comment_ids(query: str) -> QuerySet:
+    """Подзапрос с id комментариев, в тексте которых есть все слова."""
+    terms = query_terms(query)
+    if uses_fts():
+        if not terms:
+            return SearchDocument.objects.none().values('comment_id')
+        return SearchDocument.objects.filter(
+            text__match=_fts_query(terms),
+            comment_id__isnull=False,
+        ).values('comment_id')
+    return SearchTerm.objects.filter(
+        term__in=terms, comment__isnull=False
+    ).values('comment').annotate(
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(terms)).values('comment')
+
+
+def filter_posts(queryset: QuerySet, query: str) -> QuerySet:
+    """Посты queryset, найденные по индексу, без ранжирования."""
+    return queryset.filter(pk__in=matching_post_ids(query, comments=False))
+
+
+def filter_comments(queryset: QuerySet, query: str) -> QuerySet:
+    """Комментарии queryset, в тексте которых или в тексте поста
+    которых есть слова запроса.
+    """
+    return queryset.filter(
+        Q(pk__in=matching_comment_ids(query))
+        | Q(post_id__in=matching_post_ids(query, comments=False))
+    )
@@ -0,0 +1,276 @@
+"""Генерация больших объёмов данных для замеров производительности.
+
+Объекты создаются генераторами и вставляются пачками через
+bulk_create, поэтому в памяти держится одна пачка, а не весь объём.
+Пачки независимы друг от друга и могут создаваться параллельно
+в нескольких процессах.
+Подписки распределены по закону Ципфа: у немногих авторов
+большинство подписчиков, как на живом сайте. Посты распределены
+по авторам равномерно, иначе лента подписок популярного автора
+копировалась бы в FeedEntry миллионами строк.
+У каждой пачки свой генератор случайных чисел, инициализируемый
+seed и номером пачки, поэтому при одинаковых параметрах данные
+получаются одинаковыми при любом числе процессов.
+"""
+import multiprocessing
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Callable, Dict, Iterator, List, Optional
+
+from core.cache import bump_version
+from core.models import bulk_insert, preserve_pub_date
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import counters, feed, graph, search
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+USERNAME_PREFIX = 'seed_user_'
+GROUP_SLUG_PREFIX = 'seed-group-'
+# посты распределены по этому периоду назад от текущего момента
+POSTS_PERIOD = timedelta(days=365)
+# показатель распределения Ципфа: чем больше, тем сильнее перекос
+ZIPF_EXPONENT = 1.1
+# доля постов, опубликованных в группе
+GROUP_POST_SHARE = 0.7
+MODELS = {
+    'users': User,
+    'groups': Group,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+
+# Seeder, выполняющий пачки в процессе-воркере. Воркеры создаются
+# через fork и получают его вместе с загруженными идентификаторами.
+_worker_seeder = None
+
+
+def _insert_part(task) -> int:
+    kind, part, start, size = task
+    return _worker_seeder.insert_part(kind, part, start, size)
+
+
+def zipf_cum_weights(count: int) -> List[float]:
+    """Накопленные веса для random.choices: первые элементы
+    выпадают чаще остальных.
+    """
+    return list(accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)
+    ))
+
+
+class Seeder:
+    """Создаёт связанные пользователей, группы, посты,
+    комментарии и подписки.
+    workers > 1 - сколько процессов создают и вставляют пачки.
+    report(этап, строк, секунд) вызывается после каждого этапа.
+    """
+
+    def __init__(self, random_seed: int = 0, batch_size: int = BATCH_SIZE,
+                 workers: int = 0,
+                 report: Optional[Callable[[str, int, float], None]] = None):
+        self.random_seed = random_seed
+        self.batch_size = batch_size
+        self.workers = workers
+        self.report = report
+        self.now = timezone.now()
+
+    def rng(self, kind: str, part: int) -> random.Random:
+        return random.Random(f'{self.random_seed}:{kind}:{part}')
+
+    def users(self, rng: random.Random, start: int,
+              size: int) -> Iterator[User]:
+        for number in range(start, start + size):
+            yield User(
+                username=f'{USERNAME_PREFIX}{number}',
+                first_name='Пользователь',
+                last_name=str(number),
+                password=UNUSABLE_PASSWORD_PREFIX,
+            )
+
+    def groups(self, rng: random.Random, start: int,
+               size: int) -> Iterator[Group]:
+        for number in range(start, start + size):
+            yield Group(
+                title=f'Группа {number}',
+                slug=f'{GROUP_SLUG_PREFIX}{number}',
+                description=f'Описание группы {number}',
+            )
+
+    def posts(self, rng: random.Random, start: int,
+              size: int) -> Iterator[Post]:
+        period = POSTS_PERIOD.total_seconds()
+        for number in range(start, start + size):
+            group_id = None
+            if self.group_ids and rng.random() < GROUP_POST_SHARE:
+                group_id = rng.choice(self.group_ids)
+            yield Post(
+                text=f'Пост №{number} для замеров производительности',
+                author_id=rng.choice(self.user_ids),
+                group_id=group_id,
+                pub_date=self.now - timedelta(
+                    seconds=rng.uniform(0, period)),
+            )
+
+    def comments(self, rng: random.Random, start: int,
+                 size: int) -> Iterator[Comment]:
+        now = self.now.timestamp()
+        indexes = range(len(self.post_ids))
+        for number in range(start, start + size):
+            index = rng.choices(
+                indexes, cum_weights=self.post_weights)[0]
+            yield Comment(
+                post_id=self.post_ids[index],
+                author_id=rng.choice(self.user_ids),
+                text=f'Комментарий №{number}',
+                pub_date=datetime.fromtimestamp(
+                    rng.uniform(self.post_timestamps[index], now),
+                    tz=timezone.utc,
+                ),
+            )
+
+    def follows(self, rng: random.Random, start: int,
+                size: int) -> Iterator[Follow]:
+        """Подписки пользователей new_user_ids[start:start + size].
+        Каждый пользователь попадает ровно в одну пачку, а внутри
+        пачки его авторы собираются в множество, поэтому повторов
+        подписок нет; подписки на себя пропускаются.
+        """
+        authors = self.new_user_ids
+        for position in range(start, start + size):
+            user_id = authors[position]
+            wanted = self.follows_per_user + (
+                position < self.follows_extra)
+            chosen = set()
+            attempts = 0
+            while len(chosen) < wanted and attempts < wanted * 10:
+                attempts += 1
+                author_id = rng.choices(
+                    self.popular_authors,
+                    cum_weights=self.author_weights,
+                )[0]
+                if author_id != user_id:
+                    chosen.add(author_id)
+            if len(chosen) < wanted:
+                # популярные авторы уже выбраны - добираем равномерно
+                rest = [
+                    author_id for author_id in authors
+                    if author_id != user_id and author_id not in chosen
+                ]
+                chosen.update(rng.sample(rest, wanted - len(chosen)))
+            for author_id in sorted(chosen):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def insert_part(self, kind: str, part: int, start: int,
+                    size: int) -> int:
+        objects = getattr(self, kind)(self.rng(kind, part), start, size)
+        # одна фиксация на пачку, а не на каждый INSERT
+        with transaction.atomic():
+            return bulk_insert(
+                MODELS[kind], objects, self.batch_size,
+                # подписки, уже бывшие в базе, не мешают загрузке
+                ignore_conflicts=kind == 'follows',
+            )
+
+    def run(self, kind: str, count: int, start: int = 0) -> int:
+        """Создаёт объекты с номерами start..start + count пачками."""
+        started = time.perf_counter()
+        tasks = [
+            (kind, part, part_start,
+             min(self.batch_size, start + count - part_start))
+            for part, part_start in enumerate(
+                range(start, start + count, self.batch_size))
+        ]
+        if self.workers > 1 and len(tasks) > 1:
+            global _worker_seeder
+            _worker_seeder = self
+            # открытые соединения не должны достаться воркерам
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('fork'),
+            ) as executor:
+                created = sum(executor.map(_insert_part, tasks))
+        else:
+            created = sum(self.insert_part(*task) for task in tasks)
+        self._report(kind, created, started)
+        return created
+
+    def _report(self, stage: str, rows: int, started: float) -> None:
+        if self.report is not None:
+            self.report(stage, rows, time.perf_counter() - started)
+
+    def seed(self, users: int, groups: int, posts: int, comments: int,
+             follows: int) -> Dict[str, int]:
+        """Создаёт данные и приводит в порядок счётчики и ленты.
+        Подписки создаются только между новыми пользователями.
+        """
+        if self.workers > 1 and connection.in_atomic_block:
+            raise ValueError(
+                'Процессы-воркеры не видят данных незавершённой '
+                'транзакции.'
+            )
+        created = {
+            'users': self.run('users', users, User.objects.filter(
+                username__startswith=USERNAME_PREFIX).count()),
+            'groups': self.run('groups', groups, Group.objects.filter(
+                slug__startswith=GROUP_SLUG_PREFIX).count()),
+        }
+        # на SQLite bulk_create не возвращает первичные ключи
+        self.new_user_ids = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('-pk').values_list('pk', flat=True)[:users])
+        self.user_ids = list(User.objects.values_list('pk', flat=True))
+        self.group_ids = list(Group.objects.values_list('pk', flat=True))
+
+        with preserve_pub_date(Post, Comment):
+            created['posts'] = self.run('posts', posts)
+
+            self.post_ids = array('q')
+            self.post_timestamps = array('d')
+            # новые посты комментируют чаще старых
+            for pk, pub_date in Post.objects.order_by(
+                    '-pub_date').values_list('pk', 'pub_date').iterator():
+                self.post_ids.append(pk)
+                self.post_timestamps.append(pub_date.timestamp())
+            self.post_weights = zipf_cum_weights(len(self.post_ids))
+            created['comments'] = self.run(
+                'comments', comments if self.post_ids else 0)
+
+        user_count = len(self.new_user_ids)
+        possible = user_count * (user_count - 1)
+        self.follows_per_user, self.follows_extra = divmod(
+            min(follows, possible), user_count or 1)
+        self.popular_authors = self.new_user_ids[:]
+        self.rng('authors', 0).shuffle(self.popular_authors)
+        self.author_weights = zipf_cum_weights(user_count)
+        # пачки подписок делятся по подписчикам
+        created['follows'] = self.run(
+            'follows', user_count if possible else 0)
+
+        # bulk_create не вызывает сигналы
+        started = time.perf_counter()
+        with transaction.atomic():
+            counters.reconcile_users()
+            counters.reconcile_posts()
+        self._report('counters', len(self.user_ids), started)
+        started = time.perf_counter()
+        with transaction.atomic():
+            entries = feed.rebuild_all()
+        self._report('feed', entries, started)
+        started = time.perf_counter()
+        with transaction.atomic():
+            documents = search.rebuild()
+        self._report('search', documents, started)
+        # массивы подписок в кэше не знают о новых подписках
+        graph.forget_users(self.new_user_ids)
+        # закэшированные страницы не знают о новых строках
+        bump_version('post', 'comment', 'group', 'follow', 'user')
+        return created
@@ -0,0 +1,143 @@
+from core.cache import bump_version
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import counters, feed, graph, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# области кэша страниц, которые сбрасываются при изменении моделей
+CACHE_SCOPES = {
+    Post: 'post',
+    Comment: 'comment',
+    Group: 'group',
+    Follow: 'follow',
+    User: 'user',
+}
+
+# Обработчики вызываются в порядке объявления: счётчики подписчиков
+# обновляются раньше ленты, которая по ним выбирает способ раскладки.
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """У нового пользователя сразу появляются нулевые счётчики."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    """Новый пост учитывается у автора, а при смене автора
+    переходит от прежнего автора к новому.
+    """
+    previous = getattr(instance, 'saved_author_id', None)
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+    elif previous is not None and previous != instance.author_id:
+        counters.change_user_stats(previous, posts_count=-1)
+        counters.change_user_stats(instance.author_id, posts_count=1)
+    instance.saved_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора."""
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """После подписки в ленту попадают посты автора."""
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    """После отписки посты автора пропадают из ленты. Если автор
+    перестал быть популярным, его посты раскладываются по лентам
+    остальных подписчиков.
+    """
+    feed.prune(instance.user_id, instance.author_id)
+    feed.restore_fanout(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow_to_graph(sender, instance, created, **kwargs):
+    if created:
+        graph.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_from_graph(sender, instance, **kwargs):
+    graph.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove_comment(instance)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    """Таблицу FTS5 Django не создаёт - её создаём после migrate."""
+    if sender.name == 'posts':
+        search.create_index(using)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_page_cache(sender, update_fields=None, **kwargs):
+    """Изменение данных сбрасывает зависящие от них страницы."""
+    scope = CACHE_SCOPES.get(sender)
+    if scope is None:
+        return
+    # вход пользователя обновляет только last_login - страницы не меняются
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version(scope)
@@ -0,0 +1,22 @@
+from django import template
+
+from .. import cards
+
+register = template.Library()
+
+# атрибут page_obj: карточки страницы уже искались
+PREFETCHED_ATTR = '_cards_prefetched'
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кэша отрендеренных карточек.
+    При первом вызове на странице карточки ищутся сразу
+    для всех постов page_obj, остальные вызовы берут готовые.
+    """
+    page_obj = context.get('page_obj')
+    if (page_obj is not None and not hasattr(post, cards.RENDERED_ATTR)
+            and not getattr(page_obj, PREFETCHED_ATTR, False)):
+        setattr(page_obj, PREFETCHED_ATTR, True)
+        cards.prefetch(page_obj)
+    return cards.render(post)
@@ -0,0 +1,18 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра картинки поста или None.
+    Недостающая миниатюра создаётся в фоне, рендер её не ждёт.
+    """
+    if not post.image:
+        return None
+    thumbnail = thumbnails.thumbnail_for(post)
+    if thumbnail is None:
+        thumbnails.submit(post.image)
+    return thumbnail
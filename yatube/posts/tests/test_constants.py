@@ -20,8 +20,15 @@ PROFILE_FOLLOW_URL = reverse(
 PROFILE_UNFOLLOW_URL = reverse(
     'posts:profile_unfollow', kwargs={'username': AUTHOR_USERNAME}
 )
+FOLLOWERS_URL = reverse(
+    'posts:followers', kwargs={'username': AUTHOR_USERNAME}
+)
+FOLLOWING_URL = reverse(
+    'posts:following', kwargs={'username': AUTHOR_USERNAME}
+)
 
 TEST_USER_USERNAME = 'testuser'
+ANOTHER_USERNAME = 'anotheruser'
 
 AUTHOR_POST_COUNT = int(settings.NUMBER_OF_ELEMENTS_PER_PAGE * 1.5)
 
@@ -29,6 +36,7 @@ INDEX_URL = reverse('posts:index')
 FOLLOW_INDEX_URL = reverse('posts:follow_index')
 GROUP_LIST_URL = reverse('posts:group_list', kwargs={'slug': GROUP_SLUG})
 POST_CREATE_URL = reverse('posts:post_create')
+SEARCH_URL = reverse('posts:search')
 
 B_SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from .. import thumbnails
 from ..models import Post
 from . import test_constants as const
 from .factories import create_small_gif, create_user_object
@@ -30,6 +31,8 @@ class PostFormTests(TestCase):
     @classmethod
     def tearDownClass(self):
         super().tearDownClass()
+        # потоки пула не должны писать в удаляемый каталог
+        thumbnails.shutdown()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
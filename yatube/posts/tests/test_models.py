@@ -1,7 +1,28 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from core.cache import get_versions, versioned_key
 from django.conf import settings
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models import Model
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-from ..models import Post
+from .. import counters, dumps, graph, importing
+from ..models import (Comment, FeedEntry, Follow, Group, ImportCheckpoint,
+                      Post, User, UserStats)
+from ..importing import Importer
+from ..seeding import Seeder
+from ..urls import urlpatterns
 from . import test_constants as const
 from .factories import create_group_object, create_user_object
 
@@ -36,3 +57,550 @@ class PostModelTest(TestCase):
                     (f'Метод __str__ модели {model_name} '
                      'работает некорректно.')
                 )
+
+
+class IndexAuditTest(TestCase):
+    """Запросы страниц posts обслуживаются индексами."""
+
+    def test_view_queries_do_not_scan_or_sort(self):
+        """audit_indexes не находит полных просмотров и сортировок."""
+        call_command('audit_indexes', stdout=StringIO())
+
+
+class CountersTest(TestCase):
+    """Тест денормализованных счётчиков."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.user = create_user_object(const.TEST_USER_USERNAME)
+
+    def test_counters_follow_creations_and_deletions(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(
+            text=const.POST_TEXT, author=CountersTest.author
+        )
+        Comment.objects.create(
+            text=const.POST_TEXT, post=post, author=CountersTest.user
+        )
+        follow = Follow.objects.create(
+            user=CountersTest.user, author=CountersTest.author
+        )
+        post.refresh_from_db()
+        author_stats = UserStats.objects.get(user=CountersTest.author)
+        user_stats = UserStats.objects.get(user=CountersTest.user)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(user_stats.following_count, 1)
+
+        follow.delete()
+        post.delete()
+        author_stats.refresh_from_db()
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+
+    def test_changing_author_moves_post_counter(self):
+        """Смена автора поста переносит его в счётчиках."""
+        post = Post.objects.create(
+            text=const.POST_TEXT, author=CountersTest.author
+        )
+        post = Post.objects.get(pk=post.pk)
+        post.author = CountersTest.user
+        post.save()
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.author).posts_count, 0
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.user).posts_count, 1
+        )
+
+    def test_saving_post_keeps_concurrent_comment_count(self):
+        """Сохранение поста не затирает счётчик комментариев,
+        увеличенный после загрузки поста.
+        """
+        post = Post.objects.create(
+            text=const.POST_TEXT, author=CountersTest.author
+        )
+        counters.change_comments_count(post.pk, 1)
+        post.text = const.EDITED_POST_TEXT
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.text, const.EDITED_POST_TEXT)
+
+    def test_drifted_counters_do_not_go_below_zero(self):
+        """Разошедшийся счётчик при удалении остаётся нулём,
+        а удаление не падает.
+        """
+        post = Post.objects.create(
+            text=const.POST_TEXT, author=CountersTest.author
+        )
+        comment = Comment.objects.create(
+            text=const.POST_TEXT, post=post, author=CountersTest.user
+        )
+        UserStats.objects.filter(user=CountersTest.author).update(
+            posts_count=0
+        )
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.author).posts_count, 0
+        )
+
+    def test_reconcile_command_repairs_drift(self):
+        """reconcile_counters исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(
+            text=const.POST_TEXT, author=CountersTest.author
+        )
+        UserStats.objects.filter(user=CountersTest.author).update(
+            posts_count=100
+        )
+        UserStats.objects.filter(user=CountersTest.user).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.author).posts_count, 1
+        )
+        self.assertTrue(
+            UserStats.objects.filter(user=CountersTest.user).exists()
+        )
+
+
+class SeedingTest(TestCase):
+    """Тест генератора данных для замеров."""
+
+    def test_seeded_data_is_consistent(self):
+        """Подписки без повторов и на себя, счётчики и ленты
+        соответствуют созданным данным.
+        """
+        scopes = ('post', 'comment', 'group', 'follow', 'user')
+        versions = get_versions(scopes)
+        with mock.patch.object(
+                graph, 'forget_users', wraps=graph.forget_users) as forget:
+            created = Seeder(random_seed=1, batch_size=7).seed(
+                users=12, groups=2, posts=40, comments=30, follows=50,
+            )
+        self.assertEqual(created, {
+            'users': 12, 'groups': 2, 'posts': 40,
+            'comments': 30, 'follows': 50,
+        })
+        pairs = list(Follow.objects.values_list('user_id', 'author_id'))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertFalse(any(user == author for user, author in pairs))
+        self.assertEqual(counters.reconcile_users(), 0)
+        self.assertEqual(counters.reconcile_posts(), 0)
+        # страницы и массивы графа новых пользователей сброшены
+        new_versions = get_versions(scopes)
+        for scope in scopes:
+            self.assertNotEqual(new_versions[scope], versions[scope])
+        self.assertEqual(
+            set(forget.call_args[0][0]),
+            set(User.objects.values_list('pk', flat=True)),
+        )
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count(),
+        )
+
+    def test_seed_command_inserts_in_batches(self):
+        """seed_yatube создаёт данные пачками заданного размера."""
+        out = StringIO()
+        call_command(
+            'seed_yatube', users=6, groups=1, posts=25, comments=10,
+            follows=12, batch_size=4, stdout=out,
+        )
+        self.assertEqual(Post.objects.count(), 25)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(Follow.objects.count(), 12)
+        self.assertIn('строк/с', out.getvalue())
+
+    def test_seed_workers_require_committed_data(self):
+        """Воркеры не запускаются внутри транзакции."""
+        with self.assertRaises(ValueError):
+            Seeder(workers=2).seed(
+                users=2, groups=0, posts=0, comments=0, follows=0,
+            )
+
+    def test_bench_rolls_back_seeded_data(self):
+        """bench_yatube замеряет все представления posts
+        и не оставляет данных в базе.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command(
+                'bench_yatube', users=5, groups=1, posts=20, comments=5,
+                follows=8, repeat=2, output=output, stdout=StringIO(),
+            )
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)
+        self.assertEqual(
+            set(results['views']),
+            {f'posts:{pattern.name}' for pattern in urlpatterns},
+        )
+        self.assertEqual(results['rows']['posts'], 20)
+        self.assertFalse(Post.objects.exists())
+
+
+class ExportTest(TestCase):
+    """Тест выгрузки данных в JSONL и CSV."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.reader = create_user_object(const.TEST_USER_USERNAME)
+        cls.group = create_group_object()
+        cls.old_post = Post.objects.create(
+            text=const.POST_TEXT, author=cls.author, group=cls.group
+        )
+        old_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        Post.objects.filter(pk=cls.old_post.pk).update(
+            pub_date=old_date, updated_at=old_date
+        )
+        cls.post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=cls.author
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text=const.POST_TEXT
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, directory, *args):
+        call_command(
+            'export_yatube', directory, *args, chunk_size=1, stdout=StringIO()
+        )
+
+    def test_jsonl_export_with_gzip(self):
+        """Все таблицы выгружаются в сжатые JSONL по возрастанию pk."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.export(directory, '--gzip')
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted(f'{name}.jsonl.gz' for name in dumps.TABLES),
+            )
+            path = os.path.join(directory, 'posts.jsonl.gz')
+            with dumps.open_dump(path) as file:
+                posts = [json.loads(line) for line in file]
+        self.assertEqual(
+            [post['id'] for post in posts],
+            [ExportTest.old_post.pk, ExportTest.post.pk],
+        )
+        self.assertEqual(posts[0]['group_id'], ExportTest.group.pk)
+        self.assertIsNone(posts[1]['group_id'])
+        self.assertEqual(posts[1]['text'], const.EDITED_POST_TEXT)
+
+    def test_incremental_csv_export(self):
+        """С --since выгружаются только новые и отредактированные
+        посты, а подписки - целиком.
+        """
+        old_date = datetime(2020, 6, 1, tzinfo=timezone.utc)
+        edited = Post.objects.create(
+            text=const.POST_TEXT, author=ExportTest.author
+        )
+        Post.objects.filter(pk=edited.pk).update(
+            pub_date=old_date, updated_at=old_date
+        )
+        edited.refresh_from_db()
+        edited.text = const.EDITED_POST_TEXT
+        edited.save()
+        with tempfile.TemporaryDirectory() as directory:
+            self.export(
+                directory, '--format', 'csv', '--since', '2021-01-01',
+                '--tables', 'posts', 'follows',
+            )
+            with open(os.path.join(directory, 'posts.csv')) as file:
+                posts = list(csv.DictReader(file))
+            with open(os.path.join(directory, 'follows.csv')) as file:
+                follows = list(csv.DictReader(file))
+        self.assertEqual(
+            [post['id'] for post in posts],
+            [str(ExportTest.post.pk), str(edited.pk)],
+        )
+        self.assertEqual(posts[0]['group_id'], '')
+        self.assertEqual(posts[1]['text'], const.EDITED_POST_TEXT)
+        self.assertEqual(len(follows), 1)
+
+
+class ImportTest(TestCase):
+    """Тест загрузки постов и комментариев из файлов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.group = create_group_object()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        media = override_settings(MEDIA_ROOT=self.directory)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def write_posts(self, rows):
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def test_import_resolves_authors_groups_and_posts(self):
+        """Авторы и группы находятся по именам, комментарии - по id
+        постов, негодные строки пропускаются, а повторная загрузка
+        не создаёт дублей.
+        """
+        default_storage.save(
+            'posts/uploads/2019/cat.jpg', ContentFile(b'cat'))
+        posts = self.write_posts([
+            {'id': 100, 'author': const.AUTHOR_USERNAME,
+             'group': const.GROUP_SLUG, 'text': const.POST_TEXT,
+             'pub_date': '2019-05-01T10:00:00+00:00',
+             'image': '/uploads/2019/cat.jpg'},
+            {'id': 101, 'author': 'nobody', 'text': const.POST_TEXT},
+        ])
+        comments = os.path.join(self.directory, 'comments.csv')
+        with open(comments, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['id', 'post_id', 'author', 'text'])
+            writer.writerow([500, 100, const.AUTHOR_USERNAME, 'Первый'])
+            writer.writerow([501, 999, const.AUTHOR_USERNAME, 'Без поста'])
+
+        for _ in range(2):
+            out = StringIO()
+            call_command(
+                'import_yatube', posts=posts, comments=comments, stdout=out,
+            )
+        self.assertIn('пропущено строк: 2', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+        post = Post.objects.get()
+        self.assertEqual(post.pk, 100)
+        self.assertEqual(post.group, ImportTest.group)
+        self.assertEqual(post.pub_date.year, 2019)
+        self.assertEqual(post.image.name, 'posts/uploads/2019/cat.jpg')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().pk, 500)
+        self.assertEqual(
+            UserStats.objects.get(user=ImportTest.author).posts_count, 1
+        )
+
+    def test_import_resumes_from_checkpoint(self):
+        """После сбоя загрузка продолжается с незагруженных строк."""
+        path = self.write_posts([
+            {'author_id': ImportTest.author.pk, 'text': f'Пост {number}'}
+            for number in range(5)
+        ])
+        importer = Importer(batch_size=2)
+        insert = importer.insert
+        calls = []
+
+        def failing_insert(kind, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return insert(kind, rows)
+
+        with mock.patch.object(importer, 'insert', failing_insert):
+            with self.assertRaises(RuntimeError):
+                importer.load('posts', path)
+        self.assertEqual(Post.objects.count(), 2)
+
+        importer = Importer(batch_size=2)
+        importer.load('posts', path)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {number}' for number in range(5)],
+        )
+        importer.finish()
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_crash_on_comments_keeps_posts_checkpoint(self):
+        """Загруженный файл постов не загружается второй раз, если
+        запуск упал на комментариях.
+        """
+        posts = self.write_posts([
+            {'author_id': ImportTest.author.pk, 'text': f'Пост {number}'}
+            for number in range(5)
+        ])
+        comments = os.path.join(self.directory, 'comments.jsonl')
+        with open(comments, 'w', encoding='utf-8') as file:
+            file.write('{}\n')
+        importer = Importer()
+        importer.load('posts', posts)
+        with mock.patch.object(
+                importer, 'insert', side_effect=RuntimeError('сбой')):
+            with self.assertRaises(RuntimeError):
+                importer.load('comments', comments)
+
+        call_command(
+            'import_yatube', posts=posts, comments=comments, stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_failed_checkpoint_rolls_back_batch(self):
+        """Пачка и её контрольная точка фиксируются вместе: после сбоя
+        при записи точки строки без id не задваиваются.
+        """
+        path = self.write_posts([
+            {'author_id': ImportTest.author.pk, 'text': f'Пост {number}'}
+            for number in range(3)
+        ])
+        write_checkpoint = importing.write_checkpoint
+        calls = []
+
+        def failing_write(name, rows):
+            calls.append(rows)
+            write_checkpoint(name, rows)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+
+        with mock.patch.object(importing, 'write_checkpoint', failing_write):
+            with self.assertRaises(RuntimeError):
+                Importer(batch_size=2).load('posts', path)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Importer(batch_size=2).load('posts', path), 1)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_counts_inserted_rows_and_skips_missing_images(self):
+        """Загрузка считает только вставленные строки, а строки
+        с отсутствующей в хранилище картинкой пропускает.
+        """
+        path = self.write_posts([
+            {'id': 200, 'author_id': ImportTest.author.pk,
+             'text': const.POST_TEXT},
+            {'id': 201, 'author_id': ImportTest.author.pk,
+             'text': const.POST_TEXT, 'image': 'missing.jpg'},
+        ])
+        importer = Importer()
+        self.assertEqual(importer.load('posts', path), 1)
+        self.assertEqual(importer.skipped, 1)
+        self.assertEqual(Importer().load('posts', path), 0)
+        self.assertEqual(list(Post.objects.values_list('pk', flat=True)),
+                         [200])
+
+    def test_csv_reimport_skips_loaded_ids(self):
+        """id из CSV сравниваются с загруженными как числа:
+        повторная загрузка файла ничего не вставляет.
+        """
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['id', 'author_id', 'text'])
+            writer.writerow([300, ImportTest.author.pk, const.POST_TEXT])
+            writer.writerow(['', ImportTest.author.pk, const.POST_TEXT])
+        self.assertEqual(Importer().load('posts', path), 2)
+        self.assertEqual(Importer().load('posts', path, restart=True), 1)
+        self.assertEqual(Post.objects.filter(pk=300).count(), 1)
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_same_named_images_keep_their_directories(self):
+        """Одноимённые картинки из разных каталогов не подменяют
+        друг друга.
+        """
+        images = os.path.join(self.directory, 'legacy')
+        for folder in ('a', 'b'):
+            os.makedirs(os.path.join(images, folder))
+            with open(os.path.join(images, folder, '1.jpg'), 'wb') as file:
+                file.write(folder.encode())
+        path = self.write_posts([
+            {'id': 400 + number, 'author_id': ImportTest.author.pk,
+             'text': const.POST_TEXT, 'image': f'{folder}/1.jpg'}
+            for number, folder in enumerate(('a', 'b'))
+        ])
+        Importer(images_dir=images).load('posts', path)
+        for post, folder in zip(Post.objects.order_by('pk'), ('a', 'b')):
+            with post.image.open('rb') as file:
+                self.assertEqual(file.read(), folder.encode())
+
+
+class VersionTest(TestCase):
+    """Тест версий и дат изменения постов и групп."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.group = create_group_object()
+        cls.another_group = create_group_object(
+            const.ANOTHER_GROUP_TITLE,
+            const.ANOTHER_GROUP_SLUG,
+            const.ANOTHER_GROUP_DESCRIPTION,
+        )
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            text=const.POST_TEXT, author=VersionTest.author
+        )
+
+    def test_save_and_update_bump_version(self):
+        """Сохранение и update() увеличивают версию и дату изменения,
+        а изменение счётчика комментариев - нет.
+        """
+        self.assertEqual(self.post.version, 1)
+        created_at = self.post.updated_at
+        key = versioned_key('card', self.post, None)
+
+        self.post.text = const.EDITED_POST_TEXT
+        self.post.save()
+        self.assertEqual(self.post.version, 2)
+        self.assertGreater(self.post.updated_at, created_at)
+        self.assertNotEqual(versioned_key('card', self.post, None), key)
+
+        Post.objects.filter(pk=self.post.pk).update(group=VersionTest.group)
+        counters.change_comments_count(self.post.pk, 1)
+        Group.objects.filter(pk=VersionTest.group.pk).update(title='Новая')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 3)
+        self.assertEqual(
+            Group.objects.get(pk=VersionTest.group.pk).version, 2
+        )
+
+    def test_post_save_receivers_see_new_version(self):
+        """Получатели post_save видят новую версию числом."""
+        versions = []
+
+        def receiver(sender, instance, **kwargs):
+            versions.append(instance.version)
+
+        post_save.connect(receiver, sender=Post)
+        self.addCleanup(post_save.disconnect, receiver, sender=Post)
+        self.post.text = const.EDITED_POST_TEXT
+        self.post.save()
+        self.assertEqual(versions, [2])
+
+    def test_failed_save_keeps_version(self):
+        """Если запись не удалась, у объекта остаётся прежняя версия."""
+        self.post.text = const.EDITED_POST_TEXT
+        with mock.patch.object(
+            Model, '_save_table', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.post.save()
+        self.assertEqual(self.post.version, 1)
+        self.post.save()
+        self.assertEqual(self.post.version, 2)
+
+    def test_admin_list_editable_bumps_version(self):
+        """Смена группы в списке постов админки меняет версию."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:posts_post_changelist'), {
+            'form-TOTAL_FORMS': 1,
+            'form-INITIAL_FORMS': 1,
+            'form-0-id': self.post.pk,
+            'form-0-group': VersionTest.another_group.pk,
+            '_save': 'Сохранить',
+        })
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, VersionTest.another_group)
+        self.assertEqual(self.post.version, 2)
@@ -1,14 +1,32 @@
+import base64
+import json
+import math
 import shutil
 import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
+from core.cache import bump_version, changed_at, get_versions
+from core.templatetags.cache_versions import cache_versions
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import parse_http_date
 
+from .. import (cards, counters, feed, graph, moderation, search,
+                thumbnails, writes)
+from ..admin import PostAdmin
 from ..forms import PostForm
-from ..models import Follow, Post
+from ..models import Comment, FeedEntry, Follow, Post, User, UserStats
+from ..urls import urlpatterns
 from . import test_constants as const
 from .factories import (create_group_object, create_small_gif,
                         create_user_object)
@@ -57,6 +75,8 @@ class PostsViewsTest(TestCase):
     @classmethod
     def tearDownClass(self):
         super().tearDownClass()
+        # потоки пула не должны писать в удаляемый каталог
+        thumbnails.shutdown()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
@@ -204,8 +224,30 @@ class CacheTest(TestCase):
         super().setUpClass()
         cls.author = create_user_object(const.AUTHOR_USERNAME)
 
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(CacheTest.author)
+
     def test_posts_from_index_page_are_cached(self):
-        """Посты на главной странице сохраняются в кэш."""
+        """Посты на главной странице сохраняются в кэш
+        под ключом с версиями данных.
+        """
+        Post.objects.create(
+            text=const.POST_TEXT,
+            group=None,
+            author=CacheTest.author,
+        )
+        self.client.get(const.INDEX_URL)
+        key = make_template_fragment_key(
+            'posts.index_page',
+            [cache_versions('post', 'group', 'user'), 1, ''],
+        )
+        self.assertIsNotNone(cache.get(key))
+
+    def test_deleted_post_disappears_without_clearing_cache(self):
+        """Удалённый пост пропадает со страницы сразу,
+        без ожидания истечения кэша.
+        """
         post: Post = Post.objects.create(
             text=const.POST_TEXT,
             group=None,
@@ -214,18 +256,47 @@ class CacheTest(TestCase):
         first_response = self.client.get(const.INDEX_URL)
         post.delete()
         response_after_deletion = self.client.get(const.INDEX_URL)
-        self.assertEqual(
+        self.assertNotEqual(
             first_response.content,
             response_after_deletion.content,
-            msg='Пост пропал со страницы после удаления.'
+            msg='Пост не пропал со страницы после удаления.'
         )
+
+
+class PageCacheTest(TestCase):
+    """Тест кэша страниц для анонимных посетителей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+
+    def setUp(self):
         cache.clear()
-        response_after_clearing_cache = self.client.get(const.INDEX_URL)
-        self.assertNotEqual(
-            response_after_deletion.content,
-            response_after_clearing_cache.content,
-            msg='Пост не пропал после очистки кэша.'
+
+    def test_unchanged_page_is_served_from_cache(self):
+        """Повторный запрос неизменной страницы берётся из кэша,
+        а авторизованным пользователям кэш не отдаётся.
+        """
+        first_response = self.client.get(const.PROFILE_URL)
+        second_response = self.client.get(const.PROFILE_URL)
+        self.assertEqual(first_response['X-Page-Cache'], 'miss')
+        self.assertEqual(second_response['X-Page-Cache'], 'hit')
+        self.assertEqual(first_response.content, second_response.content)
+
+        self.client.force_login(PageCacheTest.author)
+        response = self.client.get(const.PROFILE_URL)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_changes_purge_dependent_pages(self):
+        """Новый пост сразу появляется на закэшированной странице."""
+        self.client.get(const.PROFILE_URL)
+        post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=PageCacheTest.author
         )
+        response = self.client.get(const.PROFILE_URL)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertIn(post, response.context['page_obj'])
 
 
 class FollowTest(TestCase):
@@ -311,3 +382,1236 @@ class FollowTest(TestCase):
                     post,
                     msg=params['msg'],
                 )
+
+
+@override_settings(KEYSET_PAGINATION=True)
+class KeysetPaginationTest(TestCase):
+    """Тест seek-пагинации лент по курсору."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        for _ in range(const.AUTHOR_POST_COUNT):
+            Post.objects.create(text=const.POST_TEXT, author=cls.author)
+
+    def test_pages_are_walked_by_cursor(self):
+        """Курсоры «следующая»/«предыдущая» обходят всю ленту
+        без пропусков и повторов.
+        """
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        first_page = self.client.get(const.INDEX_URL).context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        second_page = self.client.get(
+            const.INDEX_URL, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page), expected
+        )
+        self.assertFalse(second_page.has_next())
+
+        previous_page = self.client.get(
+            const.INDEX_URL, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_follow_feed_is_walked_by_cursor(self):
+        """Лента подписок листается курсором по индексу FeedEntry."""
+        follower = create_user_object(const.TEST_USER_USERNAME)
+        Follow.objects.create(
+            user=follower, author=KeysetPaginationTest.author
+        )
+        self.client.force_login(follower)
+        first_page = self.client.get(
+            const.FOLLOW_INDEX_URL).context['page_obj']
+        second_page = self.client.get(
+            const.FOLLOW_INDEX_URL, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(Post.objects.order_by('-pub_date', '-pk')),
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор и курсор с числом вне диапазона
+        целых БД ведут на первую страницу.
+        """
+        overflow = base64.urlsafe_b64encode(json.dumps(
+            ['n', ['2021-01-01T00:00:00+00:00', 10 ** 30]]).encode()).decode()
+        for cursor in ('broken', overflow):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    const.PROFILE_URL, {'cursor': cursor})
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    settings.NUMBER_OF_ELEMENTS_PER_PAGE,
+                )
+
+
+class FeedTest(TestCase):
+    """Тест ленты подписок на таблице FeedEntry."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.follower = create_user_object(const.TEST_USER_USERNAME)
+        cls.old_post = Post.objects.create(
+            text=const.POST_TEXT, author=cls.author
+        )
+
+    def setUp(self):
+        self.client.force_login(FeedTest.follower)
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка добавляет старые посты автора в ленту,
+        отписка их убирает.
+        """
+        self.client.get(const.PROFILE_FOLLOW_URL)
+        new_post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=FeedTest.author
+        )
+        response = self.client.get(const.FOLLOW_INDEX_URL)
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [new_post, FeedTest.old_post],
+        )
+
+        self.client.get(const.PROFILE_UNFOLLOW_URL)
+        self.assertFalse(
+            FeedEntry.objects.filter(user=FeedTest.follower).exists()
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_merged_on_read(self):
+        """Посты популярного автора не копируются в ленты,
+        но показываются подписчикам.
+        """
+        Follow.objects.create(user=FeedTest.follower, author=FeedTest.author)
+        new_post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=FeedTest.author
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        response = self.client.get(const.FOLLOW_INDEX_URL)
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [new_post, FeedTest.old_post],
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_posts_survive_crossing_fanout_limit(self):
+        """Посты, вышедшие, пока у автора было больше FEED_FANOUT_LIMIT
+        подписчиков, остаются в лентах и после того, как подписчиков
+        снова стало меньше.
+        """
+        author = FeedTest.author
+        follower = FeedTest.follower
+        other = create_user_object(const.ANOTHER_USERNAME)
+        Follow.objects.create(user=follower, author=author)
+        # второй подписчик: раскладка сменяется подмешиванием
+        Follow.objects.create(user=other, author=author)
+        heavy_post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=author
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=heavy_post).exists())
+        for user in (follower, other):
+            self.assertEqual(
+                list(feed.get_feed(user)), [heavy_post, FeedTest.old_post]
+            )
+
+        # подписчиков снова не больше предела: посты раскладываются
+        Follow.objects.filter(user=other, author=author).delete()
+        self.assertEqual(
+            list(feed.get_feed(follower)), [heavy_post, FeedTest.old_post]
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=follower, post=heavy_post).exists()
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=other).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_fanout_is_restored_after_counter_drift(self):
+        """Посты раскладываются снова, даже если счётчик подписчиков
+        разошёлся и прошёл мимо FEED_FANOUT_LIMIT.
+        """
+        author = FeedTest.author
+        follower = FeedTest.follower
+        others = [
+            create_user_object(f'{const.ANOTHER_USERNAME}{number}')
+            for number in range(2)
+        ]
+        for user in (follower, *others):
+            Follow.objects.create(user=user, author=author)
+        heavy_post = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=author
+        )
+        UserStats.objects.filter(user=author).update(followers_count=1)
+
+        Follow.objects.filter(user=others[0], author=author).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=follower, post=heavy_post).exists()
+        )
+
+
+class FollowListTest(TestCase):
+    """Тест страниц подписчиков и подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        User.objects.bulk_create(
+            User(username=f'user{number}', first_name=f'Читатель{number}')
+            for number in range(const.AUTHOR_POST_COUNT)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=cls.author)
+            for user in User.objects.filter(username__startswith='user')
+        )
+        Follow.objects.create(
+            user=cls.author, author=User.objects.get(username='user0'))
+        counters.reconcile_users()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_followers_are_walked_by_cursor(self):
+        """Подписчики листаются курсором по pk подписки, новые
+        сверху, а их число берётся из счётчика.
+        """
+        found = []
+        params = {}
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(const.FOLLOWERS_URL, params)
+            self.assertLessEqual(
+                len(queries), settings.QUERY_BUDGETS['posts:followers'])
+            self.assertContains(
+                response, f'Подписчики: {const.AUTHOR_POST_COUNT}')
+            found.extend(response.context['users'])
+            page = response.context['page_obj']
+            if not page.has_next():
+                break
+            params['cursor'] = page.next_cursor
+        self.assertEqual(
+            found,
+            [follow.user for follow in Follow.objects.filter(
+                author=FollowListTest.author).order_by('-pk')],
+        )
+        self.assertContains(response, 'Читатель0')
+
+    def test_following_lists_authors(self):
+        """Страница подписок показывает авторов пользователя."""
+        response = self.client.get(const.FOLLOWING_URL)
+        self.assertEqual(
+            response.context['users'], [User.objects.get(username='user0')]
+        )
+        self.assertContains(response, 'Подписки: 1')
+
+
+class FollowGraphTest(TestCase):
+    """Тест графа подписок в кэше."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.first, cls.second, cls.popular, cls.other = (
+            create_user_object(f'user{number}') for number in range(5)
+        )
+        for user, author in (
+            (cls.reader, cls.first), (cls.reader, cls.second),
+            (cls.first, cls.popular), (cls.second, cls.popular),
+            (cls.first, cls.other), (cls.first, cls.reader),
+        ):
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_following_is_checked_without_queries(self):
+        """Подписки читаются одним запросом, дальше - из кэша,
+        а подписка и отписка сразу видны.
+        """
+        reader, first = FollowGraphTest.reader, FollowGraphTest.first
+        with self.assertNumQueries(1):
+            self.assertTrue(graph.is_following(reader.pk, first.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                graph.is_following(reader.pk, FollowGraphTest.popular.pk))
+            self.assertTrue(graph.is_following(reader.pk, first.pk))
+        self.assertEqual(
+            list(graph.follower_ids(FollowGraphTest.popular.pk)),
+            sorted([first.pk, FollowGraphTest.second.pk]),
+        )
+
+        Follow.objects.filter(user=reader, author=first).delete()
+        self.assertFalse(graph.is_following(reader.pk, first.pk))
+        Follow.objects.create(user=reader, author=first)
+        self.assertTrue(graph.is_following(reader.pk, first.pk))
+
+    def test_followers_are_sorted_without_order_by(self):
+        """Подписчики читаются без ORDER BY и сортируются в массиве."""
+        reader, other = FollowGraphTest.reader, FollowGraphTest.other
+        Follow.objects.create(user=reader, author=other)
+        with CaptureQueriesContext(connection) as queries:
+            followers = graph.follower_ids(other.pk)
+        self.assertNotIn('ORDER BY', queries[0]['sql'])
+        self.assertEqual(
+            list(followers), sorted([reader.pk, FollowGraphTest.first.pk])
+        )
+
+    def test_suggestions_are_friends_of_friends(self):
+        """Рекомендуются авторы из подписок авторов пользователя,
+        и рекомендации меняются вместе с его подписками.
+        """
+        reader = FollowGraphTest.reader
+        popular, other = FollowGraphTest.popular, FollowGraphTest.other
+        self.assertEqual(graph.suggestions(reader.pk), [popular.pk, other.pk])
+
+        Follow.objects.create(user=reader, author=popular)
+        Follow.objects.filter(
+            user=reader, author=FollowGraphTest.first).delete()
+        # оценки сброшены: заново читаются подписки пользователя
+        # и нового автора, массив второго автора берётся из кэша
+        with self.assertNumQueries(2):
+            self.assertEqual(graph.suggestions(reader.pk), [])
+
+        self.client.force_login(FollowGraphTest.second)
+        response = self.client.get(const.FOLLOW_INDEX_URL)
+        self.assertEqual(response.context['suggestions'], [])
+        self.client.force_login(reader)
+        Follow.objects.filter(user=reader, author=popular).delete()
+        response = self.client.get(const.FOLLOW_INDEX_URL)
+        self.assertEqual(response.context['suggestions'], [popular])
+
+    def test_suggestions_follow_changes_of_followed_authors(self):
+        """Отписка автора из подписок пользователя сразу меняет
+        рекомендации пользователя.
+        """
+        reader = FollowGraphTest.reader
+        popular, other = FollowGraphTest.popular, FollowGraphTest.other
+        self.assertEqual(graph.suggestions(reader.pk), [popular.pk, other.pk])
+        Follow.objects.filter(
+            user=FollowGraphTest.first, author=other).delete()
+        self.assertEqual(graph.suggestions(reader.pk), [popular.pk])
+
+    def test_unfollow_checks_database_when_graph_is_stale(self):
+        """Подписка, которой ещё нет в массивах кэша, отменяется,
+        а не даёт 404.
+        """
+        reader, popular = FollowGraphTest.reader, FollowGraphTest.popular
+        self.assertFalse(graph.is_following(reader.pk, popular.pk))
+        Follow.objects.bulk_create([Follow(user=reader, author=popular)])
+        self.client.force_login(reader)
+        response = self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': popular.username}
+        ))
+        self.assertRedirects(response, reverse(
+            'posts:profile', kwargs={'username': popular.username}
+        ))
+        self.assertFalse(
+            Follow.objects.filter(user=reader, author=popular).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    """Тест заранее созданных миниатюр."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.post = Post.objects.create(
+            text=const.POST_TEXT,
+            author=cls.author,
+            image=create_small_gif(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # потоки пула не должны писать в удаляемый каталог
+        thumbnails.shutdown()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_does_not_generate_thumbnails(self):
+        """Лента показывает готовую миниатюру, а пока её нет -
+        исходную картинку, не создавая миниатюру в запросе.
+        """
+        image = ThumbnailTest.post.image
+        response = self.client.get(const.INDEX_URL)
+        self.assertContains(response, image.url)
+        self.assertIsNone(thumbnails.get_cached(image))
+
+        thumbnail = thumbnails.generate(image)
+        cache.clear()
+        response = self.client.get(const.INDEX_URL)
+        self.assertContains(response, thumbnail.url)
+
+    def test_page_thumbnails_are_prefetched_in_one_query(self):
+        """Миниатюры страницы ищутся в хранилище sorl одним запросом,
+        а при рендере обращений к хранилищу нет.
+        """
+        for _ in range(3):
+            post = Post.objects.create(
+                text=const.POST_TEXT,
+                author=ThumbnailTest.author,
+                image=create_small_gif(),
+            )
+            thumbnails.generate(post.image)
+        cache.clear()
+        posts = list(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.prefetch(posts)
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertEqual(
+            sum(thumbnails.thumbnail_for(post) is not None for post in posts),
+            3,
+        )
+        self.assertIsNone(thumbnails.thumbnail_for(ThumbnailTest.post))
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(const.INDEX_URL)
+        self.assertEqual(
+            sum('thumbnail_kvstore' in query['sql'] for query in queries), 1
+        )
+        self.assertContains(response, ThumbnailTest.post.image.url)
+
+    def test_warm_thumbnails_submits_in_batches(self):
+        """Команда обрабатывает все картинки, ставя их в очередь
+        пула пачками.
+        """
+        for _ in range(2):
+            Post.objects.create(
+                text=const.POST_TEXT,
+                author=ThumbnailTest.author,
+                image=create_small_gif(),
+            )
+        out = StringIO()
+        # потоки пула не видят данных незафиксированной транзакции теста
+        with mock.patch(
+            'posts.management.commands.warm_thumbnails._warm',
+            return_value=True,
+        ) as warm:
+            call_command('warm_thumbnails', batch_size=2, stdout=out)
+        self.assertEqual(
+            sorted(call.args[0] for call in warm.call_args_list),
+            sorted(post.image.name for post in Post.objects.all()),
+        )
+        self.assertIn('Создано миниатюр: 3, ошибок: 0', out.getvalue())
+
+    @override_settings(POST_THUMBNAIL_WORKERS=2)
+    def test_submit_skips_image_in_progress(self):
+        """Картинка, миниатюра которой уже создаётся, в очередь
+        второй раз не ставится.
+        """
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            self.assertIsNotNone(thumbnails.submit(ThumbnailTest.post.image))
+            self.assertIsNone(thumbnails.submit(ThumbnailTest.post.image))
+        executor.return_value.submit.assert_called_once()
+        thumbnails._in_progress.discard(ThumbnailTest.post.image.name)
+
+
+class PostCardTest(TestCase):
+    """Тест кэша отрендеренных карточек постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        for number in range(3):
+            Post.objects.create(
+                text=f'{const.POST_TEXT} {number}', author=cls.author
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_posts(self):
+        return list(Post.objects.select_related('group', 'author'))
+
+    def test_cards_are_fetched_with_one_get_many(self):
+        """Карточки страницы достаются из кэша одним get_many
+        и повторно не рендерятся.
+        """
+        first = self.get_posts()
+        cards.prefetch(first)
+        posts = self.get_posts()
+        with mock.patch.object(cards, '_render') as render, \
+                mock.patch.object(
+                    cache, 'get_many', wraps=cache.get_many) as get_many:
+            cards.prefetch(posts)
+        render.assert_not_called()
+        get_many.assert_called_once()
+        self.assertEqual(
+            [cards.render(post) for post in posts],
+            [cards.render(post) for post in first],
+        )
+
+    def test_page_cards_are_prefetched_once(self):
+        """Страница ищет карточки один раз, а не на каждый пост."""
+        with mock.patch.object(
+            cards, 'prefetch', wraps=cards.prefetch
+        ) as prefetch:
+            response = self.client.get(const.PROFILE_URL)
+        prefetch.assert_called_once()
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_card_changes_with_post_and_author_name(self):
+        """Карточка меняется после правки поста и смены имени автора."""
+        post = self.get_posts()[0]
+        card = cards.render(post)
+        self.assertIn(post.text, card)
+
+        post.text = const.EDITED_POST_TEXT
+        post.save()
+        edited = cards.render(self.get_posts()[0])
+        self.assertIn(const.EDITED_POST_TEXT, edited)
+
+        PostCardTest.author.first_name = 'Лев'
+        PostCardTest.author.last_name = 'Толстой'
+        PostCardTest.author.save()
+        renamed = cards.render(self.get_posts()[0])
+        self.assertIn('Лев Толстой', renamed)
+        self.assertNotEqual(renamed, edited)
+
+
+class QueryBudgetTest(TestCase):
+    """Количество SQL-запросов страниц posts укладывается в бюджет
+    settings.QUERY_BUDGETS и не растёт с числом постов на странице.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = create_group_object()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.follower = create_user_object(const.TEST_USER_USERNAME)
+        for _ in range(const.AUTHOR_POST_COUNT):
+            cls.post = Post.objects.create(
+                text=const.POST_TEXT,
+                author=cls.author,
+                group=cls.group,
+            )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        for _ in range(settings.NUMBER_OF_ELEMENTS_PER_PAGE):
+            cls.post.comments.create(
+                text=const.POST_TEXT, author=cls.follower
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(QueryBudgetTest.author)
+        self.follower_client = Client()
+        self.follower_client.force_login(QueryBudgetTest.follower)
+
+    def get_requests(self):
+        """Запрос к каждому представлению posts: (имя, клиент, метод,
+        URL, данные).
+        """
+        post_kwargs = {'post_id': QueryBudgetTest.post.pk}
+        return (
+            ('index', self.follower_client, 'get', const.INDEX_URL),
+            ('group_list', self.follower_client, 'get',
+             const.GROUP_LIST_URL),
+            ('profile', self.follower_client, 'get', const.PROFILE_URL),
+            ('post_details', self.follower_client, 'get',
+             reverse('posts:post_details', kwargs=post_kwargs)),
+            ('post_create', self.author_client, 'get',
+             const.POST_CREATE_URL),
+            ('post_edit', self.author_client, 'get',
+             reverse('posts:post_edit', kwargs=post_kwargs)),
+            ('add_comment', self.follower_client, 'post',
+             reverse('posts:add_comment', kwargs=post_kwargs),
+             {'text': const.POST_TEXT}),
+            ('follow_index', self.follower_client, 'get',
+             const.FOLLOW_INDEX_URL),
+            ('followers', self.follower_client, 'get',
+             const.FOLLOWERS_URL),
+            ('following', self.follower_client, 'get',
+             const.FOLLOWING_URL),
+            ('search', self.follower_client, 'get', const.SEARCH_URL,
+             {'q': const.POST_TEXT}),
+            ('profile_unfollow', self.follower_client, 'get',
+             const.PROFILE_UNFOLLOW_URL),
+            ('profile_follow', self.follower_client, 'get',
+             const.PROFILE_FOLLOW_URL),
+        )
+
+    def test_profile_paginator_ignores_drifted_counter(self):
+        """Разошедшийся счётчик постов не прячет посты профиля."""
+        UserStats.objects.filter(user=QueryBudgetTest.author).update(
+            posts_count=0
+        )
+        response = self.follower_client.get(const.PROFILE_URL)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            const.AUTHOR_POST_COUNT,
+        )
+        self.assertTrue(response.context['page_obj'].object_list)
+
+    def test_every_view_has_budget(self):
+        """У каждого URL приложения posts задан бюджет запросов."""
+        names = {f'posts:{pattern.name}' for pattern in urlpatterns}
+        self.assertEqual(
+            names - set(settings.QUERY_BUDGETS), set(),
+        )
+        self.assertEqual(
+            names,
+            {f'posts:{name}' for name, *_ in self.get_requests()},
+        )
+
+    def test_views_fit_query_budgets(self):
+        """Страницы делают не больше SQL-запросов, чем задано
+        в settings.QUERY_BUDGETS, и отдают заголовок Server-Timing.
+        """
+        for name, client, method, url, *data in self.get_requests():
+            view_name = f'posts:{name}'
+            with self.subTest(view=view_name):
+                response = getattr(client, method)(url, *data)
+                self.assertIn('Server-Timing', response)
+                self.assertLessEqual(
+                    response.metrics.queries,
+                    settings.QUERY_BUDGETS[view_name],
+                    msg=response['Server-Timing'],
+                )
+
+
+class SearchTest(TestCase):
+    """Тест полнотекстового поиска."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.post = Post.objects.create(
+            text='Ёжик в тумане', author=cls.author
+        )
+        cls.commented_post = Post.objects.create(
+            text='Про кино', author=cls.author
+        )
+        cls.commented_post.comments.create(
+            text='Ёжик там тоже есть', author=cls.author
+        )
+        cls.other_post = Post.objects.create(
+            text='Совсем другое', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(const.SEARCH_URL, {'q': query})
+        return list(response.context['page_obj'])
+
+    def check_search(self):
+        self.assertEqual(
+            set(self.search('ежик')),
+            {SearchTest.post, SearchTest.commented_post},
+        )
+        self.assertEqual(self.search('ежик тумане'), [SearchTest.post])
+        self.assertEqual(self.search('"ежик" OR другое'), [])
+        self.assertEqual(self.search(''), [])
+
+        other_post = Post.objects.get(pk=SearchTest.other_post.pk)
+        other_post.text = 'Теперь и тут ёжик'
+        other_post.save()
+        Post.objects.filter(pk=SearchTest.post.pk).delete()
+        cache.clear()
+        self.assertEqual(
+            set(self.search('ежик')),
+            {SearchTest.commented_post, SearchTest.other_post},
+        )
+
+    def test_search_uses_fts_index(self):
+        """Поиск по SQLite FTS5 находит посты по тексту и комментариям
+        и следит за изменениями.
+        """
+        self.assertTrue(search.uses_fts())
+        self.check_search()
+
+    def test_search_uses_inverted_index_without_fts(self):
+        """Без FTS5 поиск идёт по инвертированному индексу SearchTerm."""
+        with mock.patch.object(search, 'uses_fts', return_value=False):
+            search.rebuild()
+            self.check_search()
+
+    def test_results_are_paginated_by_cursor(self):
+        """Результаты листаются курсором без повторов и пропусков."""
+        for _ in range(settings.NUMBER_OF_ELEMENTS_PER_PAGE):
+            Post.objects.create(text='ёжик ёжик', author=SearchTest.author)
+        found = []
+        params = {'q': 'ежик'}
+        while True:
+            response = self.client.get(const.SEARCH_URL, params)
+            page_obj = response.context['page_obj']
+            found.extend(page_obj)
+            if not page_obj.has_next():
+                break
+            params['cursor'] = page_obj.next_cursor
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(
+            len(found), settings.NUMBER_OF_ELEMENTS_PER_PAGE + 2
+        )
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты и комментарии через индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'ежик'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [SearchTest.post]
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'кино'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class AdminChangeListTest(TestCase):
+    """Тест списков админки для больших таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.group = create_group_object()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(AdminChangeListTest.admin)
+
+    def create_rows(self, count):
+        for _ in range(count):
+            post = Post.objects.create(
+                text=const.POST_TEXT, author=AdminChangeListTest.author,
+                group=AdminChangeListTest.group,
+            )
+            Comment.objects.create(
+                post=post, author=AdminChangeListTest.author,
+                text=const.POST_TEXT,
+            )
+        Follow.objects.get_or_create(
+            user=AdminChangeListTest.admin, author=AdminChangeListTest.author
+        )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        """Число запросов списка не растёт с числом строк,
+        а вся таблица не пересчитывается на каждой загрузке.
+        """
+        urls = [
+            reverse(f'admin:posts_{model}_changelist')
+            for model in ('post', 'comment', 'follow')
+        ]
+        self.create_rows(2)
+        few = [self.count_queries(url) for url in urls]
+        self.create_rows(10)
+        cache.clear()
+        self.assertEqual([self.count_queries(url) for url in urls], few)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(urls[0])
+        self.assertFalse([
+            query for query in queries
+            if 'COUNT(' in query['sql'] and 'posts_post' in query['sql']
+        ])
+
+    def test_posts_are_walked_by_cursor(self):
+        """Список постов листается курсором без пропусков и повторов."""
+        self.create_rows(5)
+        url = reverse('admin:posts_post_changelist')
+        found = []
+        params = {}
+        with mock.patch.object(PostAdmin, 'list_per_page', 2):
+            while True:
+                cl = self.client.get(url, params).context['cl']
+                found.extend(post.pk for post in cl.result_list)
+                if not cl.keyset_page.has_next():
+                    break
+                params['cursor'] = cl.keyset_page.next_cursor
+        self.assertEqual(
+            found,
+            list(Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True)),
+        )
+
+
+class FollowAdminTest(TestCase):
+    """Тест списка подписок в админке на 10 тысячах подписок."""
+
+    USERS = 101
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        User.objects.bulk_create(
+            User(username=f'user{number}')
+            for number in range(FollowAdminTest.USERS)
+        )
+        ids = list(User.objects.filter(
+            username__startswith='user').values_list('pk', flat=True))
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in ids for author_id in ids if user_id != author_id
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(FollowAdminTest.admin)
+
+    def test_changelist_queries_do_not_depend_on_rows(self):
+        """Список и поиск подписок укладываются в несколько запросов:
+        имена пользователей приходят в JOIN, а не запросом на строку.
+        """
+        self.assertEqual(Follow.objects.count(), 10100)
+        url = reverse('admin:posts_follow_changelist')
+        for params in ({}, {'q': 'user1'}):
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, params)
+                self.assertEqual(
+                    len(response.context['cl'].result_list), 100
+                )
+                self.assertLessEqual(len(queries), 6)
+                self.assertContains(response, 'user1')
+
+    def test_delete_confirmation_joins_users(self):
+        """Подтверждение удаления и страница подписки получают имена
+        пользователей в JOIN, а не запросом на подписку.
+        """
+        follows = list(Follow.objects.order_by('pk')[:100])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('admin:posts_follow_changelist'),
+                {
+                    'action': 'delete_selected',
+                    '_selected_action': [follow.pk for follow in follows],
+                },
+            )
+        self.assertContains(response, str(follows[0]))
+        self.assertLessEqual(len(queries), 8)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(
+                'admin:posts_follow_delete', args=(follows[0].pk,)
+            ))
+        self.assertContains(response, str(follows[0]))
+        self.assertLessEqual(len(queries), 6)
+
+    def test_user_pickers_use_autocomplete(self):
+        """Поля пользователя и автора - поиск, а не список всех
+        пользователей.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:posts_follow_add'))
+        self.assertContains(response, 'data-ajax--url', count=2)
+        self.assertNotContains(response, 'user100')
+        self.assertLessEqual(len(queries), 5)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ModerationTest(TestCase):
+    """Тест массовых действий модерации в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.reader = create_user_object(const.TEST_USER_USERNAME)
+        cls.group = create_group_object()
+        cls.another_group = create_group_object(
+            const.ANOTHER_GROUP_TITLE, const.ANOTHER_GROUP_SLUG,
+            const.ANOTHER_GROUP_DESCRIPTION,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # потоки пула не должны писать в удаляемый каталог
+        thumbnails.shutdown()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(ModerationTest.admin)
+
+    def create_posts(self, author, count):
+        posts = []
+        for _ in range(count):
+            post = Post.objects.create(
+                text=const.POST_TEXT, author=author,
+                group=ModerationTest.group,
+            )
+            for text in (const.POST_TEXT, const.EDITED_POST_TEXT):
+                Comment.objects.create(
+                    post=post, author=ModerationTest.reader, text=text)
+            posts.append(post.pk)
+        return Post.objects.filter(pk__in=posts)
+
+    def count_queries(self, action, queryset, *args):
+        with CaptureQueriesContext(connection) as queries:
+            action(queryset, *args)
+        return len(queries)
+
+    def test_actions_do_not_query_per_row(self):
+        """Число запросов действия не растёт с числом строк."""
+        actions = (
+            (moderation.move_to_group, ModerationTest.another_group),
+            (moderation.purge_comments, const.EDITED_POST_TEXT),
+            (moderation.delete_posts,),
+        )
+        for action, *args in actions:
+            with self.subTest(action=action.__name__):
+                few = self.count_queries(
+                    action, self.create_posts(ModerationTest.author, 2),
+                    *args)
+                many = self.count_queries(
+                    action, self.create_posts(ModerationTest.author, 20),
+                    *args)
+                self.assertEqual(many, few)
+
+    def test_deleted_posts_leave_nothing_behind(self):
+        """Вместе с постами удаляются комментарии, записи лент,
+        документы поиска и миниатюры, а счётчики пересчитываются.
+        """
+        posts = self.create_posts(ModerationTest.author, 3)
+        kept = Post.objects.create(
+            text=const.EDITED_POST_TEXT, author=ModerationTest.reader)
+        image = Post.objects.create(
+            text=const.POST_TEXT, author=ModerationTest.author,
+            image=create_small_gif(),
+        ).image
+        thumbnail = thumbnails.generate(image)
+
+        deleted = moderation.delete_author_posts(
+            posts.filter(pk=posts.first().pk))
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(list(Post.objects.all()), [kept])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(search.search_posts(const.POST_TEXT)), [kept])
+        self.assertEqual(
+            UserStats.objects.get(user=ModerationTest.author).posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=ModerationTest.reader).posts_count, 1)
+        self.assertIsNone(thumbnails.get_cached(image))
+        self.assertFalse(thumbnail.exists())
+
+    def test_failed_chunk_keeps_counters_and_bumps_versions(self):
+        """Если пачка упала, счётчики уже удалённых пачек верны,
+        а версии кэша страниц всё равно сдвигаются.
+        """
+        posts = self.create_posts(ModerationTest.author, 3)
+        versions = get_versions(['post', 'comment'])
+        remove_posts = search.remove_posts
+        calls = []
+
+        def fail_second_chunk(post_ids):
+            calls.append(post_ids)
+            if len(calls) > 1:
+                raise DatabaseError
+            remove_posts(post_ids)
+
+        with mock.patch.object(
+            search, 'remove_posts', side_effect=fail_second_chunk
+        ):
+            with self.assertRaises(DatabaseError):
+                moderation.delete_posts(posts, chunk_size=2)
+
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=ModerationTest.author).posts_count, 1)
+        new_versions = get_versions(['post', 'comment'])
+        for scope in versions:
+            self.assertGreater(new_versions[scope], versions[scope])
+
+    def post_action(self, model, action, data):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            {'action': action, 'index': 0, **data},
+        )
+
+    def test_admin_asks_for_group_and_moves_posts(self):
+        """Перенос в группу спрашивает группу, затем переносит
+        выбранные посты.
+        """
+        posts = self.create_posts(ModerationTest.author, 3)
+        selected = {'_selected_action': [post.pk for post in posts[:2]]}
+        response = self.post_action('post', 'move_to_group', selected)
+        self.assertIsInstance(
+            response.context['form'].fields['group'], forms.ModelChoiceField)
+
+        response = self.post_action('post', 'move_to_group', {
+            **selected, 'apply': 1, 'group': ModerationTest.another_group.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Post.objects.filter(group=ModerationTest.another_group).count(),
+            2,
+        )
+
+    def test_admin_purges_comments_of_whole_list(self):
+        """«Выбрать все» удаляет подходящие комментарии всего списка
+        и пересчитывает счётчики комментариев постов.
+        """
+        posts = self.create_posts(ModerationTest.author, 3)
+        response = self.post_action('comment', 'purge_matching', {
+            'select_across': 1, 'apply': 1, 'text': const.EDITED_POST_TEXT,
+            '_selected_action': [Comment.objects.first().pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            Comment.objects.filter(text=const.EDITED_POST_TEXT).exists())
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(
+            set(posts.values_list('comments_count', flat=True)), {1})
+
+
+@override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_LINGER=1)
+class WriteQueueTest(TransactionTestCase):
+    """Комментарии и подписки через очередь записи. Поток очереди
+    пишет через своё соединение, поэтому данные фиксируются.
+    """
+
+    def setUp(self):
+        self.author = create_user_object(const.AUTHOR_USERNAME)
+        self.reader = create_user_object(const.TEST_USER_USERNAME)
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.details_url = reverse(
+            'posts:post_details', kwargs={'post_id': self.post.pk})
+        self.addCleanup(writes.stop)
+
+    def test_comment_is_visible_to_its_author_before_saving(self):
+        """Несохранённый комментарий виден автору, сохраняется
+        потоком очереди со срабатыванием сигналов.
+        """
+        # пачка ждёт WRITE_QUEUE_LINGER, пока идут запросы страницы
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий из очереди'},
+        )
+        pending = self.reader_client.get(
+            self.details_url).context['pending_comments']
+        other = self.author_client.get(
+            self.details_url).context['pending_comments']
+        writes.flush()
+
+        self.assertIn(
+            'Комментарий из очереди', [comment.text for comment in pending])
+        self.assertEqual(other, [])
+        self.assertTrue(Comment.objects.filter(
+            post=self.post, author=self.reader,
+            text='Комментарий из очереди').exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(
+            self.reader_client.get(
+                self.details_url).context['pending_comments'],
+            [],
+        )
+
+    @override_settings(WRITE_QUEUE_BATCH_SIZE=5)
+    def test_writes_are_grouped_into_one_transaction(self):
+        """Записи, поставленные подряд, сохраняются одной пачкой."""
+        with mock.patch.object(
+                writes, 'apply', wraps=writes.apply) as apply:
+            for number in range(5):
+                writes.add_comment(self.reader, self.post.pk, str(number))
+            writes.flush()
+
+        self.assertEqual(
+            [len(batch) for (batch,), _ in apply.call_args_list], [5])
+        self.assertEqual(
+            list(self.post.comments.order_by('pk').values_list(
+                'text', flat=True)),
+            ['0', '1', '2', '3', '4'],
+        )
+
+    def test_follow_state_is_read_your_writes(self):
+        """Подписка и отписка сразу видны на странице автора
+        и сохраняются по порядку; повторная подписка не ошибка.
+        """
+        profile_url = reverse(
+            'posts:profile', kwargs={'username': self.author.username})
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username})
+        unfollow_url = reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username},
+        )
+        self.reader_client.get(follow_url)
+        self.assertTrue(
+            self.reader_client.get(profile_url).context['following'])
+        self.assertEqual(
+            self.reader_client.get(follow_url).status_code, 302)
+        writes.flush()
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.reader, author=self.author).count(),
+            1,
+        )
+
+        self.reader_client.get(unfollow_url)
+        self.assertFalse(
+            self.reader_client.get(profile_url).context['following'])
+        writes.flush()
+        self.assertFalse(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        self.assertEqual(
+            self.author_client.get(follow_url).status_code, 403)
+
+
+class ConditionalGetTest(TestCase):
+    """Тест ответов 304 на условные запросы страниц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = create_group_object()
+        cls.author = create_user_object(const.AUTHOR_USERNAME)
+        cls.post = Post.objects.create(
+            author=cls.author, text=const.POST_TEXT, group=cls.group
+        )
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text=const.POST_TEXT
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_urls(self):
+        return (
+            const.GROUP_LIST_URL,
+            const.PROFILE_URL,
+            reverse('posts:post_details',
+                    kwargs={'post_id': ConditionalGetTest.post.pk}),
+        )
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        """Неизменившаяся страница - 304 без запросов к БД;
+        Last-Modified - дата самой новой записи на странице.
+        """
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                with self.assertNumQueries(0):
+                    cached = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(
+                    self.client.get(
+                        url,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                    ).status_code,
+                    304,
+                )
+        details = self.client.get(self.get_urls()[-1])
+        self.assertEqual(
+            details['Last-Modified'],
+            ConditionalGetTest.comment.pub_date.strftime(
+                '%a, %d %b %Y %H:%M:%S GMT'),
+        )
+
+    def test_changes_and_visitors_get_new_etag(self):
+        """Правка поста и другой посетитель дают другой ETag."""
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                author_client = Client()
+                author_client.force_login(ConditionalGetTest.author)
+                self.assertEqual(
+                    author_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200,
+                )
+
+                post = Post.objects.get(pk=ConditionalGetTest.post.pk)
+                post.text = const.EDITED_POST_TEXT
+                post.save()
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200,
+                )
+
+    def assert_modified_after(self, url, change):
+        """После change, сделанного секундой позже, запрос
+        с If-Modified-Since получает 200.
+        """
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+            304,
+        )
+        later = parse_http_date(last_modified) + 1
+        with mock.patch('core.cache.time.time', return_value=later):
+            change()
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+            200,
+        )
+
+    def test_burst_of_changes_keeps_last_modified_current(self):
+        """Много изменений подряд не уводят Last-Modified в будущее."""
+        for _ in range(5):
+            bump_version('post')
+        self.assertLessEqual(
+            changed_at(['post']).timestamp(), math.ceil(time.time())
+        )
+
+    def test_edit_changes_last_modified(self):
+        """Правка поста, не меняющая дат публикации, сдвигает
+        Last-Modified.
+        """
+        def edit():
+            post = Post.objects.get(pk=ConditionalGetTest.post.pk)
+            post.text = const.EDITED_POST_TEXT
+            post.save()
+
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                self.assert_modified_after(url, edit)
+
+    def test_delete_changes_last_modified(self):
+        """Удаление самого нового поста не возвращает Last-Modified
+        назад, к дате предыдущего.
+        """
+        for url in self.get_urls()[:2]:
+            with self.subTest(url=url):
+                newest_post = Post.objects.create(
+                    author=ConditionalGetTest.author, text=const.POST_TEXT,
+                    group=ConditionalGetTest.group,
+                )
+                self.assert_modified_after(url, newest_post.delete)
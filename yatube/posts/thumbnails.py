@@ -0,0 +1,215 @@
+"""Миниатюры картинок постов.
+
+Миниатюры создаются заранее - после сохранения поста, в пуле фоновых
+потоков, - а шаблоны только берут готовую миниатюру из хранилища
+sorl-thumbnail. Рендер ленты не ждёт Pillow: если миниатюры ещё нет,
+её генерация ставится в очередь пула, а страница показывает исходную
+картинку. Без пула миниатюра создаётся при сохранении поста.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from core.models import raw_delete
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# картинки, миниатюры которых уже генерируются; запросы и потоки
+# пула меняют множество одновременно
+_in_progress = set()
+_in_progress_lock = threading.Lock()
+# атрибут поста с миниатюрой, найденной prefetch
+PREFETCHED_ATTR = '_prefetched_thumbnail'
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def shutdown() -> None:
+    """Дожидается миниатюр из очереди пула и останавливает его,
+    например до удаления каталога с картинками. Следующий submit
+    создаст пул заново.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def thumbnail_file(image) -> ImageFile:
+    """Файл миниатюры картинки (без проверки, что он создан).
+    Имя вычисляется так же, как в sorl.thumbnail get_thumbnail.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(settings.POST_THUMBNAIL_OPTIONS)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(
+        source, settings.POST_THUMBNAIL_GEOMETRY, options
+    )
+    return ImageFile(name, default.storage)
+
+
+def get_cached(image) -> Optional[ImageFile]:
+    """Готовая миниатюра или None. Картинку не обрабатывает."""
+    if not image:
+        return None
+    return default.kvstore.get(thumbnail_file(image))
+
+
+def thumbnail_for(post) -> Optional[ImageFile]:
+    """Миниатюра картинки поста: из prefetch, если он был."""
+    if hasattr(post, PREFETCHED_ATTR):
+        return getattr(post, PREFETCHED_ATTR)
+    return get_cached(post.image)
+
+
+def prefetch(posts: Iterable) -> None:
+    """Находит готовые миниатюры для всех постов страницы разом:
+    одним get_many к кэшу и одним запросом к БД для промахов,
+    вместо отдельного обращения к хранилищу на каждый пост.
+    """
+    keys = {}
+    for post in posts:
+        if post.image:
+            keys[add_prefix(thumbnail_file(post.image).key)] = post
+        else:
+            setattr(post, PREFETCHED_ATTR, None)
+    if not keys:
+        return
+
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        for post in keys.values():
+            setattr(post, PREFETCHED_ATTR, get_cached(post.image))
+        return
+
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        for key in missing:
+            values[key] = found.get(key, cached_db_kvstore.EMPTY_VALUE)
+        kvstore.cache.set_many(
+            {key: values[key] for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+    for key, post in keys.items():
+        value = values[key]
+        if value is cached_db_kvstore.EMPTY_VALUE:
+            value = None
+        else:
+            value = deserialize_image_file(value)
+        setattr(post, PREFETCHED_ATTR, value)
+
+
+def generate(image) -> ImageFile:
+    """Создаёт миниатюру картинки в текущем потоке."""
+    return get_thumbnail(
+        image,
+        settings.POST_THUMBNAIL_GEOMETRY,
+        **settings.POST_THUMBNAIL_OPTIONS,
+    )
+
+
+def _generate_safely(name: str) -> None:
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+
+
+def _generate_in_background(name: str) -> None:
+    try:
+        _generate_safely(name)
+    finally:
+        with _in_progress_lock:
+            _in_progress.discard(name)
+        # у каждого потока пула своё соединение с БД
+        connection.close()
+
+
+def submit(image) -> Optional[Future]:
+    """Ставит генерацию миниатюры в очередь пула потоков.
+    Без пула (POST_THUMBNAIL_WORKERS = 0) ничего не делает.
+    """
+    name = getattr(image, 'name', image)
+    if not settings.POST_THUMBNAIL_WORKERS or not name:
+        return None
+    with _in_progress_lock:
+        if name in _in_progress:
+            return None
+        _in_progress.add(name)
+    return _get_executor().submit(_generate_in_background, name)
+
+
+def schedule(image) -> None:
+    """Создаёт миниатюру сохранённой картинки после фиксации транзакции:
+    в пуле потоков, а без пула - сразу, в потоке сохранения.
+    """
+    if not image:
+        return
+    name = image.name
+
+    def create():
+        if settings.POST_THUMBNAIL_WORKERS:
+            submit(name)
+        else:
+            _generate_safely(name)
+
+    transaction.on_commit(create)
+
+
+def forget(images: Iterable[str]) -> None:
+    """Удаляет миниатюры картинок и их записи в хранилище
+    sorl-thumbnail: после массового удаления постов. Записи
+    удаляются одним запросом к БД и одним delete_many к кэшу.
+    """
+    images = [name for name in images if name]
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        for name in images:
+            kvstore.delete(ImageFile(name))
+        return
+    keys = []
+    for name in images:
+        source = ImageFile(name)
+        thumbnail = thumbnail_file(name)
+        keys += [
+            add_prefix(source.key),
+            add_prefix(source.key, identity='thumbnails'),
+            add_prefix(thumbnail.key),
+        ]
+        thumbnail.delete()
+    if keys:
+        raw_delete(KVStoreModel.objects.filter(key__in=keys))
+        kvstore.cache.delete_many(keys)
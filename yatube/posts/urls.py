@@ -13,7 +13,18 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment, name=(
         'add_comment')),
+    path(
+        'profile/<str:username>/followers/',
+        views.followers,
+        name='followers'
+    ),
+    path(
+        'profile/<str:username>/following/',
+        views.following,
+        name='following'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
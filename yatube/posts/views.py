@@ -1,15 +1,49 @@
+from core.cache import cache_anonymous_page
+from core.conditional import conditional_page, newest
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from . import counters, feed, graph, search, thumbnails, writes
 from .factories import create_page_obj
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
 
 
+def _visitor(request) -> str:
+    """Части страницы, зависящие от посетителя: шапка и кнопки,
+    CSRF-токен формы и записи, ещё стоящие в очереди.
+    """
+    if not request.user.is_authenticated:
+        return ''
+    return ':'.join((
+        str(request.user.pk),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        str(writes.pending_count(request.user)),
+    ))
+
+
+def _group_modified(request, slug):
+    # изменение самой группы и её постов одним запросом
+    return newest(
+        Group.objects.filter(slug=slug), 'updated_at', 'posts__updated_at'
+    )
+
+
+def _profile_modified(request, username):
+    return newest(Post.objects.filter(author__username=username), 'updated_at')
+
+
+def _post_modified(request, post_id):
+    # изменение поста и его последний комментарий одним запросом
+    return newest(
+        Post.objects.filter(pk=post_id), 'updated_at', 'comments__pub_date'
+    )
+
+
+@cache_anonymous_page('post', 'group', 'user')
 def index(request):
     """Рендер главной страницы сайта,
     где расположены 10 последних обновлений.
@@ -25,13 +59,16 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_page(
+    'post', 'group', 'user', modified=_group_modified, vary=_visitor)
+@cache_anonymous_page('post', 'group', 'user')
 def group_posts(request, slug):
     """Рендер страницы группы,
     на которой выводятся 10 последних обновлений,
     отфильтрованных по группе.
     """
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author').all()
+    post_list = group.posts.select_related('author', 'group').all()
     page_obj = create_page_obj(post_list, request)
 
     template = settings.GROUP_LIST_TEMPLATE
@@ -42,41 +79,106 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(
+    'post', 'group', 'user', 'follow',
+    modified=_profile_modified, vary=_visitor,
+)
+@cache_anonymous_page('post', 'group', 'user', 'follow')
 def profile(request, username):
     """Рендер страницы профайла пользователя."""
     template = settings.PROFILE_TEMPLATE
 
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     post_list = author.posts.select_related('group',).all()
     page_obj = create_page_obj(post_list, request)
 
     following = False
     if request.user.is_authenticated:
-        following = request.user.follower.filter(author=author).exists()
+        following = writes.is_following(
+            request.user, author,
+            graph.is_following(request.user.pk, author.pk),
+        )
 
     context = {
         'page_obj': page_obj,
         'author': author,
+        'author_stats': counters.get_stats(author),
         'following': following,
     }
     return render(request, template, context)
 
 
+def _follow_list(request, username, owner, listed, title, counter):
+    """Страница подписчиков или подписок пользователя.
+    Подписки листаются курсором по pk - одним диапазоном индекса
+    (owner, id) при любом их количестве, пользователи строк
+    приходят в том же запросе, а их число - из счётчиков UserStats.
+    """
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    follows = Follow.objects.filter(**{owner: author}).select_related(
+        listed).only(*(f'{listed}__{field}' for field in (
+            'username', 'first_name', 'last_name')))
+    page_obj = create_page_obj(follows, request, keyset=True, keys=('pk',))
+
+    context = {
+        'page_obj': page_obj,
+        'users': [getattr(follow, listed) for follow in page_obj],
+        'author': author,
+        'title': title,
+        'count': getattr(counters.get_stats(author), counter),
+    }
+    return render(request, settings.FOLLOW_LIST_TEMPLATE, context)
+
+
+@conditional_page('user', 'follow', vary=_visitor)
+@cache_anonymous_page('user', 'follow')
+def followers(request, username):
+    """Подписчики пользователя, новые сверху."""
+    return _follow_list(
+        request, username, 'author', 'user', 'Подписчики', 'followers_count'
+    )
+
+
+@conditional_page('user', 'follow', vary=_visitor)
+@cache_anonymous_page('user', 'follow')
+def following(request, username):
+    """Авторы, на которых подписан пользователь, новые сверху."""
+    return _follow_list(
+        request, username, 'user', 'author', 'Подписки', 'following_count'
+    )
+
+
+@conditional_page(
+    'post', 'group', 'user', 'comment',
+    modified=_post_modified, vary=_visitor,
+)
+@cache_anonymous_page('post', 'group', 'user', 'comment')
 def post_details(request, post_id):
     """Рендер страницы отдельного поста."""
     post = get_object_or_404(
-        Post.objects.select_related('group', 'author'), pk=post_id
+        Post.objects.select_related('group', 'author', 'author__stats'),
+        pk=post_id,
     )
 
     comments_list = post.comments.select_related('author').all()
     page_obj = create_page_obj(comments_list, request)
+    # свои комментарии из очереди записи автор видит сразу
+    pending_comments = []
+    if not page_obj.has_previous():
+        pending_comments = writes.pending_comments(request.user, post.pk)
 
     template = settings.POST_DETAILS_TEMPLATE
     context = {
         'post': post,
         'post_title': post.text[:settings.POST_TITLE_LENGTH],
+        'author_stats': counters.get_stats(post.author),
         'form': CommentForm(),
         'page_obj': page_obj,
+        'pending_comments': pending_comments,
     }
     return render(request, template, context)
 
@@ -95,6 +197,7 @@ def post_create(request):
         author = request.user
         post.author_id = author.id
         post.save()
+        thumbnails.schedule(post.image)
         return redirect('posts:profile', author.username)
     action_url = reverse('posts:post_create')
     context = {
@@ -130,19 +233,20 @@ def post_edit(request, post_id):
         }
         return render(request, template, context)
 
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post.image)
     return redirect_details
 
 
 @login_required
 def add_comment(request, post_id):
-    """Обработка отправленного комментария."""
+    """Обработка отправленного комментария.
+    Комментарий сохраняется через очередь записи.
+    """
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = Post.objects.get(id=post_id)
-        comment.save()
+        writes.add_comment(request.user, post_id, form.cleaned_data['text'])
     return redirect('posts:post_details', post_id=post_id)
 
 
@@ -151,36 +255,59 @@ def follow_index(request):
     """Отображение страницы с постами,
     на авторов которых подписан пользователь.
     """
-    subscriptions = request.user.follower.all()
-    post_list = Post.objects.filter(author__following__in=subscriptions)
-    page_obj = create_page_obj(post_list, request)
+    post_list = feed.get_feed(request.user)
+    page_obj = create_page_obj(post_list, request, keys=feed.FEED_KEYS)
+    suggested = graph.suggestions(request.user.pk)
+    authors = User.objects.in_bulk(suggested)
 
     context = {
         'page_obj': page_obj,
+        'suggestions': [authors[pk] for pk in suggested if pk in authors],
     }
     return render(request, settings.FOLLOW_TEMPLATE, context)
 
 
+@cache_anonymous_page('post', 'comment', 'group', 'user')
+def post_search(request):
+    """Поиск постов по словам из текста постов и комментариев.
+    Результаты упорядочены по релевантности и листаются курсором.
+    """
+    query = request.GET.get('q', '').strip()
+    post_list = search.search_posts(query)
+    page_obj = create_page_obj(
+        post_list, request, keyset=True, keys=search.SEARCH_KEYS
+    )
+    search.load_posts(page_obj)
+
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, settings.SEARCH_TEMPLATE, context)
+
+
 @login_required
 def profile_follow(request, username):
-    """Подписка на автора."""
+    """Подписка на автора через очередь записи.
+    Повторная подписка ничего не меняет.
+    """
     follower = request.user
     following = get_object_or_404(User, username=username)
-    try:
-        Follow.objects.create(
-            author=following,
-            user=follower,
-        )
-    except IntegrityError:
+    if following.pk == follower.pk:
         return HttpResponseForbidden()
+    writes.follow(follower, following)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    """Отписка от автора."""
+    """Отписка от автора через очередь записи."""
     follower = request.user
     following = get_object_or_404(User, username=username)
-    follow = get_object_or_404(Follow, author=following, user=follower)
-    follow.delete()
+    # массивы графа в кэше могут отставать от базы - решает база
+    saved = graph.is_following(follower.pk, following.pk) or (
+        Follow.objects.filter(user=follower, author=following).exists())
+    if not writes.is_following(follower, following, saved):
+        raise Http404('Подписки на автора нет.')
+    writes.unfollow(follower, following)
     return redirect('posts:profile', username)
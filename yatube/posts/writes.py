@@ -0,0 +1,256 @@
+"""Очередь записи комментариев и подписок.
+
+Представления не пишут комментарии и подписки сами, а ставят записи
+в очередь процесса и сразу отвечают. Фоновый поток забирает записи
+пачками и сохраняет каждую пачку одной транзакцией: SQLite держит
+блокировку записи и синхронизирует диск один раз на пачку, а не
+на каждый запрос. Объекты сохраняются через save() и delete(),
+поэтому сигналы (счётчики, ленты, поиск, кэш страниц) срабатывают
+как обычно.
+
+Пока запись не сохранена, она числится за автором в pending:
+автор сразу видит свой комментарий и новое состояние подписки.
+Это гарантируется в пределах процесса, в котором стоит очередь.
+Без WRITE_QUEUE_ENABLED записи сохраняются сразу, в запросе.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User
+
+logger = logging.getLogger(__name__)
+
+COMMENT = 'comment'
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+
+
+class Write(NamedTuple):
+    """Отложенная запись: target_id - пост комментария
+    или автор подписки.
+    """
+    kind: str
+    user_id: int
+    target_id: int
+    text: str = ''
+    created: Optional[object] = None
+
+
+_queue: 'queue.Queue[Optional[Write]]' = queue.Queue()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+# несохранённые записи по id пользователя
+_pending: Dict[int, List[Write]] = {}
+_pending_lock = threading.Lock()
+
+
+def _write(batch: List[Write]) -> None:
+    """Сохраняет записи по порядку. Существование постов и подписок
+    проверяется одним запросом на пачку; комментарии к удалённым
+    постам, повторные подписки и отписки без подписки пропускаются.
+    """
+    post_ids = {write.target_id for write in batch if write.kind == COMMENT}
+    posts = set()
+    if post_ids:
+        posts = set(Post.objects.filter(
+            pk__in=post_ids).values_list('pk', flat=True))
+
+    follow_writes = [write for write in batch if write.kind != COMMENT]
+    follows = {}
+    if follow_writes:
+        follows = {
+            (follow.user_id, follow.author_id): follow
+            for follow in Follow.objects.filter(
+                user_id__in={write.user_id for write in follow_writes},
+                author_id__in={write.target_id for write in follow_writes},
+            )
+        }
+
+    for write in batch:
+        key = (write.user_id, write.target_id)
+        if write.kind == COMMENT:
+            if write.target_id in posts:
+                Comment.objects.create(
+                    post_id=write.target_id,
+                    author_id=write.user_id,
+                    text=write.text,
+                )
+        elif write.kind == FOLLOW:
+            if key not in follows and write.user_id != write.target_id:
+                follows[key] = Follow.objects.create(
+                    user_id=write.user_id, author_id=write.target_id
+                )
+        else:
+            follow = follows.pop(key, None)
+            if follow is not None:
+                follow.delete()
+
+
+def apply(batch: List[Write]) -> None:
+    """Сохраняет пачку одной транзакцией. Если она не прошла,
+    записи сохраняются по одной, чтобы ошибочная запись
+    не потянула за собой остальные.
+    """
+    try:
+        with transaction.atomic():
+            _write(batch)
+    except DatabaseError:
+        if len(batch) == 1:
+            raise
+        for write in batch:
+            try:
+                apply([write])
+            except DatabaseError:
+                logger.exception('Не удалось сохранить %s', write)
+
+
+def _next_batch() -> Optional[List[Write]]:
+    """Ждёт первую запись и добирает к ней пачку в течение
+    WRITE_QUEUE_LINGER. None - очередь остановлена.
+    """
+    write = _queue.get()
+    if write is None:
+        return None
+    batch = [write]
+    deadline = time.monotonic() + settings.WRITE_QUEUE_LINGER
+    while len(batch) < settings.WRITE_QUEUE_BATCH_SIZE:
+        try:
+            write = _queue.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        if write is None:
+            # остановка: сохраняем собранное и выходим следующим циклом
+            _queue.task_done()
+            _queue.put(None)
+            break
+        batch.append(write)
+    return batch
+
+
+def _forget(batch: List[Write]) -> None:
+    with _pending_lock:
+        for write in batch:
+            writes = _pending.get(write.user_id, [])
+            if write in writes:
+                writes.remove(write)
+            if not writes:
+                _pending.pop(write.user_id, None)
+
+
+def _run() -> None:
+    while True:
+        batch = _next_batch()
+        if batch is None:
+            _queue.task_done()
+            break
+        close_old_connections()
+        try:
+            apply(batch)
+        except Exception:
+            logger.exception('Не удалось сохранить %d записей', len(batch))
+        finally:
+            _forget(batch)
+            for _ in batch:
+                _queue.task_done()
+    # у потока своё соединение с БД
+    connection.close()
+
+
+def _get_worker() -> threading.Thread:
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=_run, name='writes', daemon=True
+            )
+            _worker.start()
+            atexit.register(stop)
+        return _worker
+
+
+def submit(write: Write) -> None:
+    """Ставит запись в очередь, а без очереди сохраняет сразу."""
+    if not settings.WRITE_QUEUE_ENABLED:
+        _write([write])
+        return
+    write = write._replace(created=timezone.now())
+    with _pending_lock:
+        _pending.setdefault(write.user_id, []).append(write)
+    _get_worker()
+    _queue.put(write)
+
+
+def add_comment(user: User, post_id: int, text: str) -> None:
+    submit(Write(COMMENT, user.pk, post_id, text))
+
+
+def follow(user: User, author: User) -> None:
+    submit(Write(FOLLOW, user.pk, author.pk))
+
+
+def unfollow(user: User, author: User) -> None:
+    submit(Write(UNFOLLOW, user.pk, author.pk))
+
+
+def flush() -> None:
+    """Ждёт, пока сохранятся все поставленные записи."""
+    if _worker is not None and _worker.is_alive():
+        _queue.join()
+
+
+def stop() -> None:
+    """Сохраняет оставшиеся записи и останавливает поток.
+    Вызывается при завершении процесса.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            return
+        _queue.put(None)
+        _worker.join()
+        _worker = None
+
+
+def _pending_for(user: User) -> List[Write]:
+    if not user.is_authenticated:
+        return []
+    with _pending_lock:
+        return list(_pending.get(user.pk, ()))
+
+
+def pending_count(user: User) -> int:
+    """Сколько записей пользователя ещё не сохранено."""
+    return len(_pending_for(user))
+
+
+def pending_comments(user: User, post_id: int) -> List[Comment]:
+    """Несохранённые комментарии пользователя к посту,
+    новые первыми, как на странице поста.
+    """
+    return [
+        Comment(
+            post_id=post_id, author=user, text=write.text,
+            pub_date=write.created,
+        )
+        for write in reversed(_pending_for(user))
+        if write.kind == COMMENT and write.target_id == post_id
+    ]
+
+
+def is_following(user: User, author: User, saved: bool) -> bool:
+    """Подписан ли пользователь на автора с учётом несохранённых
+    подписок и отписок; saved - состояние в базе.
+    """
+    for write in reversed(_pending_for(user)):
+        if write.kind != COMMENT and write.target_id == author.pk:
+            return write.kind == FOLLOW
+    return saved
@@ -0,0 +1,37 @@
+"""Настройка бэкенда кэша из строки вида URL.
+
+locmem://[имя]          - память процесса (разработка и тесты)
+file:///абсолютный/путь - файлы, общие для всех воркеров на одном сервере
+memcached://хост:порт   - memcached (нужен пакет python-memcached)
+redis://хост:порт/база  - Redis (нужен пакет django-redis)
+"""
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+
+def cache_from_url(url: str) -> dict:
+    """Возвращает словарь для settings.CACHES['default']."""
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f'Неизвестный бэкенд кэша: {url}')
+    config = {'BACKEND': BACKENDS[parts.scheme]}
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = parts.netloc
+    elif parts.scheme == 'file':
+        config['LOCATION'] = parts.path
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc.split(',')
+    else:
+        config['LOCATION'] = url
+    return config
+
+
+def is_shared(url: str) -> bool:
+    """Виден ли кэш всем воркерам: память процесса - нет."""
+    return urlsplit(url).scheme != 'locmem'
@@ -1,5 +1,7 @@
 import os
 
+from .cache_config import cache_from_url, is_shared
+
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,6 +33,7 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,7 +74,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'core.context_processors.year.year'
+                'core.context_processors.year.year',
+                'core.context_processors.fragment_cache.fragment_cache',
             ],
         },
     },
@@ -86,7 +91,31 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение переживает запрос и не открывается заново
+        'CONN_MAX_AGE': int(os.getenv('YATUBE_CONN_MAX_AGE', 60)),
+    }
+}
+# соединение только для чтения с тем же файлом; через него читаются
+# ленты постов (core/routers.py), а пишущее соединение свободно
+if os.getenv('YATUBE_READ_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+# модели, чтение которых уходит в реплику
+REPLICA_READ_MODELS = ('posts.Post', 'posts.FeedEntry')
+# PRAGMA каждого нового соединения с SQLite (core/db.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # мс ожидания чужой блокировки записи до ошибки "database is locked"
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение - размер в КиБ
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -138,6 +167,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Paginator
 
 NUMBER_OF_ELEMENTS_PER_PAGE = 10
+# seek-пагинация по (pub_date, id) с курсорами ?cursor= вместо ?page=
+KEYSET_PAGINATION = False
 
 # Login
 
@@ -157,6 +188,8 @@ PROFILE_TEMPLATE = 'posts/profile.html'
 POST_DETAILS_TEMPLATE = 'posts/post_details.html'
 POST_CREATE_TEMPLATE = 'posts/post_create.html'
 FOLLOW_TEMPLATE = 'posts/follow.html'
+FOLLOW_LIST_TEMPLATE = 'posts/follow_list.html'
+SEARCH_TEMPLATE = 'posts/search.html'
 
 # location of templates for "core"
 
@@ -170,19 +203,112 @@ CSRF_FAILURE_TEMPLATE = 'core/403_csrf.html'
 POST_TITLE_LENGTH = 30
 POST_STR_LENGTH = 15
 POST_IMAGE_UPLOAD_TO = 'posts/'
+# миниатюра картинки поста в лентах и на странице поста
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# потоки, создающие миниатюры в фоне, чтобы Pillow не отнимал
+# процессор у запросов; по умолчанию пула нет, и миниатюра создаётся
+# в запросе, сохраняющем пост
+POST_THUMBNAIL_WORKERS = int(os.getenv('YATUBE_THUMBNAIL_WORKERS', 0))
+
+# Follow feed settings
+
+# у авторов с бо́льшим числом подписчиков посты не раскладываются
+# по лентам при публикации, а подмешиваются при чтении ленты
+FEED_FANOUT_LIMIT = 10000
+
+# Follow graph settings
+
+# сколько секунд живут в кэше подписки, подписчики и оценки
+# рекомендаций пользователя
+FOLLOW_GRAPH_TIMEOUT = 60 * 60 * 24
+# сколько авторов рекомендуется на странице подписок
+FOLLOW_SUGGESTIONS_COUNT = 5
+# по скольким подпискам пользователя ищутся рекомендации
+FOLLOW_SUGGESTION_SOURCES = 500
 
 # Comment settings
 
 COMMENT_STR_LENGTH = 15
 
+# Admin settings
+
+# отфильтрованные списки в админке считаются не дальше этого числа
+ADMIN_COUNT_LIMIT = 1000
+# сколько секунд кэшируется размер таблицы, если у СУБД нет статистики
+ADMIN_COUNT_TIMEOUT = 60 * 5
+# сколько символов текста комментария показывает список в админке
+ADMIN_TEXT_LENGTH = 100
+
+# Write queue settings
+
+# комментарии и подписки сохраняет фоновый поток, группируя записи
+# в транзакции; при False они сохраняются в запросе (так работают
+# разработка и тесты)
+WRITE_QUEUE_ENABLED = bool(int(os.getenv('YATUBE_WRITE_QUEUE', 0)))
+# наибольшее число записей в одной транзакции
+WRITE_QUEUE_BATCH_SIZE = 100
+# сколько секунд поток ждёт новых записей, прежде чем сохранить пачку
+WRITE_QUEUE_LINGER = 0.05
+
 # View override for 403 error
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 # cache framework
 
+# Бэкенд задаётся переменной окружения YATUBE_CACHE_URL, см.
+# yatube/cache_config.py. Для нескольких воркеров нужен общий кэш
+# (file://, memcached://, redis://), иначе каждый прогревает свой.
+# По умолчанию - память процесса, её же используют тесты.
+CACHE_URL = os.getenv('YATUBE_CACHE_URL', 'locmem://')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **cache_from_url(CACHE_URL),
+        # все ключи проекта живут в своём пространстве имён;
+        # увеличение YATUBE_CACHE_VERSION сбрасывает весь кэш сразу
+        'KEY_PREFIX': 'yatube',
+        'VERSION': int(os.getenv('YATUBE_CACHE_VERSION', 1)),
     }
 }
+
+# кэш страниц для анонимных посетителей; страницы сбрасываются
+# версиями при изменении данных, поэтому с общим кэшем TTL может быть
+# большим. Версии в памяти процесса другие воркеры не видят, и без
+# общего кэша страница живёт 20 секунд, как до версий
+PAGE_CACHE_TIMEOUT = 60 * 15 if is_shared(CACHE_URL) else 20
+# параметры запроса, по которым различаются закэшированные страницы
+PAGE_CACHE_QUERY_PARAMS = ('page', 'cursor', 'q')
+# кэш фрагментов со списком постов; ключи версионные, как у страниц
+FRAGMENT_CACHE_TIMEOUT = PAGE_CACHE_TIMEOUT
+
+# request metrics
+
+# файл с метриками представлений, {pid} - номер процесса;
+# без YATUBE_METRICS_FILE метрики копятся только в памяти
+METRICS_FILE = os.getenv('YATUBE_METRICS_FILE')
+METRICS_FLUSH_INTERVAL = 60
+# максимум SQL-запросов на запрос к представлению
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 7,
+    'posts:profile': 7,
+    'posts:post_details': 7,
+    'posts:post_create': 5,
+    'posts:post_edit': 7,
+    'posts:add_comment': 7,
+    'posts:follow_index': 7,
+    'posts:followers': 4,
+    'posts:following': 4,
+    'posts:profile_follow': 11,
+    'posts:profile_unfollow': 11,
+    'posts:search': 6,
+    'api:posts': 2,
+    'api:post': 2,
+    'api:comments': 2,
+    'api:groups': 1,
+    'api:group_posts': 3,
+    'api:profile': 2,
+    'api:profile_posts': 3,
+    'api:feed': 6,
+}